@@ -0,0 +1,131 @@
+"""
+LLM 对话流水线离线基准测试
+
+启动本地 OpenAI 兼容桩服务，并将 LLMService 指向它，按给定并发驱动：
+- intent      意图识别链
+- tools       ToolManager.call_tools（基准专用工具，延迟可配置）
+- agent_chat  完整的 agent 对话
+- summary     每日记忆 map-reduce 摘要
+输出各阶段 p50/p95/p99 延迟与吞吐。
+
+用法：
+    python -m benchmark.llm_pipeline --requests 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from benchmark.stats import LatencyRecorder
+from benchmark.stub_server import StubConfig, create_app, run_stub_server
+from infra.config.settings import settings
+from infra.logger import Logger
+
+STAGES = ("intent", "tools", "agent_chat", "summary")
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="KiBot LLM 流水线离线基准测试")
+    parser.add_argument("--requests", type=int, default=100, help="每个阶段的请求数")
+    parser.add_argument("--concurrency", type=int, default=10, help="并发数")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--chat-latency-ms", type=float, default=800.0)
+    parser.add_argument("--intent-latency-ms", type=float, default=400.0)
+    parser.add_argument("--summary-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--tool-latency-ms", type=float, default=300.0, help="基准工具的模拟耗时")
+    parser.add_argument("--summary-groups", type=int, default=8, help="摘要阶段的群数量（每群一次请求）")
+    parser.add_argument("--summary-turns", type=int, default=400, help="摘要阶段每群的对话轮数")
+    return parser.parse_args()
+
+
+async def _run_stage(recorder: LatencyRecorder, stage: str, requests: int, concurrency: int,
+                     factory: Callable[[int], Awaitable[object]]) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            with recorder.measure(stage):
+                await factory(i)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    recorder.set_wall_time(stage, time.perf_counter() - start)
+
+
+def _register_bench_tools(tool_manager, latency_ms: float) -> None:
+    """注册与桩服务工具调用计划对应的基准工具"""
+    from service.llm.models import Tool
+
+    def make(name: str) -> Callable[..., Awaitable[str]]:
+        async def func(**kwargs) -> str:
+            await asyncio.sleep(latency_ms / 1000)
+            return f"{name} 结果: {kwargs}"
+        return func
+
+    for name in ("bench_search", "bench_weather", "bench_rag"):
+        tool_manager.tools[name] = Tool(name=name, description="基准测试工具", parameters={}, func=make(name))
+
+
+async def main() -> None:
+    args = _parse_args()
+    Logger.configure(level="WARN")
+    stub = StubConfig(
+        chat_latency_ms=args.chat_latency_ms,
+        intent_latency_ms=args.intent_latency_ms,
+        summary_latency_ms=args.summary_latency_ms,
+        jitter_ms=args.jitter_ms,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        async with run_stub_server(create_app(stub)) as base_url:
+            settings.LLM_BASE_URL = base_url
+            settings.LLM_API_KEY = "stub"
+            settings.LLM_MODEL = "stub"
+            settings.MEMORY_DB_PATH = str(Path(tmp_dir) / "memory.db")
+
+            # 延迟导入，确保 LLMService 使用上面的配置
+            from service.llm.chat import LLMService
+            from service.llm.models import IntentRecognitionResult
+
+            svc = LLMService()
+            _register_bench_tools(svc.tool_manager, args.tool_latency_ms)
+            recorder = LatencyRecorder()
+            queries = [f"第{i}个问题：今天北京天气怎么样，顺便搜一下台风新闻？" for i in range(args.requests)]
+
+            if "intent" in args.stages:
+                await _run_stage(recorder, "intent", args.requests, args.concurrency,
+                                 lambda i: svc.intent_chain.ainvoke({"user_query": queries[i]}))
+
+            if "tools" in args.stages:
+                plans = [IntentRecognitionResult(should_call_tool=True, tool_calls=plan, confidence=0.9)
+                         for plan in stub.tool_plans if plan]
+                await _run_stage(recorder, "tools", args.requests, args.concurrency,
+                                 lambda i: svc.tool_manager.call_tools(plans[i % len(plans)]))
+
+            if "agent_chat" in args.stages:
+                await _run_stage(recorder, "agent_chat", args.requests, args.concurrency,
+                                 lambda i: svc.agent_chat(queries[i], f"bench_{i % 16}", str(10000 + i)))
+
+            if "summary" in args.stages:
+                # 每次请求使用独立的群，避免命中分块摘要缓存
+                for g in range(args.summary_groups):
+                    for t in range(args.summary_turns):
+                        svc.memory_store.append_turn(f"summary_{g}", str(20000 + t % 7),
+                                                     f"第{t}条消息，聊聊今天的新番和天气", "好呀好呀~")
+                await _run_stage(recorder, "summary", args.summary_groups, args.concurrency,
+                                 lambda i: svc.summarize_daily_memory(f"summary_{i}"))
+
+            svc.scheduler_stop()
+            svc.memory_store.close()
+
+    print(f"requests={args.requests} concurrency={args.concurrency} "
+          f"latency(ms): chat={args.chat_latency_ms} intent={args.intent_latency_ms} "
+          f"summary={args.summary_latency_ms} tool={args.tool_latency_ms} jitter={args.jitter_ms}")
+    print(recorder.report())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""
+嵌入客户端离线基准测试
+
+启动本地 OpenAI 兼容桩服务（/v1/embeddings），对比：
+- index_sequential  按批串行请求（原 DashScopeEmbeddings 的逐批循环方式）
+- index_concurrent  AsyncHttpEmbeddings 并发批量请求
+- query_single      并发查询嵌入，每个查询单独请求
+- query_microbatch  并发查询嵌入，按微批合并请求
+输出各阶段延迟、吞吐与嵌入请求次数。
+
+用法：
+    python -m benchmark.rag_indexing --chunks 2000 --concurrency 8
+"""
+import argparse
+import asyncio
+import time
+
+from benchmark.stats import LatencyRecorder
+from benchmark.stub_server import StubConfig, create_app, run_stub_server
+from infra.logger import Logger
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="KiBot 嵌入客户端离线基准测试")
+    parser.add_argument("--chunks", type=int, default=1000, help="索引的分块数")
+    parser.add_argument("--batch-size", type=int, default=10, help="单次嵌入请求的文本数")
+    parser.add_argument("--concurrency", type=int, default=8, help="文档嵌入并发请求数")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="每秒最多请求数，0 不限速")
+    parser.add_argument("--queries", type=int, default=200, help="并发查询数")
+    parser.add_argument("--microbatch-ms", type=float, default=5.0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=150.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    return parser.parse_args()
+
+
+def _corpus(size: int) -> list[str]:
+    topics = ["人工智能", "台风路径", "番剧更新", "天气预报", "群聊记忆", "直播提醒"]
+    return [f"第{i}段：关于{topics[i % len(topics)]}的说明文字，" + "内容" * (20 + i % 30) for i in range(size)]
+
+
+async def main() -> None:
+    args = _parse_args()
+    Logger.configure(level="WARN")
+    stub = StubConfig(embedding_latency_ms=args.embedding_latency_ms, jitter_ms=args.jitter_ms)
+    app = create_app(stub)
+
+    from service.rag.embeddings import AsyncHttpEmbeddings
+
+    recorder = LatencyRecorder()
+    requests = {}
+    texts = _corpus(args.chunks)
+    queries = [f"问题{i}：明天会下雨吗？" for i in range(args.queries)]
+
+    async with run_stub_server(app) as base_url:
+        def client(concurrency: int, microbatch_ms: float = 0.0) -> AsyncHttpEmbeddings:
+            return AsyncHttpEmbeddings(base_url=base_url, api_key="stub", model="stub",
+                                       batch_size=args.batch_size, concurrency=concurrency,
+                                       rate_limit=args.rate_limit, microbatch_ms=microbatch_ms)
+
+        # 索引：与 RAGService 相同，在后台线程中调用同步接口
+        for stage, concurrency in (("index_sequential", 1), ("index_concurrent", args.concurrency)):
+            app.state.embedding_requests = 0
+            embeddings = client(concurrency)
+            start = time.perf_counter()
+            vectors = await asyncio.to_thread(embeddings.embed_documents, texts)
+            recorder.add(stage, time.perf_counter() - start)
+            assert len(vectors) == len(texts)
+            requests[stage] = app.state.embedding_requests
+
+        # 查询：并发调用异步接口
+        for stage, microbatch_ms in (("query_single", 0.0), ("query_microbatch", args.microbatch_ms)):
+            app.state.embedding_requests = 0
+            embeddings = client(args.concurrency, microbatch_ms)
+
+            async def one(query: str) -> None:
+                with recorder.measure(stage):
+                    await embeddings.aembed_query(query)
+
+            start = time.perf_counter()
+            await asyncio.gather(*[one(query) for query in queries])
+            recorder.set_wall_time(stage, time.perf_counter() - start)
+            requests[stage] = app.state.embedding_requests
+
+    print(f"chunks={args.chunks} batch_size={args.batch_size} concurrency={args.concurrency} "
+          f"rate_limit={args.rate_limit} queries={args.queries} microbatch_ms={args.microbatch_ms} "
+          f"latency(ms): embedding={args.embedding_latency_ms} jitter={args.jitter_ms}")
+    print(recorder.report())
+    print()
+    for stage, count in requests.items():
+        print(f"{stage:<16} embedding requests: {count}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
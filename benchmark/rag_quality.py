@@ -0,0 +1,227 @@
+"""
+RAG 检索质量与性能离线基准
+
+使用确定性的 hashing 嵌入（无需网络），在以下语料上逐一运行配置文件中的每个配置：
+- 知识库：benchmark/data/rag/knowledge 下的中文文档 + 按随机种子生成的干扰文档，
+  查询与标注答案见 benchmark/data/rag/queries.json
+- 记忆：按随机种子生成的多群、多月日摘要，查询从中抽取（按人名、用户 ID、日期提问）
+
+检索结果中任一片段包含标注答案即视为命中，输出 recall@k、MRR、查询延迟百分位、
+索引建立耗时、索引目录大小与每次查询的嵌入调用次数。
+
+用法：
+    python -m benchmark.rag_quality --config benchmark/data/rag/configs.toml
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tomllib
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from benchmark.stats import percentile
+from infra.config.settings import settings
+from infra.logger import Logger
+
+DATA_DIR = Path(__file__).parent / "data" / "rag"
+
+_NAMES = ["张伟", "王芳", "李娜", "刘洋", "陈静", "杨帆", "赵磊", "黄丽", "周杰", "吴敏", "徐强", "孙悦"]
+_ACTIVITIES = ["去爬山", "吃火锅", "看电影", "打篮球", "去海边", "学吉他", "考驾照", "换手机",
+               "养猫", "跑马拉松", "去露营", "拍写真", "学游泳", "逛漫展", "打羽毛球", "做烘焙"]
+_PLACES = ["黄山", "成都", "青岛", "厦门", "西安", "大理", "杭州", "长沙", "重庆", "苏州"]
+_TOPICS = ["新出的游戏", "期末考试", "加班", "天气变冷", "周末的比赛", "新开的奶茶店", "番剧更新", "换工作"]
+_FILLER = ["城市", "河流", "年度", "报告", "居民", "工程", "规划", "文化", "交通", "公园", "街道", "图书馆",
+           "博物馆", "市场", "学校", "医院", "社区", "农业", "工业", "港口", "铁路", "档案", "展览", "节日"]
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="KiBot RAG 检索质量与性能离线基准")
+    parser.add_argument("--config", default=str(DATA_DIR / "configs.toml"), help="对比配置文件（TOML）")
+    parser.add_argument("--only", nargs="*", help="只运行指定名称的配置")
+    parser.add_argument("--output", help="将结果另存为 JSON")
+    return parser.parse_args()
+
+
+def _synthetic_docs(count: int, rng: random.Random) -> Dict[str, str]:
+    """生成干扰文档：虚构城市的年鉴式段落，词汇与标注答案不重叠"""
+    docs = {}
+    for i in range(count):
+        paragraphs = []
+        for _ in range(rng.randint(3, 8)):
+            sentences = ["".join(rng.choices(_FILLER, k=rng.randint(4, 9))) + "。" for _ in range(rng.randint(3, 7))]
+            paragraphs.append("".join(sentences))
+        docs[f"synthetic_{i:04d}.txt"] = f"第{i}号城市年鉴\n\n" + "\n\n".join(paragraphs)
+    return docs
+
+
+def _synthetic_memory(groups: int, days: int, queries: int,
+                      rng: random.Random) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+    """生成日摘要记录与带标注的查询，每条记录的人名+活动组合在群内唯一"""
+    records = []
+    start = date(2026, 1, 1)
+    for group in range(groups):
+        group_id = str(100000 + group)
+        used = set()
+        for day in range(days):
+            while True:
+                person, activity = rng.randrange(len(_NAMES)), rng.choice(_ACTIVITIES)
+                if (person, activity) not in used:
+                    used.add((person, activity))
+                    break
+            other = rng.choice([i for i in range(len(_NAMES)) if i != person])
+            uid, other_uid = str(10000 + person * 7), str(10000 + other * 7)
+            fact = f"{_NAMES[person]}（{uid}）说想{activity}，地点定在{rng.choice(_PLACES)}"
+            summary = f"{fact}。{_NAMES[other]}（{other_uid}）聊了{rng.choice(_TOPICS)}。"
+            records.append({
+                "group_id": group_id,
+                "date": (start + timedelta(days=day)).isoformat(),
+                "summary": summary,
+                "participants": [uid, other_uid],
+                "fact": fact,
+                "name": _NAMES[person],
+                "uid": uid,
+                "activity": activity,
+            })
+
+    labeled = []
+    for record in rng.sample(records, min(queries, len(records))):
+        kind = rng.choice(["name", "uid", "date"])
+        if kind == "name":
+            query, answer = f"{record['name']}说想{record['activity']}，是去哪里？", record["fact"]
+        elif kind == "uid":
+            query, answer = f"{record['uid']}之前说要{record['activity']}吗", record["fact"]
+        else:
+            query, answer = f"{record['date']}那天群里聊了什么", f"日期：{record['date']}"
+        labeled.append({"query": query, "answer": answer, "group_id": record["group_id"], "kind": kind})
+    return records, labeled
+
+
+def _first_hit_rank(results: List[Dict[str, Any]], answer: str) -> int:
+    """第一个包含答案的结果的排名（从 1 开始），未命中返回 0"""
+    for rank, result in enumerate(results, 1):
+        if answer in result["content"]:
+            return rank
+    return 0
+
+
+def _dir_size(path: str) -> int:
+    return sum(file.stat().st_size for file in Path(path).rglob("*") if file.is_file())
+
+
+def _run_config(config: Dict[str, Any], top_k: int, docs: Dict[str, str], records: List[Dict[str, Any]],
+                knowledge_queries: List[Dict[str, str]], memory_queries: List[Dict[str, str]]) -> Dict[str, Any]:
+    original = {key: getattr(settings, key) for key in config if key.isupper()}
+    for key, value in config.items():
+        if key.isupper():
+            setattr(settings, key, value)
+
+    from service.rag.memory_archive import MemoryArchive
+    from service.rag.service import RAGService
+
+    docs_dir = tempfile.mkdtemp(prefix="kibot-rag-bench-")
+    try:
+        for name, content in docs.items():
+            Path(docs_dir, name).write_text(content, encoding="utf-8")
+        archive = MemoryArchive(os.path.join(docs_dir, "memory"))
+        for record in records:
+            archive.append(record["group_id"], record["date"], record["summary"], record["participants"])
+
+        start = time.perf_counter()
+        service = RAGService(docs_dir)
+        service.check_and_update_documents()
+        build_seconds = time.perf_counter() - start
+
+        embed_calls = 0
+        embed_query = service.embeddings.embed_query
+
+        def counted_embed_query(text: str) -> List[float]:
+            nonlocal embed_calls
+            embed_calls += 1
+            return embed_query(text)
+
+        service.embeddings.embed_query = counted_embed_query
+
+        latencies: List[float] = []
+        scores: Dict[str, List[int]] = {"knowledge": [], "memory": []}
+        for scope, queries in (("knowledge", knowledge_queries), ("memory", memory_queries)):
+            for item in queries:
+                start = time.perf_counter()
+                if scope == "knowledge":
+                    results = service.query(item["query"], top_k=top_k)
+                else:
+                    results = service.query_for_memory(item["query"], top_k=top_k, group_id=item["group_id"])
+                latencies.append(time.perf_counter() - start)
+                scores[scope].append(_first_hit_rank(results, item["answer"]))
+
+        result = {
+            "name": config["name"],
+            "build_s": build_seconds,
+            "index_kb": _dir_size(service.index_root) / 1024,
+            "knowledge_chunks": service.knowledge.index.ntotal,
+            "index_kind": service.knowledge.index.kind,
+            "embeds_per_query": embed_calls / max(1, len(latencies)),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+        for scope, ranks in scores.items():
+            result[f"{scope}_recall"] = sum(1 for rank in ranks if rank) / max(1, len(ranks))
+            result[f"{scope}_mrr"] = sum(1 / rank for rank in ranks if rank) / max(1, len(ranks))
+        return result
+    finally:
+        shutil.rmtree(docs_dir, ignore_errors=True)
+        for key, value in original.items():
+            setattr(settings, key, value)
+
+
+def _report(results: List[Dict[str, Any]], top_k: int) -> str:
+    header = (f"{'config':<20}{'index':>9}{'chunks':>8}{'build(s)':>10}{'size(KB)':>10}"
+              f"{f'K-R@{top_k}':>9}{'K-MRR':>8}{f'M-R@{top_k}':>9}{'M-MRR':>8}"
+              f"{'p50(ms)':>9}{'p95(ms)':>9}{'p99(ms)':>9}{'emb/q':>7}")
+    lines = [header, "-" * len(header)]
+    for r in results:
+        lines.append(
+            f"{r['name']:<20}{r['index_kind']:>9}{r['knowledge_chunks']:>8}{r['build_s']:>10.2f}{r['index_kb']:>10.0f}"
+            f"{r['knowledge_recall']:>9.3f}{r['knowledge_mrr']:>8.3f}{r['memory_recall']:>9.3f}{r['memory_mrr']:>8.3f}"
+            f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['embeds_per_query']:>7.2f}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    args = _parse_args()
+    Logger.configure(level="WARN")
+    with open(args.config, "rb") as file:
+        suite = tomllib.load(file)
+
+    top_k = suite.get("top_k", 5)
+    rng = random.Random(suite.get("seed", 42))
+    docs = {path.name: path.read_text(encoding="utf-8") for path in sorted((DATA_DIR / "knowledge").glob("*.txt"))}
+    docs.update(_synthetic_docs(suite.get("synthetic_docs", 0), rng))
+    records, memory_queries = _synthetic_memory(
+        suite.get("memory_groups", 3), suite.get("memory_days", 120), suite.get("memory_queries", 90), rng)
+    with open(DATA_DIR / "queries.json", "r", encoding="utf-8") as file:
+        knowledge_queries = json.load(file)
+
+    results = []
+    for config in suite["config"]:
+        if args.only and config["name"] not in args.only:
+            continue
+        results.append(_run_config({**suite.get("defaults", {}), **config}, top_k, docs, records,
+                                   knowledge_queries, memory_queries))
+
+    print(f"docs={len(docs)} memory_records={len(records)} "
+          f"queries: knowledge={len(knowledge_queries)} memory={len(memory_queries)} top_k={top_k}")
+    print(_report(results, top_k))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""基准测试的统计与报告工具"""
+import math
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LatencyRecorder:
+    """按阶段记录耗时（秒）"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.wall_time: Dict[str, float] = {}
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def set_wall_time(self, stage: str, seconds: float) -> None:
+        """记录某阶段全部请求的总墙钟时间，用于计算吞吐"""
+        self.wall_time[stage] = seconds
+
+    def report(self) -> str:
+        header = f"{'stage':<16}{'n':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}{'req/s':>10}"
+        lines = [header, "-" * len(header)]
+        for stage, values in self.samples.items():
+            wall = self.wall_time.get(stage)
+            rps = f"{len(values) / wall:.1f}" if wall else "-"
+            lines.append(
+                f"{stage:<16}{len(values):>6}"
+                f"{percentile(values, 50) * 1000:>10.1f}"
+                f"{percentile(values, 95) * 1000:>10.1f}"
+                f"{percentile(values, 99) * 1000:>10.1f}"
+                f"{max(values) * 1000:>10.1f}"
+                f"{rps:>10}"
+            )
+        return "\n".join(lines)
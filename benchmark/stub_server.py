@@ -0,0 +1,154 @@
+"""
+本地 OpenAI 兼容桩服务
+
+实现 /v1/chat/completions 与 /v1/embeddings，按请求内容返回确定性的响应：
+- 意图识别提示词 -> 意图识别 JSON（按用户问题哈希轮换工具调用计划）
+- 摘要提示词     -> 固定格式的摘要
+- 其他           -> 普通聊天回复
+嵌入向量由文本哈希生成。每类响应的延迟可配置，抖动由问题哈希决定，保证多次运行结果一致。
+"""
+import asyncio
+import hashlib
+import json
+import socket
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+INTENT_MARKER = "可用工具详细信息列表"
+SUMMARY_MARKERS = ("对话摘要", "对话内容形成")
+
+
+@dataclass
+class StubConfig:
+    chat_latency_ms: float = 800.0     # 普通回复延迟
+    intent_latency_ms: float = 400.0   # 意图识别延迟
+    summary_latency_ms: float = 1500.0  # 摘要延迟
+    jitter_ms: float = 100.0           # 确定性抖动上限
+    embedding_latency_ms: float = 150.0  # 嵌入请求延迟（与批大小无关）
+    embedding_dim: int = 256             # 嵌入向量维度
+    # 意图识别返回的工具调用计划，按问题哈希轮换
+    tool_plans: List[List[Dict[str, Any]]] = field(default_factory=lambda: [
+        [],
+        [{"tool_name": "bench_search", "tool_parameters": {"query": "KiBot"}}],
+        [{"tool_name": "bench_weather", "tool_parameters": {"city": "北京"}}],
+        [
+            {"tool_name": "bench_search", "tool_parameters": {"query": "台风"}},
+            {"tool_name": "bench_weather", "tool_parameters": {"city": "上海"}},
+            {"tool_name": "bench_rag", "tool_parameters": {"query": "人工智能"}},
+        ],
+    ])
+
+
+def _stable_hash(text: str) -> int:
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _prompt_text(body: Dict[str, Any]) -> str:
+    parts = []
+    for message in body.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(content)
+    return "\n".join(parts)
+
+
+def _completion(body: Dict[str, Any], content: str) -> Dict[str, Any]:
+    return {
+        "id": f"chatcmpl-stub-{_stable_hash(content):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def _embedding(text: str, dim: int) -> List[float]:
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    return [(seed[i % len(seed)] - 128) / 128 for i in range(dim)]
+
+
+def create_app(config: StubConfig) -> FastAPI:
+    app = FastAPI()
+    app.state.embedding_requests = 0  # 嵌入请求计数，用于统计微批合并效果
+
+    async def delay(base_ms: float, seed: str) -> None:
+        jitter = (_stable_hash(seed) % 1000) / 1000 * config.jitter_ms if config.jitter_ms else 0
+        await asyncio.sleep((base_ms + jitter) / 1000)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = _prompt_text(body)
+        seed = prompt[-200:]
+
+        if INTENT_MARKER in prompt:
+            await delay(config.intent_latency_ms, seed)
+            plan = config.tool_plans[_stable_hash(seed) % len(config.tool_plans)] if config.tool_plans else []
+            content = json.dumps({
+                "should_call_tool": bool(plan),
+                "tool_calls": plan,
+                "confidence": 0.9,
+            }, ensure_ascii=False)
+        elif any(marker in prompt for marker in SUMMARY_MARKERS):
+            await delay(config.summary_latency_ms, seed)
+            content = f"摘要：本段对话共 {prompt.count(chr(10)) + 1} 行，讨论了若干话题。"
+        else:
+            await delay(config.chat_latency_ms, seed)
+            content = "好哒~这是来自桩服务的回复哦！"
+        return _completion(body, content)
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        app.state.embedding_requests += 1
+        await delay(config.embedding_latency_ms, inputs[0] if inputs else "")
+        return {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": _embedding(text, config.embedding_dim)}
+                     for i, text in enumerate(inputs)],
+            "model": body.get("model", "stub"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def run_stub_server(app: FastAPI, host: str = "127.0.0.1", port: int = 0) -> AsyncIterator[str]:
+    """在当前事件循环中启动桩服务，产出 OpenAI 兼容的 base_url"""
+    port = port or _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    try:
+        yield f"http://{host}:{port}/v1"
+    finally:
+        server.should_exit = True
+        await task
+
+
+if __name__ == "__main__":
+    uvicorn.run(create_app(StubConfig()), host="127.0.0.1", port=18080)
@@ -0,0 +1,130 @@
+"""
+台风路径图渲染基准测试
+
+用合成的台风路径对比两种绘制方式：
+- full     每次完整重绘（重建 GeoAxes，重新绘制底图、经纬网、图例与脚注）
+- overlay  静态图层按画幅预先绘制并缓存，每次只绘制路径、风圈、箭头与文字后合成
+两种方式各在独立的子进程中运行，输出各画幅的渲染延迟、静态图层准备耗时与单次渲染的峰值内存。
+
+用法：
+    python -m benchmark.typhoon_render --iterations 5
+"""
+import argparse
+import multiprocessing
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+from benchmark.stats import LatencyRecorder
+
+MODES = ("full", "overlay")
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="KiBot 台风路径图渲染基准测试")
+    parser.add_argument("--iterations", type=int, default=5, help="每个画幅的渲染次数")
+    parser.add_argument("--points", type=int, default=40, help="合成路径的点数")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    return parser.parse_args()
+
+
+def _synthetic_storm(points: int, lon0: float, lat0: float):
+    """自东南向西北移动、逐渐增强的合成台风路径，按时间倒序排列"""
+    from service.weather.models import StormInfo, StormItem, StormResponse
+
+    storm = StormItem(id="NP_2599", name="基准", basin="NP", year=2025, isActive="1")
+    types = ["TD", "TS", "STS", "TY", "STY", "SuperTY"]
+    track = []
+    for i in range(points):
+        track.append(StormResponse(storm=storm, stormInfo=StormInfo(
+            pubTime=f"2025-09-{1 + i // 8:02d}T{(i % 8) * 3:02d}:00+08:00",
+            lat=f"{lat0 + i * 15 / points:.1f}",
+            lon=f"{lon0 - i * 35 / points:.1f}",
+            type=types[min(len(types) - 1, i * len(types) // points)],
+            pressure=str(1000 - i * 60 // points),
+            windSpeed=str(15 + i * 45 // points),
+            moveSpeed="20",
+            moveDir="WNW",
+            move360="" if i % 2 else "290",
+        )))
+    return track[::-1]
+
+
+def _peak_rss_mb() -> float:
+    """进程常驻内存峰值（VmHWM），非 Linux 环境返回 0"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _reset_peak_rss() -> None:
+    # 写入 5 可将 VmHWM 重置为当前常驻内存
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _run_mode(mode: str, iterations: int, points: int) -> Tuple[Dict[str, List[float]], Dict[str, float]]:
+    """在子进程中运行一种绘制方式，返回 (各画幅耗时, 内存与准备耗时)"""
+    warnings.filterwarnings("ignore")
+    from service.weather.typhoon_renderer import StormTrack, TyphoonRenderer
+
+    renderer = TyphoonRenderer()
+    render = renderer.render_full if mode == "full" else renderer.render
+    info = {"init_rss_mb": _peak_rss_mb(), "prepare_s": 0.0}
+    if mode == "overlay":
+        start = time.perf_counter()
+        renderer.prepare()
+        info["prepare_s"] = time.perf_counter() - start
+
+    tracks = {
+        # 最新点在小画幅内
+        "small": StormTrack.from_responses(_synthetic_storm(points, lon0=150.0, lat0=12.0)),
+        # 最新点在小画幅外
+        "large": StormTrack.from_responses(_synthetic_storm(points, lon0=178.0, lat0=8.0)),
+    }
+    samples: Dict[str, List[float]] = {}
+    peak = 0.0
+    for scope, track in tracks.items():
+        for _ in range(iterations):
+            _reset_peak_rss()
+            start = time.perf_counter()
+            png = render(track)
+            samples.setdefault(scope, []).append(time.perf_counter() - start)
+            peak = max(peak, _peak_rss_mb())
+        info[f"{scope}_png_kb"] = len(png) / 1024
+    info["render_peak_rss_mb"] = peak
+    return samples, info
+
+
+def main() -> None:
+    args = _parse_args()
+    recorder = LatencyRecorder()
+    infos = {}
+    for mode in args.modes:
+        # 每种方式使用全新的进程，互不影响内存统计
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            samples, infos[mode] = executor.submit(_run_mode, mode, args.iterations, args.points).result()
+        for scope, values in samples.items():
+            for seconds in values:
+                recorder.add(f"{mode}/{scope}", seconds)
+
+    print(f"iterations={args.iterations} points={args.points}")
+    print(recorder.report())
+    print()
+    print(f"{'mode':<10}{'prepare(s)':>12}{'init_rss(MB)':>14}{'peak_rss(MB)':>14}{'small(KB)':>12}{'large(KB)':>12}")
+    for mode, info in infos.items():
+        print(f"{mode:<10}{info['prepare_s']:>12.2f}{info['init_rss_mb']:>14.0f}{info['render_peak_rss_mb']:>14.0f}"
+              f"{info['small_png_kb']:>12.0f}{info['large_png_kb']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ from infra.logger import Logger
 from adapter.napcat.webhook_server import WebhookServer
 from adapter.napcat.ws_client import NapCatWsClient
 from adapter.napcat.http_api import NapCatHttpClient
+from service.rag.service import get_rag_service
 from .pusher.pusher import Pusher
 from .router import Router
 from .handler import Handler
@@ -82,6 +83,14 @@ class Bot:
         self.pusher.start()
         Logger.info("BotCore", "Pusher started")
 
+    def start_rag(self):
+        """预加载 RAG 索引（后台文档变更监视随 RAGService 创建一同启动）"""
+        try:
+            get_rag_service()
+        except Exception as e:
+            # 索引加载失败不影响其他功能，查询时会再次尝试创建并启动监视
+            Logger.warn("BotCore", f"RAG 索引加载失败: {e}")
+
     async def run(self):
         """根据配置的连接模式启动服务"""
         if self.settings.CONNECTION_MODE == "webhook":
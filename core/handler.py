@@ -1,6 +1,5 @@
 import asyncio
 import re
-from concurrent.futures import ThreadPoolExecutor
 
 from adapter.napcat.http_api import NapCatHttpClient
 from core.pusher.bangumi_scheduler import BangumiScheduler
@@ -29,7 +28,10 @@ class Handler:
     async def reply_handler(self, group_id, msg, user_id):
         # resp = await self.llm_svc.chat(msg)
         # resp = await self.llm_svc.chat_with_memory(msg, group_id, user_id)
-        resp = await self.llm_svc.agent_chat(msg, group_id, user_id)
+        resp = await self.llm_svc.agent_chat(
+            msg, group_id, user_id,
+            on_interim=lambda text: self.client.send_group_msg(group_id, text),
+        )
         reply: str = resp.reply
         await self.client.send_group_msg(group_id, reply)
 
@@ -100,21 +102,15 @@ class Handler:
             # 绘制台风路径图
             await self.client.send_group_msg(group_id, "希酱正在努力绘制台风路径图，请稍等哦~")
 
-            executor = ThreadPoolExecutor(max_workers=2)
-
-            def _render_sync(storm_data) -> str | None:
+            async def _render(storm_data) -> str | None:
                 try:
-                    return self.weather_svc.render_storm(storm_data)
+                    return await self.weather_svc.render_storm(storm_data)
                 except Exception as e:
                     logger.error("Weather", f"绘制台风路径时出现错误：{e}")
                     return None
 
-            futures = [
-                asyncio.get_running_loop().run_in_executor(executor, _render_sync, single_storm)
-                for single_storm in storm_resp
-            ]
-
-            img_paths = await asyncio.gather(*futures)
+            # 绘制在渲染进程池中进行，超出进程数的请求在池内排队
+            img_paths = await asyncio.gather(*[_render(single_storm) for single_storm in storm_resp])
 
             for single_storm, img_path in zip(storm_resp, img_paths):
                 typhoon_name = single_storm[0].storm.name
@@ -1,53 +1,34 @@
-import json
-import os
 from datetime import datetime
-from typing import Dict
 from zoneinfo import ZoneInfo
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from adapter.napcat.http_api import NapCatHttpClient
 from infra.logger import logger
+from infra.state_store import GROUP_TARGET
 from service.bangumi.service import BangumiService
+from .subscription_index import SubscriptionIndex
 
 
 class BangumiScheduler:
     def __init__(self, http_client):
         self.service = BangumiService()
         self.client: NapCatHttpClient = http_client
-        # 群 -> 是否订阅 映射
-        self.subscriptions: Dict[str, bool] = {}
-        self.subscriptions = self.load_subscriptions("cache/bangumi_subscriptions.json")
+        # 订阅了每日放送的群
+        self.subscriptions = SubscriptionIndex("bangumi")
         self.scheduler = AsyncIOScheduler(timezone="Asia/Shanghai")
 
     def subscribe(self, group_id: str):
         """订阅每日放送推送"""
-        self.subscriptions[group_id] = True
-        self.save_subscriptions()
+        self.subscriptions.add(group_id, GROUP_TARGET)
 
     def unsubscribe(self, group_id: str):
         """取消订阅每日放送推送"""
-        if group_id in self.subscriptions:
-            del self.subscriptions[group_id]
-            self.save_subscriptions()
+        self.subscriptions.remove(group_id, GROUP_TARGET)
 
     def is_subscribed(self, group_id: str) -> bool:
         """检查群是否已订阅"""
-        return self.subscriptions.get(group_id, False)
-
-    def save_subscriptions(self):
-        """保存订阅信息到文件"""
-        os.makedirs("cache", exist_ok=True)
-        with open("cache/bangumi_subscriptions.json", "w", encoding="utf-8") as f:
-            json.dump(self.subscriptions, f, ensure_ascii=False, indent=2)
-
-    @staticmethod
-    def load_subscriptions(json_file: str) -> Dict[str, bool]:
-        """从文件加载订阅信息"""
-        if not os.path.exists(json_file):
-            return {}
-        with open(json_file, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return group_id in self.subscriptions
 
     async def push_daily_anime(self, group_id: str) -> str:
         """生成每日放送推送消息"""
@@ -98,14 +79,13 @@ class BangumiScheduler:
 
     async def _send_daily_anime(self):
         """发送每日放送信息到所有订阅的群"""
-        for group_id in self.subscriptions:
-            if self.subscriptions[group_id]:
-                try:
-                    msg = await self.push_daily_anime(group_id)
-                    if msg:
-                        await self.client.send_group_msg(int(group_id), msg)
-                except Exception as e:
-                    logger.warn("BangumiScheduler", f"发送每日放送到群 {group_id} 时出错: {e}")
+        for group_id in list(self.subscriptions):
+            try:
+                msg = await self.push_daily_anime(group_id)
+                if msg:
+                    await self.client.send_group_msg(int(group_id), msg)
+            except Exception as e:
+                logger.warn("BangumiScheduler", f"发送每日放送到群 {group_id} 时出错: {e}")
 
     async def send_manual_push(self, group_id: str) -> str:
         """手动发送每日放送信息"""
@@ -1,14 +1,15 @@
 import asyncio
-import json
-import os
-from typing import Dict, List
+from typing import Dict, List, Set
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from adapter.napcat.http_api import NapCatHttpClient
+from infra.config.settings import settings
 from infra.logger import logger
+from infra.state_store import get_state_store
 from service.bilibili.service import BiliService
 from service.bilibili.renderer import RenderedContent
+from .subscription_index import SubscriptionIndex
 
 
 class BilibiliScheduler:
@@ -17,22 +18,17 @@ class BilibiliScheduler:
         self.client: NapCatHttpClient = http_client
 
         # 群 -> UP主UID列表 映射
-        self.subscriptions: Dict[str, List[str]] = {}
+        self.subscriptions = SubscriptionIndex("bilibili")
+        self.state = get_state_store()
         # UP主UID -> update_baseline 映射（用于检测新动态）
-        self.update_baselines: Dict[str, str] = {}
-
-        self.subscriptions = self.load_subscriptions("cache/bilibili_subscriptions.json")
-        self.update_baselines = self.load_update_baselines("cache/bilibili_update_baselines.json")
+        self.update_baselines: Dict[str, str] = self.state.get_values("bilibili_baseline")
+        # 尚未写入状态库的 baseline
+        self._dirty_baselines: Set[str] = set()
         self.scheduler = AsyncIOScheduler(timezone="Asia/Shanghai")
 
     def subscribe(self, group_id: str, up_uid: str):
         """订阅UP主动态推送"""
-        if group_id not in self.subscriptions:
-            self.subscriptions[group_id] = []
-
-        if up_uid not in self.subscriptions[group_id]:
-            self.subscriptions[group_id].append(up_uid)
-            self.save_subscriptions()
+        if self.subscriptions.add(group_id, up_uid):
             logger.info("BilibiliScheduler", f"群 {group_id} 订阅了UP主 {up_uid}")
 
             # 订阅时立即获取一次动态，建立update_baseline
@@ -40,9 +36,7 @@ class BilibiliScheduler:
 
     def unsubscribe(self, group_id: str, up_uid: str):
         """取消订阅UP主动态推送"""
-        if group_id in self.subscriptions and up_uid in self.subscriptions[group_id]:
-            self.subscriptions[group_id].remove(up_uid)
-            self.save_subscriptions()
+        if self.subscriptions.remove(group_id, up_uid):
             logger.info("BilibiliScheduler", f"群 {group_id} 取消订阅了UP主 {up_uid}")
 
     def get_subscribed_ups(self, group_id: str) -> List[str]:
@@ -51,35 +45,19 @@ class BilibiliScheduler:
 
     def is_subscribed(self, group_id: str, up_uid: str) -> bool:
         """检查群是否已订阅指定UP主"""
-        return group_id in self.subscriptions and up_uid in self.subscriptions[group_id]
+        return self.subscriptions.contains(group_id, up_uid)
 
-    def save_subscriptions(self):
-        """保存订阅信息到文件"""
-        os.makedirs("cache", exist_ok=True)
-        with open("cache/bilibili_subscriptions.json", "w", encoding="utf-8") as f:
-            json.dump(self.subscriptions, f, ensure_ascii=False, indent=2)
+    def _set_baseline(self, up_uid: str, baseline: str):
+        if self.update_baselines.get(up_uid) != baseline:
+            self.update_baselines[up_uid] = baseline
+            self._dirty_baselines.add(up_uid)
 
     def save_update_baselines(self):
-        """保存update_baseline到文件"""
-        os.makedirs("cache", exist_ok=True)
-        with open("cache/bilibili_update_baselines.json", "w", encoding="utf-8") as f:
-            json.dump(self.update_baselines, f, ensure_ascii=False, indent=2)
-
-    @staticmethod
-    def load_subscriptions(json_file: str) -> Dict[str, List[str]]:
-        """从文件加载订阅信息"""
-        if not os.path.exists(json_file):
-            return {}
-        with open(json_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-
-    @staticmethod
-    def load_update_baselines(json_file: str) -> Dict[str, str]:
-        """从文件加载update_baseline"""
-        if not os.path.exists(json_file):
-            return {}
-        with open(json_file, "r", encoding="utf-8") as f:
-            return json.load(f)
+        """将变化的 update_baseline 一次写入状态库"""
+        if self._dirty_baselines:
+            self.state.put_values("bilibili_baseline",
+                                  {up_uid: self.update_baselines[up_uid] for up_uid in self._dirty_baselines})
+            self._dirty_baselines.clear()
 
     async def _initialize_baseline(self, up_uid: str):
         """订阅时初始化baseline"""
@@ -90,7 +68,7 @@ class BilibiliScheduler:
             if dynamics and dynamics.data and dynamics.data.items:
                 # 使用第一条动态的ID作为baseline(该 API 返回的 update_baseline为空)
                 baseline = dynamics.data.items[0].id_str
-                self.update_baselines[up_uid] = baseline
+                self._set_baseline(up_uid, baseline)
                 self.save_update_baselines()
                 logger.info("BilibiliScheduler", f"UP主 {up_uid} 的baseline已初始化: {baseline}")
             else:
@@ -99,8 +77,8 @@ class BilibiliScheduler:
         except Exception as e:
             logger.warn("BilibiliScheduler", f"初始化UP主 {up_uid} 的baseline时出错: {e}")
 
-    async def check_new_dynamics(self, up_uid: str) -> List[RenderedContent]:
-        """检查UP主是否有新动态，返回渲染后的内容列表"""
+    async def check_new_dynamics(self, up_uid: str, persist: bool = True) -> List[RenderedContent]:
+        """检查UP主是否有新动态，返回渲染后的内容列表；persist=False 时 baseline 留待调用方统一写入"""
         try:
             current_baseline = self.update_baselines.get(up_uid, "")
             logger.debug("BilibiliScheduler", f"UP主 {up_uid} 当前baseline: {current_baseline}")
@@ -129,8 +107,9 @@ class BilibiliScheduler:
                 new_baseline = dynamics.data.items[0].id_str
                 if new_baseline != current_baseline:
                     logger.debug("BilibiliScheduler", f"UP主 {up_uid} 更新baseline: {current_baseline} -> {new_baseline}")
-                self.update_baselines[up_uid] = new_baseline
-                self.save_update_baselines()
+                self._set_baseline(up_uid, new_baseline)
+                if persist:
+                    self.save_update_baselines()
 
             return rendered_contents
 
@@ -150,6 +129,12 @@ class BilibiliScheduler:
             minutes=30,
             id="check_bilibili_dynamics",
         )
+        self.scheduler.add_job(
+            self.subscriptions.reload_if_changed,
+            trigger="interval",
+            seconds=settings.SUBSCRIPTION_SYNC_SECONDS,
+            id="sync_bilibili_subscriptions",
+        )
         self.scheduler.start()
 
     def stop(self):
@@ -158,9 +143,8 @@ class BilibiliScheduler:
 
     async def _check_all_subscriptions(self):
         """检查所有订阅的UP主是否有新动态"""
-        all_ups = set()
-        for group_ups in self.subscriptions.values():
-            all_ups.update(group_ups)
+        # 复制一份，检查过程中可能有新的订阅或取消
+        all_ups = list(self.subscriptions.targets())
 
         if not all_ups:
             logger.info("BilibiliScheduler", "没有订阅任何UP主，跳过检查")
@@ -170,20 +154,22 @@ class BilibiliScheduler:
 
         for up_uid in all_ups:
             try:
-                new_contents = await self.check_new_dynamics(up_uid)
+                new_contents = await self.check_new_dynamics(up_uid, persist=False)
                 if new_contents:
                     logger.info("BilibiliScheduler", f"UP主 {up_uid} 有 {len(new_contents)} 条新动态")
                     # 向所有订阅该UP主的群发送动态内容
-                    for group_id, subscribed_ups in self.subscriptions.items():
-                        if up_uid in subscribed_ups:
-                            for content in new_contents:
-                                await self._send_rendered_content(int(group_id), content)
+                    for group_id in list(self.subscriptions.groups_for(up_uid)):
+                        for content in new_contents:
+                            await self._send_rendered_content(int(group_id), content)
                 else:
                     logger.debug("BilibiliScheduler", f"UP主 {up_uid} 暂无新动态")
 
             except Exception as e:
                 logger.warn("BilibiliScheduler", f"处理UP主 {up_uid} 动态时出错: {e}")
 
+        # 本轮所有 UP主的 baseline 变化一次写入
+        self.save_update_baselines()
+
     async def _send_rendered_content(self, group_id: int, content: RenderedContent):
         """发送渲染后的内容到群"""
         try:
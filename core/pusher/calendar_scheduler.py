@@ -1,9 +1,7 @@
-import json
-import os
 import random
 from copy import deepcopy
 from datetime import datetime, time, timedelta
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Optional
 from zoneinfo import ZoneInfo
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -11,52 +9,39 @@ from apscheduler.triggers.date import DateTrigger
 
 from adapter.napcat.http_api import NapCatHttpClient
 from infra.logger import logger
+from infra.state_store import GROUP_TARGET, get_state_store
 from service.calendar.date_utils import add_special_info
 from service.calendar.models import DateMeta
 from service.calendar.service import CalendarService
 from service.llm.chat import LLMService
+from .subscription_index import SubscriptionIndex
 
 
 class CalendarScheduler:
-    def __init__(self, http_client):
+    def __init__(self, http_client, llm: Optional[LLMService] = None):
         self.service = CalendarService()
-        self.llm = LLMService()
+        # 复用 Handler 的 LLMService，避免重复注册每日记忆摘要任务
+        self.llm = llm or LLMService()
         self.client: NapCatHttpClient = http_client
-        self.subscriptions: Dict[str, bool] = {}
-        self.subscriptions = self.load_subscriptions("cache/calendar_subscriptions.json")
-        self.group_special_days: Dict[str, List[Tuple[str, str]]] = {}
-        self.group_special_days = self.load_special_days("cache/calendar_special_days.json")
+        self.subscriptions = SubscriptionIndex("calendar")
+        self.state = get_state_store()
+        self.group_special_days: Dict[str, List[Tuple[str, str]]] = self.state.special_days()
         self.scheduler = AsyncIOScheduler(timezone="Asia/Shanghai")
 
     def subscribe(self, group_id: str):
-        self.subscriptions[group_id] = True
-        self.save_subscriptions()
+        self.subscriptions.add(group_id, GROUP_TARGET)
 
     def unsubscribe(self, group_id: str):
-        if group_id in self.subscriptions:
-            del self.subscriptions[group_id]
-            self.save_subscriptions()
+        self.subscriptions.remove(group_id, GROUP_TARGET)
 
     def is_subscribed(self, group_id: str) -> bool:
-        return self.subscriptions.get(group_id, False)
-
-    def save_subscriptions(self):
-        os.makedirs("cache", exist_ok=True)
-        with open("cache/calendar_subscriptions.json", "w", encoding="utf-8") as f:
-            json.dump(self.subscriptions, f, ensure_ascii=False, indent=2)
-
-    @staticmethod
-    def load_subscriptions(json_file: str) -> Dict[str, bool]:
-        if not os.path.exists(json_file):
-            return {}
-        with open(json_file, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return group_id in self.subscriptions
 
     def add_special(self, group_id: str, date_str: str, content: str):
         """新增某群的某条特殊日程"""
         self.group_special_days.setdefault(group_id, [])
         self.group_special_days[group_id].append((date_str, content))
-        self.save_special_days()
+        self.state.add_special_day(group_id, date_str, content)
 
     def remove_special(self, group_id: str, date_str: str):
         """删除某群指定日期的特殊日程"""
@@ -64,32 +49,12 @@ class CalendarScheduler:
             self.group_special_days[group_id] = [
                 (d, c) for d, c in self.group_special_days[group_id] if d != date_str
             ]
-            self.save_special_days()
+            self.state.remove_special_days(group_id, date_str)
 
     def list_special(self, group_id: str) -> List[Tuple]:
         """获取某群全部特殊日程"""
         return self.group_special_days.get(group_id, [])
 
-    def save_special_days(self):
-        os.makedirs("cache", exist_ok=True)
-        with open("cache/calendar_special_days.json", "w", encoding="utf-8") as f:
-            # 将 tuple 转成 list，方便 JSON 序列化
-            json.dump(
-                {k: [list(item) for item in v] for k, v in self.group_special_days.items()},
-                f,
-                ensure_ascii=False,
-                indent=2,
-            )
-
-    @staticmethod
-    def load_special_days(json_file: str) -> Dict[str, List[Tuple]]:
-        if not os.path.exists(json_file):
-            return {}
-        with open(json_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        # 把 list 转回 tuple
-        return {k: [tuple(item) for item in v] for k, v in data.items()}
-
     @staticmethod
     def _roll(probability: float = 0.7) -> bool:
         """
@@ -112,13 +77,13 @@ class CalendarScheduler:
         self.scheduler.shutdown(wait=True)
 
     async def schedule_for_today(self):
+        # 日历订阅与特殊日程只能手工修改状态库，每天排程前重新检查一次
+        self.subscriptions.reload_if_changed()
+        self.group_special_days = self.state.special_days()
         meta = self.service.today()
         logger.info("Calendar Scheduler", f"今日信息：{meta}")
 
         for gid in self.subscriptions:
-            if not self.subscriptions[gid]:
-                continue
-
             meta_clone = deepcopy(meta)
 
             specials = self.list_special(gid)
@@ -1,16 +1,17 @@
 """B站直播订阅调度器"""
 
 import asyncio
-import json
-import os
 from typing import Dict, List, Set
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from adapter.napcat.http_api import NapCatHttpClient
+from infra.config.settings import settings
 from infra.logger import logger
+from infra.state_store import get_state_store
 from service.bilibili.client import BiliClient
 from service.bilibili.models import LiveRoomInfo
+from .subscription_index import SubscriptionIndex
 
 
 class LiveScheduler:
@@ -21,24 +22,17 @@ class LiveScheduler:
         self.bili_client = BiliClient()
 
         # 群 -> UP主UID列表 映射
-        self.subscriptions: Dict[str, List[str]] = {}
+        self.subscriptions = SubscriptionIndex("live")
+        self.state = get_state_store()
         # UP主UID -> 是否正在直播 映射（用于检测开播）
-        self.live_status: Dict[str, bool] = {}
-
-        self.subscriptions = self._load_subscriptions("cache/live_subscriptions.json")
-        self.live_status = self._load_live_status("cache/live_status.json")
+        self.live_status: Dict[str, bool] = self.state.get_values("live_status")
         self.scheduler = AsyncIOScheduler(timezone="Asia/Shanghai")
 
     def subscribe(self, group_id: str, up_uid: str) -> bool:
         """订阅UP主直播通知"""
-        if group_id not in self.subscriptions:
-            self.subscriptions[group_id] = []
-
-        if up_uid in self.subscriptions[group_id]:
+        if not self.subscriptions.add(group_id, up_uid):
             return False  # 已订阅
 
-        self.subscriptions[group_id].append(up_uid)
-        self._save_subscriptions()
         logger.info("LiveScheduler", f"群 {group_id} 订阅了UP主 {up_uid} 的直播")
 
         # 初始化直播状态（防止首次运行时误推送）
@@ -47,13 +41,9 @@ class LiveScheduler:
 
     def unsubscribe(self, group_id: str, up_uid: str) -> bool:
         """取消订阅UP主直播通知"""
-        if group_id not in self.subscriptions:
-            return False
-        if up_uid not in self.subscriptions[group_id]:
+        if not self.subscriptions.remove(group_id, up_uid):
             return False
 
-        self.subscriptions[group_id].remove(up_uid)
-        self._save_subscriptions()
         logger.info("LiveScheduler", f"群 {group_id} 取消订阅了UP主 {up_uid} 的直播")
         return True
 
@@ -63,35 +53,7 @@ class LiveScheduler:
 
     def is_subscribed(self, group_id: str, up_uid: str) -> bool:
         """检查群是否已订阅指定UP主直播"""
-        return group_id in self.subscriptions and up_uid in self.subscriptions[group_id]
-
-    def _save_subscriptions(self):
-        """保存订阅信息到文件"""
-        os.makedirs("cache", exist_ok=True)
-        with open("cache/live_subscriptions.json", "w", encoding="utf-8") as f:
-            json.dump(self.subscriptions, f, ensure_ascii=False, indent=2)
-
-    def _save_live_status(self):
-        """保存直播状态到文件"""
-        os.makedirs("cache", exist_ok=True)
-        with open("cache/live_status.json", "w", encoding="utf-8") as f:
-            json.dump(self.live_status, f, ensure_ascii=False, indent=2)
-
-    @staticmethod
-    def _load_subscriptions(json_file: str) -> Dict[str, List[str]]:
-        """从文件加载订阅信息"""
-        if not os.path.exists(json_file):
-            return {}
-        with open(json_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-
-    @staticmethod
-    def _load_live_status(json_file: str) -> Dict[str, bool]:
-        """从文件加载直播状态"""
-        if not os.path.exists(json_file):
-            return {}
-        with open(json_file, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return self.subscriptions.contains(group_id, up_uid)
 
     async def _initialize_live_status(self, up_uid: str):
         """初始化UP主的直播状态"""
@@ -99,7 +61,7 @@ class LiveScheduler:
             room_info = await self.bili_client.get_live_room_by_mid(int(up_uid))
             if room_info:
                 self.live_status[up_uid] = room_info.is_living
-                self._save_live_status()
+                self.state.put_values("live_status", {up_uid: room_info.is_living})
                 logger.info("LiveScheduler", f"UP主 {up_uid} 直播状态已初始化: {'直播中' if room_info.is_living else '未开播'}")
         except Exception as e:
             logger.warn("LiveScheduler", f"初始化UP主 {up_uid} 直播状态时出错: {e}")
@@ -113,6 +75,12 @@ class LiveScheduler:
             minutes=2,
             id="check_live_status",
         )
+        self.scheduler.add_job(
+            self.subscriptions.reload_if_changed,
+            trigger="interval",
+            seconds=settings.SUBSCRIPTION_SYNC_SECONDS,
+            id="sync_live_subscriptions",
+        )
         self.scheduler.start()
         logger.info("LiveScheduler", "直播订阅调度器已启动")
 
@@ -123,9 +91,7 @@ class LiveScheduler:
     async def _check_all_live_status(self):
         """检查所有订阅的UP主是否开播"""
         # 收集所有订阅的UP主UID
-        all_uids: Set[int] = set()
-        for group_ups in self.subscriptions.values():
-            all_uids.update(int(uid) for uid in group_ups)
+        all_uids: Set[int] = {int(uid) for uid in self.subscriptions.targets()}
 
         if not all_uids:
             return
@@ -133,6 +99,8 @@ class LiveScheduler:
         try:
             # 批量查询直播状态
             live_info_map = await self.bili_client.get_live_status_by_uids(list(all_uids))
+            # 只写入状态发生变化的 UP主
+            changed: Dict[str, bool] = {}
 
             for uid, room_info in live_info_map.items():
                 uid_str = str(uid)
@@ -143,14 +111,15 @@ class LiveScheduler:
                 if is_living and not was_living:
                     logger.info("LiveScheduler", f"UP主 {room_info.uname}({uid}) 开播了: {room_info.title}")
                     # 向所有订阅该UP主的群发送开播通知
-                    for group_id, subscribed_ups in self.subscriptions.items():
-                        if uid_str in subscribed_ups:
-                            await self._send_live_notification(int(group_id), room_info)
+                    for group_id in list(self.subscriptions.groups_for(uid_str)):
+                        await self._send_live_notification(int(group_id), room_info)
 
                 # 更新状态
+                if self.live_status.get(uid_str) != is_living:
+                    changed[uid_str] = is_living
                 self.live_status[uid_str] = is_living
 
-            self._save_live_status()
+            self.state.put_values("live_status", changed)
 
         except Exception as e:
             logger.warn("LiveScheduler", f"检查直播状态时出错: {e}")
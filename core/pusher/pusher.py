@@ -14,7 +14,7 @@ class Pusher:
     def start(self):
         # 复用 Handler 的调度器实例
         # 日历调度器不需要订阅管理，独立创建
-        calendar_push = CalendarScheduler(self._client)
+        calendar_push = CalendarScheduler(self._client, self._handler.llm_svc)
 
         # 启动各调度器
         self._handler.weather_scheduler.start()
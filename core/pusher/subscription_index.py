@@ -0,0 +1,87 @@
+from collections.abc import Mapping
+from typing import AbstractSet, Dict, Iterator, List, Optional, Set
+
+from infra.logger import logger
+from infra.state_store import StateStore, get_state_store
+
+
+class SubscriptionIndex(Mapping):
+    """
+    某一类订阅的双向内存索引，调度任务只读内存，不再读盘解析
+
+    - 正向：群 -> 订阅目标列表（保持订阅先后顺序，用于展示），即 Mapping 接口本身
+    - 反向：订阅目标 -> 订阅它的群集合，推送时按目标直接取接收群，成本只与接收群数量相关
+    - add / remove 增量维护两个方向，再在一个事务中写入状态库
+    - reload_if_changed() 通过状态库的 data_version 检测外部修改（如手工编辑数据库），有变化时重新载入
+    """
+
+    def __init__(self, kind: str, store: Optional[StateStore] = None):
+        self.kind = kind
+        self.store = store or get_state_store()
+        self._data: Dict[str, List[str]] = {}
+        self._groups: Dict[str, Set[str]] = {}
+        self._data_version = -1
+        self._load()
+
+    def __getitem__(self, group_id: str) -> List[str]:
+        return self._data[group_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def contains(self, group_id: str, target: str) -> bool:
+        return group_id in self._groups.get(target, ())
+
+    def groups_for(self, target: str) -> AbstractSet[str]:
+        """订阅了该目标的群"""
+        return self._groups.get(target, frozenset())
+
+    def targets(self) -> AbstractSet[str]:
+        """至少被一个群订阅的全部目标"""
+        return self._groups.keys()
+
+    def add(self, group_id: str, *targets: str) -> List[str]:
+        """订阅，返回此前未订阅、实际新增的目标"""
+        added = [target for target in dict.fromkeys(targets) if not self.contains(group_id, target)]
+        if not added:
+            return added
+        self._data.setdefault(group_id, []).extend(added)
+        for target in added:
+            self._groups.setdefault(target, set()).add(group_id)
+        self.store.add_subscriptions(self.kind, group_id, added)
+        return added
+
+    def remove(self, group_id: str, *targets: str) -> List[str]:
+        """取消订阅，返回实际移除的目标"""
+        removed = [target for target in dict.fromkeys(targets) if self.contains(group_id, target)]
+        if not removed:
+            return removed
+        for target in removed:
+            self._data[group_id].remove(target)
+            groups = self._groups[target]
+            groups.discard(group_id)
+            if not groups:
+                del self._groups[target]
+        if not self._data[group_id]:
+            del self._data[group_id]
+        self.store.remove_subscriptions(self.kind, group_id, removed)
+        return removed
+
+    def reload_if_changed(self) -> bool:
+        """状态库被其他连接修改过时重新载入，返回是否重新载入"""
+        if self.store.data_version() == self._data_version:
+            return False
+        logger.info("Subscription", f"检测到状态库被外部修改，重新载入 {self.kind} 订阅")
+        self._load()
+        return True
+
+    def _load(self) -> None:
+        self._data_version = self.store.data_version()
+        self._data = self.store.subscriptions(self.kind)
+        self._groups = {}
+        for group_id, targets in self._data.items():
+            for target in targets:
+                self._groups.setdefault(target, set()).add(group_id)
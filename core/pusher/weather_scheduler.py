@@ -1,15 +1,18 @@
-import json
-import os
+import asyncio
+import heapq
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from zoneinfo import ZoneInfo
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from adapter.napcat.http_api import NapCatHttpClient
+from infra.config.settings import settings
 from infra.logger import logger
-from service.weather.models import WarningInfo
+from infra.state_store import get_state_store
+from service.weather.models import Location, WarningInfo, WeatherResponse
 from service.weather.service import WeatherService
+from .subscription_index import SubscriptionIndex
 
 EMOJI_MAP = {
     "晴": "☀️",
@@ -26,6 +29,9 @@ EMOJI_MAP = {
     "沙尘暴": "🏜️",
 }
 
+# 最早的预警缓存格式（群 -> token）迁移时暂存的地点键
+_LEGACY_LOCATION = ""
+
 
 def _emoji(text: str) -> str:
     for k, v in EMOJI_MAP.items():
@@ -39,106 +45,143 @@ class WeatherScheduler:
         self.service = WeatherService()
         self.client: NapCatHttpClient = http_client
         # 群 -> 关注城市 映射
-        self.subscriptions: Dict[str, List[str]] = {}
-        self.subscriptions = self.load_subscriptions("cache/weather_subscriptions.json")
-        self.warning_cache: Dict[str, Set[str]] = {}
-        self.warning_cache = self.load_warning_cache("cache/warning_cache.json")
+        self.subscriptions = SubscriptionIndex("weather")
+        self.state = get_state_store()
+        # 地点 ID -> 预警 token（id@过期时间）-> 已推送过的群
+        self.warning_index: Dict[str, Dict[str, Set[str]]] = {}
+        # (过期时间戳, 地点 ID, token) 小顶堆，按过期时间清理预警索引
+        self._warning_expiry: List[Tuple[float, str, str]] = []
+        for location_id, tokens in self.state.warning_deliveries().items():
+            for token, (expires_at, groups) in tokens.items():
+                self.warning_index.setdefault(location_id, {})[token] = groups
+                self._warning_expiry.append((expires_at, location_id, token))
+        heapq.heapify(self._warning_expiry)
         self.scheduler = AsyncIOScheduler(timezone="Asia/Shanghai")
 
     def subscribe(self, group_id: str, *cities: str):
-        self.subscriptions.setdefault(group_id, [])
-        self.subscriptions[group_id].extend(cities)
-        self.subscriptions[group_id] = list(dict.fromkeys(self.subscriptions[group_id]))  # 去重
-        self.save_subscriptions("cache/weather_subscriptions.json")
+        self.subscriptions.add(group_id, *cities)
 
     def unsubscribe(self, group_id: str, city: str):
-        if group_id in self.subscriptions:
-            try:
-                self.subscriptions[group_id].remove(city)
-            except ValueError:
-                pass
-            self.save_subscriptions("cache/weather_subscriptions.json")
-
-    @staticmethod
-    def load_subscriptions(json_file: str) -> Dict[str, List[str]]:
-        if not os.path.exists(json_file):
-            return {}
-        with open(json_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-
-    def save_subscriptions(self, json_file: str):
-        try:
-            with open(json_file, 'w', encoding='utf-8') as f:
-                json.dump(self.subscriptions, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存订阅信息失败: {e}")
-
-    @staticmethod
-    def load_warning_cache(json_file: str) -> Dict[str, Set[str]]:
-        if not os.path.exists(json_file):
-            return {}
-        with open(json_file, "r", encoding="utf-8") as f:
-            return {k: set(v) for k, v in json.load(f).items()}
-
-    def save_warning_cache(self, json_file: str):
-        # set -> list 才能序列化
-        os.makedirs(os.path.dirname(json_file), exist_ok=True)
-        with open(json_file, "w", encoding="utf-8") as f:
-            json.dump({k: list(v) for k, v in self.warning_cache.items()}, f, ensure_ascii=False, indent=2)
+        self.subscriptions.remove(group_id, city)
 
     async def push_daily_forecast(self, group_id: str) -> str:
         cities = self.subscriptions.get(group_id, [])
         if not cities:
             return ""
+        blocks = await self._fetch_city_blocks(cities)
+        return self._assemble_daily_message(cities, blocks)
 
-        today = datetime.now(tz=ZoneInfo("Asia/Shanghai"))
-        formatted_date = f"{today.month}月{today.day}日"
+    async def _fetch_city_blocks(self, cities: Iterable[str]) -> Dict[str, str]:
+        """并发获取各城市今日预报并格式化，每个城市只请求、格式化一次"""
+        semaphore = asyncio.Semaphore(settings.WEATHER_PUSH_CONCURRENCY)
 
-        lines = ["📅 *今日天气播报* " + formatted_date]
-        for city in cities:
-            resp = await self.service.get_today(city)
-            if not resp or not resp.daily:
-                lines.append(f"⚠️ {city}：获取失败")
-                continue
-
-            f = resp.daily[0]
-            emoji_day = _emoji(f.textDay)
-            emoji_night = _emoji(f.textNight)
-            lines.append(
-                f"{emoji_day} {resp.location.name}\n"
-                f"🌅 日间 {emoji_day}{f.textDay} / 🌃 夜间 {emoji_night}{f.textNight}\n"
-                f"🌡️ {f.tempMin}°C ~ {f.tempMax}°C\n"
-                f"💨 {f.windDirDay} {f.windScaleDay} 级"
-            )
+        async def fetch(city: str) -> Tuple[str, str]:
+            async with semaphore:
+                try:
+                    resp = await self.service.get_today(city)
+                except Exception as e:
+                    logger.warn("Weather", f"[{city}] 获取今日预报失败: {e}")
+                    resp = None
+            return city, self._format_city_block(city, resp)
 
-        return "\n\n".join(lines)
+        return dict(await asyncio.gather(*[fetch(city) for city in dict.fromkeys(cities)]))
 
-    async def push_warning_for_group(self, group_id: str):
-        cities = self.subscriptions.get(group_id, [])
-        if not cities:
-            return
+    @staticmethod
+    def _format_city_block(city: str, resp: Optional[WeatherResponse]) -> str:
+        if not resp or not resp.daily:
+            return f"⚠️ {city}：获取失败"
+
+        f = resp.daily[0]
+        emoji_day = _emoji(f.textDay)
+        emoji_night = _emoji(f.textNight)
+        return (
+            f"{emoji_day} {resp.location.name}\n"
+            f"🌅 日间 {emoji_day}{f.textDay} / 🌃 夜间 {emoji_night}{f.textNight}\n"
+            f"🌡️ {f.tempMin}°C ~ {f.tempMax}°C\n"
+            f"💨 {f.windDirDay} {f.windScaleDay} 级"
+        )
 
-        # 每个群有独立的缓存 set
-        sent = self.warning_cache.setdefault(group_id, set())
+    @staticmethod
+    def _assemble_daily_message(cities: List[str], blocks: Dict[str, str]) -> str:
+        today = datetime.now(tz=ZoneInfo("Asia/Shanghai"))
+        formatted_date = f"{today.month}月{today.day}日"
 
-        for city in cities:
-            warn_resp = await self.service.get_warning(city)
-            if not warn_resp or not warn_resp.warningInfo:
-                continue
+        lines = ["📅 *今日天气播报* " + formatted_date]
+        lines.extend(blocks[city] for city in cities)
+        return "\n\n".join(lines)
 
-            for w in warn_resp.warningInfo:
+    async def sweep_warnings(self) -> int:
+        """
+        按地点巡检预警：所有群订阅的城市先解析并按地点 ID 去重，每个地点只查询一次预警，
+        新预警推送给订阅了该地点且尚未收到的群，整轮结束后统一落盘，返回推送的消息数
+        """
+        # 地点 ID -> {群: 该群订阅时使用的城市名}
+        targets: Dict[str, Dict[str, str]] = {}
+        semaphore = asyncio.Semaphore(settings.WEATHER_PUSH_CONCURRENCY)
+
+        async def resolve(city: str) -> Tuple[str, Optional[Location]]:
+            async with semaphore:
+                return city, await self.service.get_location(city)
+
+        cities = list(self.subscriptions.targets())
+        locations = dict(await asyncio.gather(*[resolve(city) for city in cities]))
+        for city, location in locations.items():
+            if location:
+                for group_id in self.subscriptions.groups_for(city):
+                    targets.setdefault(location.id, {}).setdefault(group_id, city)
+
+        async def fetch(location_id: str) -> Tuple[str, Optional[List[WarningInfo]]]:
+            async with semaphore:
+                return location_id, await self.service.get_warning_by_location(location_id)
+
+        results = await asyncio.gather(*[fetch(location_id) for location_id in targets])
+
+        sent_count = 0
+        # 本轮新增的推送记录 (地点 ID, token, 群, 过期时间戳) 与并入实际地点的旧格式 token，整轮结束后一次写入
+        deliveries: List[Tuple[str, str, str, float]] = []
+        merged_legacy: List[str] = []
+        for location_id, warnings in results:
+            for w in warnings or []:
                 token = f"{w.id}@{self._calc_expire_time(w).isoformat()}"
-                if token in sent:
-                    continue  # 已推送过
-
-                # 首次出现，立即推送
-                msg = self._generate_warning_message(city, w)
-                await self.client.send_group_msg(int(group_id), msg)
-                sent.add(token)
-
-        self.save_warning_cache("cache/warning_cache.json")
+                expires_at = self._token_expire_ts(token)
+                location_tokens = self.warning_index.setdefault(location_id, {})
+                if token not in location_tokens:
+                    legacy = self.warning_index.get(_LEGACY_LOCATION, {}).pop(token, None)
+                    location_tokens[token] = set()
+                    if legacy:
+                        location_tokens[token] |= legacy
+                        merged_legacy.append(token)
+                        deliveries.extend((location_id, token, group_id, expires_at) for group_id in legacy)
+                    heapq.heappush(self._warning_expiry, (expires_at, location_id, token))
+                sent = location_tokens[token]
+                for group_id, city in targets[location_id].items():
+                    if group_id in sent:
+                        continue  # 已推送过
+
+                    # 首次出现，立即推送
+                    try:
+                        await self.client.send_group_msg(int(group_id), self._generate_warning_message(city, w))
+                    except Exception as e:
+                        logger.warn("Weather", f"向群 {group_id} 推送预警失败: {e}")
+                        continue
+                    sent.add(group_id)
+                    sent_count += 1
+                    deliveries.append((location_id, token, group_id, expires_at))
+
+        if deliveries or merged_legacy:
+            with self.state.batch():
+                for token in merged_legacy:
+                    self.state.delete_warning_token(_LEGACY_LOCATION, token)
+                self.state.add_warning_deliveries(deliveries)
+        return sent_count
 
     def start(self):
+        # 启动后立即预查询已订阅的城市，此后的推送与预警检查不再请求 GeoAPI
+        self.scheduler.add_job(
+            self._warm_up_locations,
+            trigger="date",
+            id="warm_up_locations",
+        )
         self.scheduler.add_job(
             self._send_daily_forecast,
             trigger="cron",
@@ -153,22 +196,61 @@ class WeatherScheduler:
             minute="30",
             id="push_warnings",
         )
+        self.scheduler.add_job(
+            self._sync_subscriptions,
+            trigger="interval",
+            seconds=settings.SUBSCRIPTION_SYNC_SECONDS,
+            id="sync_weather_subscriptions",
+        )
+        if settings.TYPHOON_PRERENDER_MINUTES > 0:
+            self.scheduler.add_job(
+                self._prerender_typhoons,
+                trigger="interval",
+                minutes=settings.TYPHOON_PRERENDER_MINUTES,
+                id="prerender_typhoons",
+            )
         self.scheduler.start()
 
     def stop(self):
         self.scheduler.shutdown(wait=True)
 
+    def _sync_subscriptions(self):
+        """状态库中的订阅被手工修改时重新载入"""
+        self.subscriptions.reload_if_changed()
+
+    async def _prerender_typhoons(self):
+        """查询活跃台风，有新的观测点时由天气服务在后台预渲染路径图"""
+        await self.service.get_storm()
+
+    async def _warm_up_locations(self):
+        cities = list(self.subscriptions.targets())
+        fetched = await self.service.warm_up_locations(cities)
+        if fetched:
+            logger.info("Weather", f"已预查询 {fetched} 个订阅城市的位置信息")
+
     async def _send_daily_forecast(self):
-        self._load_new_subscriptions()
-        for group_id in self.subscriptions:
-            msg = await self.push_daily_forecast(group_id)
-            await self.client.send_group_msg(int(group_id), msg)
+        # 先汇总所有群订阅的城市统一获取，再按群拼装消息，同一城市只请求一次
+        targets = {group_id: list(cities) for group_id, cities in self.subscriptions.items() if cities}
+        blocks = await self._fetch_city_blocks(city for cities in targets.values() for city in cities)
+        for group_id, cities in targets.items():
+            try:
+                await self.client.send_group_msg(int(group_id), self._assemble_daily_message(cities, blocks))
+            except Exception as e:
+                logger.warn("Weather", f"向群 {group_id} 推送天气播报失败: {e}")
+        self._log_cache_stats()
 
     async def _send_warnings(self):
-        self._load_new_subscriptions()
         self._clean_expired_warnings()
-        for group_id in self.subscriptions:
-            await self.push_warning_for_group(group_id)
+        sent = await self.sweep_warnings()
+        if sent:
+            logger.info("Weather", f"本轮预警巡检推送 {sent} 条消息")
+
+    def _log_cache_stats(self):
+        stats = self.service.cache_stats()
+        if stats:
+            logger.info("Weather", "接口缓存命中率：" + "，".join(
+                f"{endpoint} {item['hit_rate']:.0%}（共 {item['total']} 次）"
+                for endpoint, item in stats.items()))
 
     @staticmethod
     def _generate_warning_message(city: str, warning: WarningInfo) -> str:
@@ -260,9 +342,6 @@ class WeatherScheduler:
 
         return "\n".join(lines)
 
-    def _load_new_subscriptions(self):
-        self.subscriptions = self.load_subscriptions("cache/weather_subscriptions.json")
-
     @staticmethod
     def _calc_expire_time(warning: WarningInfo) -> datetime:
         # 优先用 endTime
@@ -272,24 +351,28 @@ class WeatherScheduler:
         base = datetime.fromisoformat(warning.startTime)
         return base + timedelta(hours=24)
 
+    @staticmethod
+    def _token_expire_ts(token: str) -> float:
+        """token 中的过期时间，解析失败视为已过期"""
+        # noinspection PyBroadException
+        try:
+            _, expire_str = token.rsplit("@", 1)
+            return datetime.fromisoformat(expire_str).timestamp()
+        except Exception:
+            logger.warn("Weather", "过期时间解析失败")
+            return 0.0
+
     def _clean_expired_warnings(self):
-        now = datetime.now(timezone.utc)  # 统一用 UTC 比较
+        now = datetime.now(timezone.utc).timestamp()
         removed = 0
-        for group_id, id_set in self.warning_cache.items():
-            to_remove = set()
-            for token in id_set:
-                # noinspection PyBroadException
-                try:
-                    _, expire_str = token.rsplit("@", 1)
-                    expire_dt = datetime.fromisoformat(expire_str)
-                    if expire_dt <= now:
-                        to_remove.add(token)
-                except Exception:
-                    logger.warn("Weather", "过期时间解析失败")
-                    to_remove.add(token)  # 解析失败也删
-            id_set -= to_remove
-            removed += len(to_remove)
+        while self._warning_expiry and self._warning_expiry[0][0] <= now:
+            _, location_id, token = heapq.heappop(self._warning_expiry)
+            tokens = self.warning_index.get(location_id)
+            if tokens is not None and tokens.pop(token, None) is not None:
+                removed += 1
+                if not tokens:
+                    del self.warning_index[location_id]
 
         if removed:
+            self.state.delete_expired_warnings(now)
             logger.info("Weather", f"已清理 {removed} 条过期预警缓存")
-            self.save_warning_cache("cache/warning_cache.json")
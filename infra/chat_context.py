@@ -0,0 +1,24 @@
+"""
+对话上下文传播
+
+在一次对话处理开始时通过 group_scope 记录当前群号，
+下游的工具函数（如记忆检索）通过 current_group_id 读取，只检索本群的数据。
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+_group_id: ContextVar[Optional[str]] = ContextVar("group_id", default=None)
+
+
+@contextmanager
+def group_scope(group_id: str) -> Iterator[None]:
+    token = _group_id.set(str(group_id))
+    try:
+        yield
+    finally:
+        _group_id.reset(token)
+
+
+def current_group_id() -> Optional[str]:
+    return _group_id.get()
@@ -1,5 +1,6 @@
 from typing import Literal
 
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -33,19 +34,84 @@ class Settings(BaseSettings):
     LLM_BASE_URL: str = "<BASE_URL>"
     LLM_API_KEY: str = "<KEY>"
     LLM_MODEL: str = "<MODEL_NAME>"
+    LLM_SOFT_DEADLINE: float = 8.0    # 软截止时间（秒），超时未回复先发送过渡消息
+    LLM_HARD_DEADLINE: float = 25.0   # 硬截止时间（秒），从收到消息到生成回复的总时限
+    LLM_REPLY_RESERVE: float = 8.0    # 硬截止时间中为生成回复预留的秒数，工具调用超出其余时间即取消并使用已有结果
+
+    # 对话记忆存储
+    MEMORY_DB_PATH: str = "cache/memory.db"  # 对话日志 SQLite 文件
+    MEMORY_HOT_GROUPS: int = 256             # 内存中保留短记忆的活跃群数量
+    MEMORY_RETENTION_DAYS: int = 30          # 已摘要对话在日志中的保留天数
+    MEMORY_SUMMARY_CHUNK_TOKENS: int = 3000  # 日摘要分块的 token 上限
+    MEMORY_SUMMARY_PARALLELISM: int = 4      # 日摘要分块并发数
+    MEMORY_ARCHIVE_COMPRESS_LEVEL: int = 6   # 已结束月份记忆分片的 gzip 压缩级别，0 不压缩
 
     # 和风天气 API
     WEATHER_API_HOST: str = "<URL>"
     WEATHER_API_KEY: str = "<KEY>"
+    WEATHER_GEO_CACHE_PATH: str = "cache/weather_geo_cache.json"  # 城市 -> 地点缓存文件
+    WEATHER_GEO_TTL_DAYS: float = 30.0          # 城市查询结果的缓存天数
+    WEATHER_GEO_NEGATIVE_TTL_HOURS: float = 24.0  # 查不到的城市名的缓存小时数
+    WEATHER_NOW_TTL_SECONDS: float = 600.0        # 实时天气缓存秒数（和风约 10 分钟更新一次）
+    WEATHER_FORECAST_TTL_SECONDS: float = 3600.0  # 7 天预报缓存秒数
+    WEATHER_WARNING_TTL_SECONDS: float = 300.0    # 预警缓存秒数（过期后不返回旧数据）
+    WEATHER_STALE_SECONDS: float = 1800.0         # 实时天气与预报过期后仍先返回旧数据并后台刷新的秒数
+    WEATHER_PUSH_CONCURRENCY: int = 8             # 每日播报并发获取城市预报的上限
+    TYPHOON_RENDER_WORKERS: int = 1               # 台风路径图渲染进程数，也是同时渲染的上限
+    TYPHOON_IMAGE_DIR: str = "cache/typhoon_images"  # 台风路径图缓存目录
+    TYPHOON_IMAGE_MAX_MB: int = 200               # 台风路径图缓存总大小上限（MB），<= 0 不限
+    TYPHOON_IMAGE_MAX_AGE_DAYS: float = 7.0       # 台风路径图缓存保存天数，<= 0 不限
+    TYPHOON_PRERENDER_MINUTES: int = 30           # 检查活跃台风并预渲染路径图的间隔分钟数，<= 0 关闭预渲染
+
+    # 调度器状态
+    STATE_DB_PATH: str = "cache/state.db"  # 订阅关系、推送记录等调度器状态的 SQLite 文件
+    SUBSCRIPTION_SYNC_SECONDS: int = 60    # 检查状态库中订阅被手工修改的间隔秒数
 
     # Embeddings API
+    # dashscope: DashScope SDK；openai: OpenAI 兼容接口（异步并发，需配置 EMBEDDINGS_BASE_URL）；
+    # hashing: 本地字符 n-gram 哈希向量；onnx: 本地 ONNX 句向量模型
+    EMBEDDINGS_BACKEND: str = "dashscope"
     EMBEDDINGS_BASE_URL: str = "<BASE_URL>"
     EMBEDDINGS_API_KEY: str = "<KEY>"
     EMBEDDINGS_MODEL: str = "<MODEL_NAME>"
+    EMBEDDINGS_CACHE_PATH: str = "cache/embeddings.db"  # 嵌入向量缓存 SQLite 文件
+    EMBEDDINGS_QUERY_CACHE_SIZE: int = 512             # 内存中缓存的查询向量数量
+    EMBEDDINGS_BATCH_SIZE: int = 10        # 单次请求的文本数
+    EMBEDDINGS_CONCURRENCY: int = 4        # 文档嵌入的并发请求数
+    EMBEDDINGS_RATE_LIMIT: float = 10.0    # 每秒最多请求数，<= 0 不限速
+    EMBEDDINGS_MICROBATCH_MS: float = 5.0  # 合并并发查询嵌入的等待时间（毫秒），<= 0 不合并
+    EMBEDDINGS_DIM: int = 512              # hashing 后端的向量维度
+    EMBEDDINGS_LOCAL_MODEL_PATH: str = ""  # onnx 后端的模型目录（含 model.onnx 与 tokenizer.json）
+
+    # RAG 文档检索
+    RAG_DOCS_DIR: str = "rag_docs"       # 文档与索引目录
+    RAG_WATCH_INTERVAL: float = 60.0     # 后台检查文档变更的间隔（秒）
+    RAG_MEMORY_CACHED_SHARDS: int = 64   # 内存中保留的记忆索引分区（群 × 月）数量
+    RAG_CHUNK_SIZE: int = 1000           # 文档分块长度（字符），修改后索引自动重建
+    RAG_CHUNK_OVERLAP: int = 100         # 相邻分块的重叠长度（字符）
+    RAG_QUERY_MODE: str = "hybrid"       # 检索模式：vector（仅向量）/ hybrid（BM25 置信时直接返回，否则与向量结果融合）
+    RAG_BM25_MIN_COVERAGE: float = 0.8   # BM25 首条结果覆盖查询词（按 IDF 加权）的比例达到该值才视为置信
+    RAG_BM25_MIN_SCORE: float = 1.5      # BM25 首条结果的最低分数，低于该值不视为置信
+    # 向量索引类型；IVF/HNSW 在分区向量数达到训练阈值前使用 Flat，达到后自动训练转换
+    RAG_INDEX_TYPE: Literal["flat", "ivf_flat", "hnsw", "ivf_pq"] = "flat"
+    RAG_INDEX_TRAIN_THRESHOLD: int = 20000  # 转换为目标索引类型的向量数阈值
+    RAG_IVF_NPROBE: int = 16             # IVF 查询时探查的聚类数
+    RAG_HNSW_M: int = 32                 # HNSW 每个节点的邻居数
+    RAG_HNSW_EF_SEARCH: int = 64         # HNSW 查询时的候选队列长度
+    RAG_PQ_M: int = 16                   # IVF-PQ 的子量化器数（取不超过该值且能整除维度的最大值）
 
     # 联网搜索 API
     WEB_SEARCH_URL: str = "<URL>"
     WEB_SEARCH_API_KEY: str = "<KEY>"
 
+    @model_validator(mode="after")
+    def _check_embeddings(self) -> "Settings":
+        # 未配置地址时拒绝启动，避免嵌入调用全部失败并以错误的模型标识清空向量缓存
+        if self.EMBEDDINGS_BACKEND == "openai" and (
+            not self.EMBEDDINGS_BASE_URL.strip() or self.EMBEDDINGS_BASE_URL.startswith("<")
+        ):
+            raise ValueError("EMBEDDINGS_BACKEND=openai 需要配置 EMBEDDINGS_BASE_URL（OpenAI 兼容接口地址）")
+        return self
+
 
 settings = Settings()
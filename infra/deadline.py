@@ -0,0 +1,59 @@
+"""
+请求级截止时间（deadline）传播
+
+在一次对话处理开始时通过 deadline_scope 设置截止时间，
+下游的工具调用、HTTP 客户端通过 remaining / clamp_timeout 读取剩余时间，
+从而在截止时间到达时及时放弃请求并释放连接。
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# 截止时间使用 time.monotonic() 的时间基准
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+# 剩余时间的下限，避免传给 HTTP 客户端 0 或负数超时
+_MIN_TIMEOUT = 0.05
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[float]:
+    """
+    在当前上下文中设置截止时间（距现在 seconds 秒）
+    嵌套使用时取更早的截止时间
+    """
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """距截止时间的剩余秒数，未设置截止时间时返回 default"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    return max(0.0, deadline - time.monotonic())
+
+
+def expired() -> bool:
+    deadline = _deadline.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def clamp_timeout(timeout: float) -> float:
+    """将单次请求的超时时间收紧到不超过剩余时间"""
+    left = remaining()
+    if left is None:
+        return timeout
+    return max(_MIN_TIMEOUT, min(timeout, left))
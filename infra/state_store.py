@@ -0,0 +1,311 @@
+"""
+调度器状态的统一存储（SQLite WAL 模式）
+
+各调度器的订阅关系、B站动态 baseline、直播状态、天气预警推送记录、日历特殊日程
+都存放在同一个数据库中，替代此前各自整文件重写的 JSON：
+
+- subscriptions：订阅关系 (kind, group_id, target)，按群或按订阅目标查询均有索引；
+  bangumi / calendar 这类整群开关式订阅的 target 为空字符串
+- kv_state：按命名空间存放的键值状态（B站动态 baseline、直播状态等），值为 JSON
+- warning_deliveries：天气预警 (地点 ID, 预警 token, 群) 的推送记录与过期时间
+- special_days：群的特殊日程
+
+写操作都在事务中完成；batch() 可将多次写入合并为一个事务。
+首次打开时从 cache 目录下的旧 JSON 文件一次性迁移，迁移后旧文件重命名为 *.migrated。
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
+
+from infra.config.settings import settings
+from infra.logger import logger
+
+# 整群开关式订阅（bangumi / calendar）使用的 target
+GROUP_TARGET = ""
+
+
+class StateStore:
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        # batch() 嵌套深度，最外层结束时才提交
+        self._depth = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+
+    def _init_schema(self) -> None:
+        with self.batch():
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS subscriptions (
+                    kind TEXT NOT NULL,
+                    group_id TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    PRIMARY KEY (kind, group_id, target)
+                );
+                CREATE INDEX IF NOT EXISTS idx_subscriptions_target ON subscriptions (kind, target);
+                CREATE TABLE IF NOT EXISTS kv_state (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                );
+                CREATE TABLE IF NOT EXISTS warning_deliveries (
+                    location_id TEXT NOT NULL,
+                    token TEXT NOT NULL,
+                    group_id TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (location_id, token, group_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_warning_deliveries_expires ON warning_deliveries (expires_at);
+                CREATE TABLE IF NOT EXISTS special_days (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    group_id TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    content TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_special_days_group ON special_days (group_id, date);
+            """)
+
+    @contextmanager
+    def batch(self) -> Iterator["StateStore"]:
+        """将块内的多次写入合并为一个事务，块内不能 await"""
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._conn.rollback()
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._conn.commit()
+
+    def data_version(self) -> int:
+        """其他连接（如手工用 sqlite3 修改）提交后会变化，用于检测外部修改"""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    # ---------- 订阅 ---------- #
+    def subscriptions(self, kind: str) -> Dict[str, List[str]]:
+        """群 -> 订阅目标列表（按订阅先后排序）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT group_id, target FROM subscriptions WHERE kind = ? ORDER BY group_id, seq", (kind,)
+            ).fetchall()
+        result: Dict[str, List[str]] = {}
+        for group_id, target in rows:
+            result.setdefault(group_id, []).append(target)
+        return result
+
+    def add_subscriptions(self, kind: str, group_id: str, targets: Sequence[str]) -> None:
+        with self.batch():
+            seq = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM subscriptions WHERE kind = ? AND group_id = ?", (kind, group_id)
+            ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO subscriptions (kind, group_id, target, seq) VALUES (?, ?, ?, ?)",
+                [(kind, group_id, target, seq + i) for i, target in enumerate(targets, 1)],
+            )
+
+    def remove_subscriptions(self, kind: str, group_id: str, targets: Sequence[str]) -> None:
+        with self.batch():
+            self._conn.executemany(
+                "DELETE FROM subscriptions WHERE kind = ? AND group_id = ? AND target = ?",
+                [(kind, group_id, target) for target in targets],
+            )
+
+    # ---------- 键值状态 ---------- #
+    def get_values(self, namespace: str) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM kv_state WHERE namespace = ?", (namespace,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def put_values(self, namespace: str, values: Mapping[str, Any]) -> None:
+        if not values:
+            return
+        with self.batch():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO kv_state (namespace, key, value) VALUES (?, ?, ?)",
+                [(namespace, key, json.dumps(value, ensure_ascii=False)) for key, value in values.items()],
+            )
+
+    # ---------- 天气预警推送记录 ---------- #
+    def warning_deliveries(self) -> Dict[str, Dict[str, Tuple[float, Set[str]]]]:
+        """地点 ID -> 预警 token -> (过期时间戳, 已推送的群)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT location_id, token, group_id, expires_at FROM warning_deliveries"
+            ).fetchall()
+        result: Dict[str, Dict[str, Tuple[float, Set[str]]]] = {}
+        for location_id, token, group_id, expires_at in rows:
+            result.setdefault(location_id, {}).setdefault(token, (expires_at, set()))[1].add(group_id)
+        return result
+
+    def add_warning_deliveries(self, rows: Iterable[Tuple[str, str, str, float]]) -> None:
+        """写入 (地点 ID, token, 群, 过期时间戳) 推送记录"""
+        with self.batch():
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO warning_deliveries (location_id, token, group_id, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                list(rows),
+            )
+
+    def delete_warning_token(self, location_id: str, token: str) -> None:
+        with self.batch():
+            self._conn.execute(
+                "DELETE FROM warning_deliveries WHERE location_id = ? AND token = ?", (location_id, token)
+            )
+
+    def delete_expired_warnings(self, now: float) -> int:
+        with self.batch():
+            return self._conn.execute("DELETE FROM warning_deliveries WHERE expires_at <= ?", (now,)).rowcount
+
+    # ---------- 特殊日程 ---------- #
+    def special_days(self) -> Dict[str, List[Tuple[str, str]]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT group_id, date, content FROM special_days ORDER BY id").fetchall()
+        result: Dict[str, List[Tuple[str, str]]] = {}
+        for group_id, date_str, content in rows:
+            result.setdefault(group_id, []).append((date_str, content))
+        return result
+
+    def add_special_day(self, group_id: str, date_str: str, content: str) -> None:
+        with self.batch():
+            self._conn.execute(
+                "INSERT INTO special_days (group_id, date, content) VALUES (?, ?, ?)", (group_id, date_str, content)
+            )
+
+    def remove_special_days(self, group_id: str, date_str: str) -> None:
+        with self.batch():
+            self._conn.execute("DELETE FROM special_days WHERE group_id = ? AND date = ?", (group_id, date_str))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# ---------- 旧 JSON 文件迁移 ---------- #
+def _read_json(path: str) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _expire_ts(token: str) -> float:
+    # noinspection PyBroadException
+    try:
+        return datetime.fromisoformat(token.rsplit("@", 1)[1]).timestamp()
+    except Exception:
+        return 0.0
+
+
+def _read_weather_subscriptions(snapshot: Dict[str, List[str]], journal_path: str) -> Dict[str, List[str]]:
+    """订阅快照 + 未写回的订阅日志"""
+    data = {group_id: list(cities) for group_id, cities in snapshot.items()}
+    if os.path.exists(journal_path):
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                cities = data.setdefault(entry["group"], [])
+                for city in entry["targets"]:
+                    if entry["op"] == "add" and city not in cities:
+                        cities.append(city)
+                    elif entry["op"] == "remove" and city in cities:
+                        cities.remove(city)
+    return data
+
+
+def migrate_json_state(store: StateStore, cache_dir: str = "cache") -> None:
+    """
+    将旧的 JSON 状态文件一次性导入数据库，导入成功的文件重命名为 *.migrated；
+    读取失败的文件保留原名，下次启动时重试（或手工修复后再导入）
+    """
+    path = lambda name: os.path.join(cache_dir, name)  # noqa: E731
+    legacy = [
+        "bangumi_subscriptions.json", "calendar_subscriptions.json", "bilibili_subscriptions.json",
+        "live_subscriptions.json", "weather_subscriptions.json", "weather_subscriptions.json.journal",
+        "bilibili_update_baselines.json", "live_status.json", "warning_cache.json", "calendar_special_days.json",
+    ]
+    present = [name for name in legacy if os.path.exists(path(name))]
+    if not present:
+        return
+
+    failed: Set[str] = set()
+
+    def read(name: str) -> Dict[str, Any]:
+        if name not in present:
+            return {}
+        try:
+            return _read_json(path(name)) or {}
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warn("StateStore", f"旧状态文件 {path(name)} 读取失败，暂不迁移，保留原文件: {e}")
+            failed.add(name)
+            return {}
+
+    with store.batch():
+        for kind in ("bangumi", "calendar"):
+            for group_id, enabled in read(f"{kind}_subscriptions.json").items():
+                if enabled:
+                    store.add_subscriptions(kind, str(group_id), [GROUP_TARGET])
+        for kind in ("bilibili", "live"):
+            for group_id, targets in read(f"{kind}_subscriptions.json").items():
+                store.add_subscriptions(kind, str(group_id), list(dict.fromkeys(targets)))
+        weather_snapshot = read("weather_subscriptions.json")
+        if "weather_subscriptions.json" in failed:
+            # 日志记录的是相对快照的增删，快照读取失败时一并保留，下次重试
+            failed.add("weather_subscriptions.json.journal")
+        else:
+            weather = _read_weather_subscriptions(weather_snapshot, path("weather_subscriptions.json.journal"))
+            for group_id, cities in weather.items():
+                store.add_subscriptions("weather", str(group_id), list(dict.fromkeys(cities)))
+
+        store.put_values("bilibili_baseline", read("bilibili_update_baselines.json"))
+        store.put_values("live_status", read("live_status.json"))
+
+        rows = []
+        for key, value in read("warning_cache.json").items():
+            if isinstance(value, list):
+                # 最早的格式：群 -> token 列表，地点未知，巡检时再并入对应地点
+                rows.extend(("", token, key, _expire_ts(token)) for token in value)
+            else:
+                rows.extend((key, token, group_id, _expire_ts(token))
+                            for token, groups in value.items() for group_id in groups)
+        store.add_warning_deliveries(rows)
+
+        for group_id, items in read("calendar_special_days.json").items():
+            for date_str, content in items:
+                store.add_special_day(str(group_id), date_str, content)
+
+    migrated = [name for name in present if name not in failed]
+    for name in migrated:
+        os.replace(path(name), path(f"{name}.migrated"))
+    if migrated:
+        logger.info("StateStore", f"已将 {len(migrated)} 个旧状态文件迁移到 {store.db_path}")
+
+
+_state_store: Optional[StateStore] = None
+_state_store_lock = threading.Lock()
+
+
+def get_state_store() -> StateStore:
+    """进程内共享的状态存储，首次打开时迁移旧 JSON 文件"""
+    global _state_store
+    with _state_store_lock:
+        if _state_store is None:
+            _state_store = StateStore(settings.STATE_DB_PATH)
+            migrate_json_state(_state_store)
+        return _state_store
@@ -24,6 +24,9 @@ async def main():
     # 启动定时推送任务
     bot.start_pusher()
 
+    # 预加载 RAG 索引并启动后台文档变更监视
+    bot.start_rag()
+
     # 根据配置的连接模式启动服务
     await bot.run()
 
@@ -1,8 +1,8 @@
 import asyncio
 import json
-from datetime import timedelta
-from pathlib import Path
-from typing import Dict, Any, List
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from langchain_core.chat_history import InMemoryChatMessageHistory
@@ -13,10 +13,29 @@ from langchain_core.runnables import Runnable
 from langchain_openai import ChatOpenAI
 
 from infra.config.settings import settings
+from infra.chat_context import group_scope
+from infra.deadline import deadline_scope, remaining
 from infra.logger import logger
+from service.llm.memory_store import ConversationStore
 from service.llm.models import ChatMessage, ChatRequest, ChatResponse, IntentRecognitionResult
 from service.llm.prompts import prompts
 from service.llm.tools import ToolManager
+from service.rag.service import aget_rag_service
+
+# 超过软截止时间仍未生成回复时发送的过渡消息
+INTERIM_REPLY = "希酱正在努力思考中，请稍等一下下哦~"
+TIMEOUT_REPLY = "希酱想了太久没想出来，请稍后再问一次吧~"
+
+DAILY_SUMMARY_TEMPLATE = ("总结以下的对话内容形成对话摘要，摘要需要尽可能保留对话的关键信息，"
+                          "请注意要明确根据数字（用户id）来区分不同用户所说的内容:\n{messages}")
+REDUCE_SUMMARY_TEMPLATE = ("以下是同一个群在同一天内按时间顺序排列的若干段对话摘要，请将它们合并为一份完整的对话摘要，"
+                           "尽可能保留关键信息，并继续根据数字（用户id）区分不同用户所说的内容:\n{messages}")
+
+
+def _estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符按 1 个计，其余字符按 4 个字符 1 个计"""
+    cjk = sum(1 for ch in text if "\u2e80" <= ch <= "\u9fff" or "\uac00" <= ch <= "\ud7af")
+    return cjk + (len(text) - cjk) // 4 + 1
 
 
 class LLMService:
@@ -32,10 +51,14 @@ class LLMService:
         )
         self.tool_manager = ToolManager()
         self.intent_chain: Runnable = self._build_intent_chain()
-        self.session_store: Dict[str, CustomConversationSummaryMemory] = {}
-        self.daily_memory_store: Dict[str, List[str]] = {}
-        self.short_memory_store: Dict[str, List[str]] = {}
         self.short_memory_length: int = 10  # 保留对话轮数
+        # 对话日志与短记忆持久化于 SQLite，内存中只保留热点群
+        self.memory_store = ConversationStore(
+            db_path=settings.MEMORY_DB_PATH,
+            hot_groups=settings.MEMORY_HOT_GROUPS,
+            short_memory_length=self.short_memory_length,
+        )
+        self.session_store: OrderedDict[str, CustomConversationSummaryMemory] = OrderedDict()  # LRU
         self.daily_memory_scheduler = AsyncIOScheduler(timezone="Asia/Shanghai")  # 用于定时将日记忆存入文本
         self.scheduler_start()
 
@@ -61,10 +84,7 @@ class LLMService:
         return ChatResponse(reply=response.content)
 
     async def chat_with_memory(self, msg: str, session_id: str, user_id: str) -> ChatResponse:
-        if session_id not in self.session_store:
-            self.session_store[session_id] = CustomConversationSummaryMemory(self.llm)
-
-        memory = self.session_store[session_id]
+        memory = self._get_session_memory(session_id)
         summary = memory.load_summary()
 
         prompt_template = """
@@ -91,9 +111,21 @@ class LLMService:
 
         memory.save_context(f"{user_id}: {msg}", response.content)
         memory.update_summary()  # 更新摘要
+        self.memory_store.save_summary(session_id, memory.load_summary())
 
         return ChatResponse(reply=response.content)
 
+    def _get_session_memory(self, session_id: str) -> "CustomConversationSummaryMemory":
+        """获取会话摘要记忆，内存中按 LRU 保留，冷会话从磁盘恢复摘要"""
+        memory = self.session_store.get(session_id)
+        if memory is None:
+            memory = CustomConversationSummaryMemory(self.llm, self.memory_store.load_summary(session_id) or "")
+        self.session_store[session_id] = memory
+        self.session_store.move_to_end(session_id)
+        while len(self.session_store) > settings.MEMORY_HOT_GROUPS:
+            self.session_store.popitem(last=False)
+        return memory
+
     async def generate_greeting(self, msg: str) -> ChatResponse:
         prompt = PromptTemplate.from_template(prompts.GREETING_PROMPT).format(content=msg)
         req = ChatRequest(
@@ -105,7 +137,13 @@ class LLMService:
         response = await self.llm.ainvoke(lc_msgs)
         return ChatResponse(reply=response.content)
 
-    async def agent_chat(self, msg: str, group_id: str, user_id) -> ChatResponse:
+    async def agent_chat(self, msg: str, group_id: str, user_id,
+                         on_interim: Optional[Callable[[str], Awaitable[Any]]] = None) -> ChatResponse:
+        """
+        Agent 对话：意图识别 -> 工具调用 -> 生成回复
+        on_interim: 超过软截止时间仍未回复时调用，用于向群内发送过渡消息
+        整个过程受硬截止时间约束：工具调用须在预留给回复的时间之前结束，生成回复超时则返回 TIMEOUT_REPLY
+        """
         prompt_template = """
                 {system_prompt}
                 
@@ -121,40 +159,78 @@ class LLMService:
         )
         chain = prompt | self.llm
 
-        ir_output = await self.intent_chain.ainvoke({"user_query": msg})
-        ir_result = IntentRecognitionResult(**ir_output)
-        logger.info("LLM Tool Calling", f"意图识别结果: {ir_output}")
-
-        tool_calling_text = ""
-        if ir_result.should_call_tool and ir_result.tool_calls:
-            tool_calling_results = await self.tool_manager.call_tools(ir_result)
-            tool_results = []
-            for result in tool_calling_results:
-                if result.success:
-                    tool_results.append(
-                        self._format_tool_success_response(result.tool_name, result.result)
-                    )
+        # 软截止时间到达仍未回复时，先发送一条过渡消息
+        interim_sending = asyncio.Event()
+        interim_task = asyncio.create_task(self._send_interim(on_interim, interim_sending)) if on_interim else None
+        try:
+            with deadline_scope(settings.LLM_HARD_DEADLINE), group_scope(group_id):
+                # 意图识别与工具调用只使用预留回复时间之外的部分，超时后使用已得到的部分结果作答；工具只检索本群的记忆
+                with deadline_scope(max(0.0, settings.LLM_HARD_DEADLINE - settings.LLM_REPLY_RESERVE)):
+                    tool_calling_text = await self._collect_tool_results(msg)
+
+                history_message = self.memory_store.recent_history(group_id)
+                history_message_str = "\n".join(history_message)
+
+                try:
+                    response = await asyncio.wait_for(chain.ainvoke({
+                        "system_prompt": prompts.DEFAULT_SYSTEM_PROMPT,
+                        "history_message": history_message_str,
+                        "input": f"{user_id}: {msg}",
+                        "tool_calling": tool_calling_text,
+                    }), timeout=remaining())
+                except asyncio.TimeoutError:
+                    logger.warn("LLM", f"生成回复超过硬截止时间 {settings.LLM_HARD_DEADLINE}s")
+                    return ChatResponse(reply=TIMEOUT_REPLY)
+        finally:
+            if interim_task:
+                if interim_sending.is_set():
+                    # 过渡消息已在发送，不中断，等待发送结束以保证先于回复送达
+                    await interim_task
                 else:
-                    tool_results.append(
-                        self._format_tool_error_response(result.tool_name, result.error)
-                    )
-            tool_calling_text = "\n\n".join(tool_results)
-            logger.info("LLM Tool Calling", tool_calling_text)
-
-        history_message = self.short_memory_store.get(group_id, [])
-        history_message_str = "\n".join(history_message)
-
-        response = await chain.ainvoke({
-            "system_prompt": prompts.DEFAULT_SYSTEM_PROMPT,
-            "history_message": history_message_str,
-            "input": f"{user_id}: {msg}",
-            "tool_calling": tool_calling_text,
-        })
+                    interim_task.cancel()
 
         self.update_history_message(group_id, user_id, msg, response.content)
 
         return ChatResponse(reply=response.content)
 
+    async def _collect_tool_results(self, msg: str) -> str:
+        """意图识别并调用工具，返回拼接后的工具结果文本；截止时间到达时返回已完成的部分"""
+        try:
+            ir_output = await asyncio.wait_for(self.intent_chain.ainvoke({"user_query": msg}), timeout=remaining())
+        except asyncio.TimeoutError:
+            logger.warn("LLM Tool Calling", "意图识别超时，跳过工具调用")
+            return ""
+        ir_result = IntentRecognitionResult(**ir_output)
+        logger.info("LLM Tool Calling", f"意图识别结果: {ir_output}")
+
+        if not ir_result.should_call_tool or not ir_result.tool_calls:
+            return ""
+
+        tool_calling_results = await self.tool_manager.call_tools(ir_result)
+        tool_results = []
+        for result in tool_calling_results:
+            if result.success:
+                tool_results.append(
+                    self._format_tool_success_response(result.tool_name, result.result)
+                )
+            else:
+                tool_results.append(
+                    self._format_tool_error_response(result.tool_name, result.error)
+                )
+        tool_calling_text = "\n\n".join(tool_results)
+        logger.info("LLM Tool Calling", tool_calling_text)
+        return tool_calling_text
+
+    @staticmethod
+    async def _send_interim(on_interim: Callable[[str], Awaitable[Any]], sending: asyncio.Event) -> None:
+        await asyncio.sleep(settings.LLM_SOFT_DEADLINE)
+        # 此后不再取消
+        sending.set()
+        try:
+            await on_interim(INTERIM_REPLY)
+        except Exception as e:
+            logger.warn("LLM", f"发送过渡消息失败: {e}")
+
     # 格式化工具调用成功的响应
     @staticmethod
     def _format_tool_success_response(tool_name: str, result: Any) -> str:
@@ -172,7 +248,8 @@ class LLMService:
         prompt = PromptTemplate(
             template=prompts.FUNCTION_CALLING_INTENT_PROMPT,
             input_variables=["tools", "user_query"],
-            partial_variables={"tools": tools_definition},
+            partial_variables={"tools": tools_definition,
+                               "today": lambda: datetime.now().strftime("%Y-%m-%d")},
         )
 
         judge_llm = ChatOpenAI(
@@ -192,67 +269,131 @@ class LLMService:
         return chain
 
     def update_history_message(self, group_id: str, user_id: str, msg: str, response: str) -> None:
-        history_message = self.short_memory_store.get(group_id, [])
-
-        history_message.append(f"{user_id}: {msg}")
-        history_message.append(f"AI: {response}")
-
-        # 按短记忆长度截断
-        history_message = history_message[-self.short_memory_length * 2:]
-
-        self.short_memory_store[group_id] = history_message
-
-        daily_history_message = self.daily_memory_store.get(group_id, [])
-
-        daily_history_message.append(f"{user_id}: {msg}")
-        daily_history_message.append(f"AI: {response}")
+        # 对话日志持久化，短记忆由存储层按长度截断
+        self.memory_store.append_turn(group_id, user_id, msg, response)
 
-        self.daily_memory_store[group_id] = daily_history_message
-
-    def summarize_daily_memory(self, group_id: str) -> str:
-        daily_history_message = self.daily_memory_store.get(group_id, [])
-        daily_history_message_str = "\n".join(daily_history_message)
-
-        summary_prompt = PromptTemplate(
-            input_variables=["messages"],
-            template="总结以下的对话内容形成对话摘要，摘要需要尽可能保留对话的关键信息，请注意要明确根据数字（用户id）来区分不同用户所说的内容:\n{messages}"
-        )
-        summary_request = summary_prompt.format(messages=daily_history_message_str)
-        summary_response = self.llm.invoke([SystemMessage(summary_request)])
-
-        # 导出摘要后清空日对话记录
-        self.daily_memory_store[group_id] = []
-
-        return summary_response.content
+    async def summarize_daily_memory(self, group_id: str,
+                                     semaphore: Optional[asyncio.Semaphore] = None) -> Optional[Tuple[str, int]]:
+        """
+        分块 map-reduce 生成群的日摘要，返回 (摘要, 最后一条对话 id)
+        1. 从磁盘流式读取未摘要的对话，按 token 上限切分为若干块
+        2. 各块并发生成摘要，并发数受 semaphore 限制
+        3. 块摘要逐层合并，直至只剩一份
+        每个分块及中间合并结果都会缓存，失败重跑时只补齐缺失的部分
+        """
+        semaphore = semaphore or asyncio.Semaphore(settings.MEMORY_SUMMARY_PARALLELISM)
+        chunks = self._split_pending_chunks(group_id, settings.MEMORY_SUMMARY_CHUNK_TOKENS)
+        if not chunks:
+            return None
+
+        level = 0
+        nodes = await asyncio.gather(*[
+            self._summarize_node(group_id, level, first, last, text, DAILY_SUMMARY_TEMPLATE, semaphore)
+            for first, last, text in chunks
+        ])
+        while len(nodes) > 1:
+            level += 1
+            packed = self._pack_summaries(nodes, settings.MEMORY_SUMMARY_CHUNK_TOKENS)
+            nodes = await asyncio.gather(*[
+                self._summarize_node(group_id, level, first, last, text, REDUCE_SUMMARY_TEMPLATE, semaphore)
+                for first, last, text in packed
+            ])
+
+        _, last_turn_id, summary = nodes[0]
+        return summary, last_turn_id
+
+    def _split_pending_chunks(self, group_id: str, max_tokens: int) -> List[Tuple[int, int, str]]:
+        """按对话轮次边界将未摘要对话切分为不超过 max_tokens 的块，返回 (首轮 id, 末轮 id, 文本)"""
+        chunks: List[Tuple[int, int, str]] = []
+        lines: List[str] = []
+        tokens = 0
+        first_turn_id = last_turn_id = 0
+        for turn_id, line in self.memory_store.iter_pending(group_id):
+            line_tokens = _estimate_tokens(line)
+            # 只在轮次边界处切块，保证同一轮的提问与回复在同一块中
+            if lines and turn_id != last_turn_id and tokens + line_tokens > max_tokens:
+                chunks.append((first_turn_id, last_turn_id, "\n".join(lines)))
+                lines, tokens = [], 0
+            if not lines:
+                first_turn_id = turn_id
+            lines.append(line)
+            tokens += line_tokens
+            last_turn_id = turn_id
+        if lines:
+            chunks.append((first_turn_id, last_turn_id, "\n".join(lines)))
+        return chunks
 
-    def save_daily_memory(self):
+    @staticmethod
+    def _pack_summaries(nodes: List[Tuple[int, int, str]], max_tokens: int) -> List[Tuple[int, int, str]]:
+        """将相邻的块摘要打包为待合并的组，每组至少两份以保证逐层收敛"""
+        packed: List[Tuple[int, int, str]] = []
+        group: List[Tuple[int, int, str]] = []
+        tokens = 0
+        for node in nodes:
+            node_tokens = _estimate_tokens(node[2])
+            if len(group) >= 2 and tokens + node_tokens > max_tokens:
+                packed.append((group[0][0], group[-1][1], "\n\n".join(n[2] for n in group)))
+                group, tokens = [], 0
+            group.append(node)
+            tokens += node_tokens
+        if len(group) == 1 and packed:
+            # 末尾落单的一份并入上一组
+            first, _, text = packed.pop()
+            packed.append((first, group[0][1], f"{text}\n\n{group[0][2]}"))
+        elif group:
+            packed.append((group[0][0], group[-1][1], "\n\n".join(n[2] for n in group)))
+        return packed
+
+    async def _summarize_node(self, group_id: str, level: int, first_turn_id: int, last_turn_id: int,
+                              text: str, template: str, semaphore: asyncio.Semaphore) -> Tuple[int, int, str]:
+        cached = self.memory_store.get_partial_summary(group_id, level, first_turn_id, last_turn_id)
+        if cached is not None:
+            return first_turn_id, last_turn_id, cached
+
+        summary_request = PromptTemplate.from_template(template).format(messages=text)
+        async with semaphore:
+            summary_response = await self.llm.ainvoke([SystemMessage(summary_request)])
+        summary = summary_response.content
+        self.memory_store.save_partial_summary(group_id, level, first_turn_id, last_turn_id, summary)
+        return first_turn_id, last_turn_id, summary
+
+    async def save_daily_memory(self):
         try:
             # 获取当前日期
-            from datetime import datetime
             date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
 
-            file_path = Path.cwd() / "rag_docs" / "daily_memory.txt"
-            file_path.parent.mkdir(exist_ok=True)  # 确保 rag_docs 存在
-            file_path.touch(exist_ok=True)  # 确保文件存在
-
-            # 汇总所有群的摘要
-            summaries = []
-            for group_id in list(self.daily_memory_store.keys()):
-                if self.daily_memory_store[group_id]:  # 确保有记录
-                    summary = self.summarize_daily_memory(group_id)
-                    summaries.append(f"【群 {group_id}】\n{summary}\n")
-
-            # 写入
-            if summaries:
-                with open(file_path, "a", encoding="utf-8") as f:
-                    f.write(f"日期：{date}\n")
-                    f.write("=" * 30 + "\n")
-                    f.write("\n".join(summaries))
-                    f.write("=" * 30 + "\n")
-                    logger.info("LLM", f"Daily memory appended. {summaries}")
+            # 所有群共享同一个并发上限
+            semaphore = asyncio.Semaphore(settings.MEMORY_SUMMARY_PARALLELISM)
+            group_ids = self.memory_store.pending_groups()
+            results = await asyncio.gather(
+                *[self.summarize_daily_memory(group_id, semaphore) for group_id in group_ids],
+                return_exceptions=True,
+            )
+
+            # 每个群的摘要写入各自的记忆分区
+            rag = await aget_rag_service()
+            saved = 0
+            for group_id, result in zip(group_ids, results):
+                if isinstance(result, Exception):
+                    # 失败的群保留未摘要状态，已完成的分块摘要留待下次重跑复用
+                    logger.warn("LLM", f"群 {group_id} 日记忆摘要失败: {result}")
+                    continue
+                if result is None:
+                    continue
+                summary, last_turn_id = result
+                participants = self.memory_store.pending_participants(group_id, last_turn_id)
+                rag.append_memory(group_id, date, summary, participants)
+                # 摘要落盘后才标记，进程中途退出时不会丢失当日对话
+                self.memory_store.mark_summarized(group_id, last_turn_id)
+                saved += 1
+
+            if saved:
+                logger.info("LLM", f"Daily memory appended for {saved} groups.")
             else:
                 logger.info("LLM", "No daily memory to save.")
 
+            self.memory_store.purge_summarized(settings.MEMORY_RETENTION_DAYS)
+
         except Exception as e:
             logger.warn("LLM", f"Save daily memory failed. Error:{e}")
 
@@ -271,10 +412,10 @@ class LLMService:
 
 
 class CustomConversationSummaryMemory:
-    def __init__(self, llm: Runnable):
+    def __init__(self, llm: Runnable, summary: str = ""):
         self.llm = llm
         self.message_history = InMemoryChatMessageHistory()
-        self.summary = ""
+        self.summary = summary
 
     def save_context(self, input_msg: str, output_msg: str):
         self.message_history.add_user_message(input_msg)
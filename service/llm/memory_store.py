@@ -0,0 +1,197 @@
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Iterator, List, Optional, Tuple
+
+from infra.logger import logger
+
+
+class ConversationStore:
+    """
+    对话记忆的持久化存储（SQLite WAL 模式）
+
+    - turns 表为按群追加写入的对话日志，每行是一轮「用户消息 + AI 回复」
+    - 内存中只保留最近活跃群的短记忆（LRU），冷群在访问时从磁盘懒加载
+    - 每日摘要从磁盘流式读取未摘要的对话，摘要落盘后再标记为已摘要
+    """
+
+    def __init__(self, db_path: str = "cache/memory.db", hot_groups: int = 256, short_memory_length: int = 10):
+        self.db_path = db_path
+        self.hot_groups = hot_groups
+        self.short_memory_length = short_memory_length  # 短记忆保留的对话轮数
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+
+        # 群 -> 最近若干行对话（LRU，容量 hot_groups）
+        self._hot: OrderedDict[str, Deque[str]] = OrderedDict()
+
+    def _init_schema(self) -> None:
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS turns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    group_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    reply TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    summarized INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_turns_group ON turns (group_id, id);
+                CREATE INDEX IF NOT EXISTS idx_turns_pending ON turns (summarized, group_id, id);
+                CREATE TABLE IF NOT EXISTS partial_summaries (
+                    group_id TEXT NOT NULL,
+                    level INTEGER NOT NULL,
+                    first_turn_id INTEGER NOT NULL,
+                    last_turn_id INTEGER NOT NULL,
+                    summary TEXT NOT NULL,
+                    PRIMARY KEY (group_id, level, first_turn_id, last_turn_id)
+                );
+                CREATE TABLE IF NOT EXISTS session_summaries (
+                    session_id TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                );
+            """)
+
+    @staticmethod
+    def _format_turn(user_id: str, message: str, reply: str) -> Tuple[str, str]:
+        return f"{user_id}: {message}", f"AI: {reply}"
+
+    def _touch(self, group_id: str, lines: Deque[str]) -> None:
+        self._hot[group_id] = lines
+        self._hot.move_to_end(group_id)
+        while len(self._hot) > self.hot_groups:
+            self._hot.popitem(last=False)
+
+    # ---------- 短记忆 ---------- #
+    def append_turn(self, group_id: str, user_id: str, message: str, reply: str) -> None:
+        """追加一轮对话到日志，并同步更新热点缓存"""
+        group_id, user_id = str(group_id), str(user_id)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO turns (group_id, user_id, message, reply, created_at) VALUES (?, ?, ?, ?, ?)",
+                (group_id, user_id, message, reply, datetime.now().isoformat(sep=" ", timespec="seconds")),
+            )
+            lines = self._hot.get(group_id)
+            if lines is not None:
+                lines.extend(self._format_turn(user_id, message, reply))
+                self._touch(group_id, lines)
+
+    def recent_history(self, group_id: str) -> List[str]:
+        """获取群的短记忆，冷群从磁盘加载最近若干轮"""
+        group_id = str(group_id)
+        with self._lock:
+            lines = self._hot.get(group_id)
+            if lines is None:
+                rows = self._conn.execute(
+                    "SELECT user_id, message, reply FROM turns WHERE group_id = ? ORDER BY id DESC LIMIT ?",
+                    (group_id, self.short_memory_length),
+                ).fetchall()
+                lines = deque(maxlen=self.short_memory_length * 2)
+                for user_id, message, reply in reversed(rows):
+                    lines.extend(self._format_turn(user_id, message, reply))
+            self._touch(group_id, lines)
+            return list(lines)
+
+    # ---------- 日记忆 ---------- #
+    def pending_groups(self) -> List[str]:
+        """存在未摘要对话的群"""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT group_id FROM turns WHERE summarized = 0").fetchall()
+        return [row[0] for row in rows]
+
+    def iter_pending(self, group_id: str, batch_size: int = 500) -> Iterator[Tuple[int, str]]:
+        """按写入顺序分批流式读取群内未摘要的对话行，产出 (turn_id, 行文本)"""
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, user_id, message, reply FROM turns "
+                    "WHERE group_id = ? AND summarized = 0 AND id > ? ORDER BY id LIMIT ?",
+                    (str(group_id), last_id, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for turn_id, user_id, message, reply in rows:
+                for line in self._format_turn(user_id, message, reply):
+                    yield turn_id, line
+            last_id = rows[-1][0]
+
+    def pending_participants(self, group_id: str, up_to_id: int) -> List[str]:
+        """群内 id <= up_to_id 的未摘要对话中发言的用户"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT user_id FROM turns WHERE group_id = ? AND summarized = 0 AND id <= ?",
+                (str(group_id), up_to_id),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def mark_summarized(self, group_id: str, up_to_id: int) -> None:
+        """将群内 id <= up_to_id 的对话标记为已摘要，并清除对应的分块摘要缓存"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE turns SET summarized = 1 WHERE group_id = ? AND summarized = 0 AND id <= ?",
+                (str(group_id), up_to_id),
+            )
+            self._conn.execute(
+                "DELETE FROM partial_summaries WHERE group_id = ? AND last_turn_id <= ?",
+                (str(group_id), up_to_id),
+            )
+
+    def get_partial_summary(self, group_id: str, level: int, first_turn_id: int, last_turn_id: int) -> Optional[str]:
+        """读取分块摘要缓存，level 0 为对话分块摘要，更高层为合并结果"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM partial_summaries "
+                "WHERE group_id = ? AND level = ? AND first_turn_id = ? AND last_turn_id = ?",
+                (str(group_id), level, first_turn_id, last_turn_id),
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_partial_summary(self, group_id: str, level: int, first_turn_id: int, last_turn_id: int,
+                             summary: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO partial_summaries "
+                "(group_id, level, first_turn_id, last_turn_id, summary) VALUES (?, ?, ?, ?, ?)",
+                (str(group_id), level, first_turn_id, last_turn_id, summary),
+            )
+
+    def purge_summarized(self, keep_days: int) -> int:
+        """删除早于 keep_days 天且已摘要的对话，返回删除行数"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM turns WHERE summarized = 1 AND created_at < datetime('now', 'localtime', ?)",
+                (f"-{keep_days} days",),
+            )
+        if cursor.rowcount:
+            logger.info("Memory", f"已清理 {cursor.rowcount} 条过期对话记录")
+        return cursor.rowcount
+
+    # ---------- 会话摘要 ---------- #
+    def load_summary(self, session_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM session_summaries WHERE session_id = ?", (str(session_id),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_summary(self, session_id: str, summary: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO session_summaries (session_id, summary, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET summary = excluded.summary, updated_at = excluded.updated_at",
+                (str(session_id), summary, datetime.now().isoformat(sep=" ", timespec="seconds")),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -61,6 +61,7 @@ FUNCTION_CALLING_INTENT_PROMPT = """
         你是一个智能助手，需要判断用户的查询是否需要调用工具，以及调用哪些工具。
         如果需要调用工具，请选择所有合适的工具并分别确定所需参数，支持多次调用同一工具。
         请根据提供的工具列表进行判断。
+    - 当前日期：{today}（用户提到“上周”“上个月”等相对时间时据此换算为具体日期）
     - 可用工具详细信息列表：
         {tools}
     - 返回格式：
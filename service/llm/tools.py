@@ -1,7 +1,11 @@
+import asyncio
 from typing import Optional, Dict, List
 
+from infra.chat_context import current_group_id
+from infra.deadline import remaining
+from infra.logger import logger
 from service.llm.models import Tool, IntentRecognitionResult, ToolCallResult
-from service.rag.service import RAGService
+from service.rag.service import aget_rag_service
 from service.search.service import SearchService
 from service.weather.models import WeatherResponse, StormResponse, StormItem, StormInfo
 from service.weather.service import WeatherService
@@ -33,7 +37,7 @@ class ToolManager:
             ),
             "memory_query": Tool(
                 name="memory_query",
-                description="查询机器人个人长期记忆（daily_memory.txt）中的历史记录，当用户问“我以前说过/记过/提到过…”时,"
+                description="查询机器人在本群的长期记忆（每日对话摘要）中的历史记录，当用户问“我以前说过/记过/提到过…”时,"
                             "或用户消息可能涉及到对话历史时、时间点时使用，但如果只涉及刚刚发生或是当天的事情，无需调用",
                 parameters={
                     "type": "object",
@@ -41,6 +45,14 @@ class ToolManager:
                         "query": {
                             "type": "string",
                             "description": "用户询问的关键词或问题"
+                        },
+                        "start_date": {
+                            "type": "string",
+                            "description": "可选，只检索该日期及之后的记忆，格式 YYYY-MM-DD"
+                        },
+                        "end_date": {
+                            "type": "string",
+                            "description": "可选，只检索该日期及之前的记忆，格式 YYYY-MM-DD"
                         }
                     },
                     "required": ["query"]
@@ -137,6 +149,7 @@ class ToolManager:
         }
 
     async def call_tools(self, recognition_result: IntentRecognitionResult) -> List[ToolCallResult]:
+        """并发调用工具，受当前上下文的截止时间（infra.deadline）约束"""
         results = []
         if not recognition_result.should_call_tool or not recognition_result.tool_calls:
             results.append(ToolCallResult(
@@ -148,34 +161,58 @@ class ToolManager:
             ))
             return results
 
+        # 所有工具并发执行，截止时间到达时取消仍未完成的工具，保留已完成的部分结果
+        tasks: List[Optional[asyncio.Task]] = []
         for call_plan in recognition_result.tool_calls:
+            tool = self.tools.get(call_plan.tool_name)
+            if tool is None:
+                tasks.append(None)
+                continue
+            tasks.append(asyncio.create_task(tool.invoke(call_plan.tool_parameters or {})))
+
+        pending_tasks = [task for task in tasks if task is not None]
+        if pending_tasks:
+            _, pending = await asyncio.wait(pending_tasks, timeout=remaining())
+            for task in pending:
+                task.cancel()
+            if pending:
+                # 等待取消完成，确保底层 HTTP 连接立即释放
+                await asyncio.gather(*pending, return_exceptions=True)
+                logger.warn("LLM Tool Calling", f"截止时间已到，取消了 {len(pending)} 个未完成的工具调用")
+
+        for call_plan, task in zip(recognition_result.tool_calls, tasks):
             tool_name = call_plan.tool_name
-            if tool_name not in self.tools:
+            parameters = call_plan.tool_parameters or {}
+            if task is None:
                 results.append(ToolCallResult(
                     tool_name=tool_name,
-                    parameters=call_plan.tool_parameters or {},
+                    parameters=parameters,
                     success=False,
                     result=None,
                     error=f"工具不存在: {tool_name}"
                 ))
-                continue
-
-            try:
-                tool = self.tools[tool_name]
-                result = await tool.invoke(call_plan.tool_parameters or {})
+            elif task.cancelled():
                 results.append(ToolCallResult(
                     tool_name=tool_name,
-                    parameters=call_plan.tool_parameters or {},
-                    success=True,
-                    result=result
+                    parameters=parameters,
+                    success=False,
+                    result=None,
+                    error="工具调用超时，已取消"
                 ))
-            except Exception as e:
+            elif task.exception() is not None:
                 results.append(ToolCallResult(
                     tool_name=tool_name,
-                    parameters=call_plan.tool_parameters or {},
+                    parameters=parameters,
                     success=False,
                     result=None,
-                    error=str(e)
+                    error=str(task.exception())
+                ))
+            else:
+                results.append(ToolCallResult(
+                    tool_name=tool_name,
+                    parameters=parameters,
+                    success=True,
+                    result=task.result()
                 ))
 
         return results
@@ -183,8 +220,8 @@ class ToolManager:
 
 async def rag_query(query: str, top_k: int = 3) -> str:
     try:
-        rag_service = RAGService()
-        results = rag_service.query(query, top_k)
+        rag_service = await aget_rag_service()
+        results = await rag_service.aquery(query, top_k)
 
         if not results:
             raise Exception("未找到相关文档信息")
@@ -198,14 +235,15 @@ async def rag_query(query: str, top_k: int = 3) -> str:
         raise Exception(f"查询失败：{str(e)}")
 
 
-async def memory_query(query: str) -> str:
+async def memory_query(query: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> str:
     """
-    调用 RAGService 的 query_for_memory 方法，
-    仅搜索 daily_memory.txt 中的记忆片段
+    调用 RAGService 的 aquery_for_memory 方法，
+    仅搜索当前群、指定日期范围内的记忆分区
     """
     try:
-        rag = RAGService()
-        memories = rag.query_for_memory(query)
+        rag = await aget_rag_service()
+        memories = await rag.aquery_for_memory(query, group_id=current_group_id(),
+                                               start_date=start_date, end_date=end_date)
         if not memories:
             return "没有找到相关记忆片段。"
 
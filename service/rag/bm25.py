@@ -0,0 +1,148 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 日期、数字（用户 id、年份等）、英文单词、连续的中文字符片段
+_TOKEN_PATTERN = re.compile(r"\d{4}-\d{1,2}-\d{1,2}|\d+|[a-z]+|[㐀-䶿一-鿿]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """中文片段切分为相邻二字组（单字片段保留单字），数字、日期与英文单词整体作为词项"""
+    tokens: List[str] = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if token.isascii():
+            tokens.append(token)
+            if "-" in token:
+                # 日期同时拆出年、月、日，便于按部分匹配
+                tokens.extend(str(int(part)) for part in token.split("-"))
+        elif len(token) == 1:
+            tokens.append(token)
+        else:
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    分块级 BM25 倒排索引
+
+    以分块 ID 为文档单位，与向量索引同步增量更新；
+    磁盘上只保存每个分块的词频与长度，倒排表在加载时重建。
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.RLock()
+        self._docs: Dict[str, Dict[str, int]] = {}        # 分块 ID -> 词频
+        self._lengths: Dict[str, int] = {}                # 分块 ID -> 词项数
+        self._postings: Dict[str, Dict[str, int]] = {}    # 词项 -> {分块 ID: 词频}
+        self._total_length = 0
+
+    @property
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._docs)
+
+    def load(self) -> bool:
+        """从磁盘加载，文件不存在或损坏时返回 False"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (json.JSONDecodeError, OSError):
+            return False
+        with self._lock:
+            self._docs, self._lengths, self._postings, self._total_length = {}, {}, {}, 0
+            for chunk_id, term_counts in data.get("docs", {}).items():
+                self._add_counts(chunk_id, term_counts)
+        return True
+
+    def save(self) -> None:
+        with self._lock:
+            payload = json.dumps({"docs": self._docs}, ensure_ascii=False)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(payload)
+        os.replace(tmp_path, self.path)
+
+    def copy(self) -> "BM25Index":
+        """复制出可独立修改的索引：更新在副本上进行，进行中的查询继续使用原索引"""
+        other = BM25Index(self.path, self.k1, self.b)
+        with self._lock:
+            # 分块的词频字典只会整体替换，不会原地修改，可以共享
+            other._docs = dict(self._docs)
+            other._lengths = dict(self._lengths)
+            other._postings = {term: dict(posting) for term, posting in self._postings.items()}
+            other._total_length = self._total_length
+        return other
+
+    def add(self, items: Iterable[Tuple[str, str]]) -> None:
+        """添加 (分块 ID, 文本)，已存在的 ID 会被覆盖"""
+        with self._lock:
+            for chunk_id, text in items:
+                self._remove(chunk_id)
+                self._add_counts(chunk_id, dict(Counter(tokenize(text))))
+
+    def remove(self, chunk_ids: Iterable[str]) -> None:
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._remove(chunk_id)
+
+    def _add_counts(self, chunk_id: str, term_counts: Dict[str, int]) -> None:
+        self._docs[chunk_id] = term_counts
+        length = sum(term_counts.values())
+        self._lengths[chunk_id] = length
+        self._total_length += length
+        for term, count in term_counts.items():
+            self._postings.setdefault(term, {})[chunk_id] = count
+
+    def _remove(self, chunk_id: str) -> None:
+        term_counts = self._docs.pop(chunk_id, None)
+        if term_counts is None:
+            return
+        self._total_length -= self._lengths.pop(chunk_id)
+        for term in term_counts:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(chunk_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    def search(self, query: str, top_k: Optional[int] = None) -> List[Tuple[str, float, float]]:
+        """
+        返回 [(分块 ID, BM25 分数, 覆盖率)]，按分数降序，top_k 为空时返回全部命中
+        覆盖率为该分块命中的查询词项的 IDF 之和占全部「语料中出现过的」查询词项 IDF 之和的比例
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            total = len(self._docs)
+            if not total or not terms:
+                return []
+            avg_length = self._total_length / total
+            idf = {
+                term: math.log(1 + (total - len(self._postings[term]) + 0.5) / (len(self._postings[term]) + 0.5))
+                for term in terms if term in self._postings
+            }
+            if not idf:
+                return []
+
+            scores: Dict[str, float] = {}
+            matched: Dict[str, float] = {}
+            for term, weight in idf.items():
+                for chunk_id, count in self._postings[term].items():
+                    norm = count + self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + weight * count * (self.k1 + 1) / norm
+                    matched[chunk_id] = matched.get(chunk_id, 0.0) + weight
+
+        idf_total = sum(idf.values())
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(chunk_id, score, matched[chunk_id] / idf_total) for chunk_id, score in ranked]
@@ -0,0 +1,73 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Sequence, Set, Tuple
+
+from langchain_core.documents import Document
+
+
+class ChunkStore:
+    """
+    分块存储（SQLite），按向量 ID 读取分块正文与元数据
+
+    - 替代 pickle 序列化的文档库：加载时不反序列化整个语料，查询时只读取命中的分块
+    - 元数据以 JSON 存储，只包含字符串、数字等基本类型
+    """
+
+    def __init__(self, db_path: str):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    vector_id INTEGER PRIMARY KEY,
+                    chunk_id TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+            """)
+
+    def get_many(self, vector_ids: Sequence[int]) -> Dict[int, Document]:
+        """批量读取分块，返回存在的 向量 ID -> 文档"""
+        found: Dict[int, Document] = {}
+        # SQLite 单条语句的参数数量有限，分批查询
+        for i in range(0, len(vector_ids), 500):
+            batch = list(vector_ids[i:i + 500])
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT vector_id, content, metadata FROM chunks WHERE vector_id IN ({placeholders})",
+                    batch,
+                ).fetchall()
+            for vector_id, content, metadata in rows:
+                found[vector_id] = Document(page_content=content, metadata=json.loads(metadata))
+        return found
+
+    def put_many(self, items: Sequence[Tuple[int, Document]]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (vector_id, chunk_id, content, metadata) VALUES (?, ?, ?, ?)",
+                [(vector_id, doc.metadata["chunk_id"], doc.page_content, json.dumps(doc.metadata, ensure_ascii=False))
+                 for vector_id, doc in items],
+            )
+
+    def delete_many(self, vector_ids: Sequence[int]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM chunks WHERE vector_id = ?", [(vector_id,) for vector_id in vector_ids])
+
+    def ids(self) -> Set[int]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT vector_id FROM chunks")}
+
+    def texts(self) -> List[Tuple[str, str]]:
+        """全部 (分块 ID, 正文)，用于重建 BM25 索引"""
+        with self._lock:
+            return self._conn.execute("SELECT chunk_id, content FROM chunks").fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from infra.logger import logger
+
+
+class EmbeddingCache:
+    """
+    按内容寻址的嵌入向量持久化缓存（SQLite）
+
+    - 键为 (模型名, sha256(文本))，向量以 float32 BLOB 存储
+    - 打开时删除其他模型的记录，更换嵌入模型后缓存自动失效
+    """
+
+    def __init__(self, db_path: str, model: str):
+        self.model = model
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                )
+            """)
+            cursor = self._conn.execute("DELETE FROM embeddings WHERE model != ?", (model,))
+        if cursor.rowcount:
+            logger.info("RAG", f"嵌入模型已变更，清除 {cursor.rowcount} 条旧模型的缓存向量")
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, hashes: List[str]) -> Dict[str, List[float]]:
+        """批量读取缓存，返回命中的 哈希 -> 向量"""
+        found: Dict[str, List[float]] = {}
+        # SQLite 单条语句的参数数量有限，分批查询
+        for i in range(0, len(hashes), 500):
+            batch = hashes[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    (self.model, *batch),
+                ).fetchall()
+            for text_hash, blob in rows:
+                found[text_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(self.model, text_hash, np.asarray(vector, dtype=np.float32).tobytes())
+                 for text_hash, vector in items.items()],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    为嵌入模型加上缓存：
+    - 文档嵌入先查磁盘缓存，只为未命中的文本调用模型，未变化的文本重建索引时不再产生 API 调用
+    - 查询嵌入使用内存 LRU，重复的问题无需再请求嵌入模型
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, query_cache_size: int = 512):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.query_cache_size = query_cache_size
+
+        self._query_lock = threading.Lock()
+        self._query_cache: OrderedDict[str, List[float]] = OrderedDict()
+
+    @staticmethod
+    def _missing(texts: List[str], hashes: List[str], cached: Dict[str, List[float]]) -> Dict[str, str]:
+        """未命中缓存的 哈希 -> 文本，同一批次中重复的文本只嵌入一次"""
+        missing: Dict[str, str] = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in cached:
+                missing.setdefault(text_hash, text)
+        return missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [self.cache.text_hash(text) for text in texts]
+        cached = self.cache.get_many(list(set(hashes)))
+
+        missing = self._missing(texts, hashes, cached)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            cached.update(computed)
+
+        return [cached[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._get_query(text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._put_query(text, vector)
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [self.cache.text_hash(text) for text in texts]
+        cached = await asyncio.to_thread(self.cache.get_many, list(set(hashes)))
+
+        missing = self._missing(texts, hashes, cached)
+        if missing:
+            vectors = await self.embeddings.aembed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            await asyncio.to_thread(self.cache.put_many, computed)
+            cached.update(computed)
+
+        return [cached[text_hash] for text_hash in hashes]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self._get_query(text)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self._put_query(text, vector)
+        return vector
+
+    def _get_query(self, text: str) -> Optional[List[float]]:
+        with self._query_lock:
+            vector = self._query_cache.get(text)
+            if vector is not None:
+                self._query_cache.move_to_end(text)
+            return vector
+
+    def _put_query(self, text: str, vector: List[float]) -> None:
+        with self._query_lock:
+            self._query_cache[text] = vector
+            self._query_cache.move_to_end(text)
+            while len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
@@ -1,7 +1,19 @@
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Coroutine, List, Optional, Set, Tuple, TypeVar
+
+import httpx
 from dashscope import TextEmbedding
 from langchain_core.embeddings import Embeddings
 
 from infra.config.settings import settings
+from infra.deadline import clamp_timeout
+
+T = TypeVar("T")
 
 
 class DashScopeEmbeddings(Embeddings):
@@ -42,3 +54,186 @@ class DashScopeEmbeddings(Embeddings):
                 raise Exception(f"嵌入模型调用失败: {response.message}")
         except Exception as e:
             raise Exception(f"生成查询嵌入时出错: {str(e)}")
+
+
+class _RateLimiter:
+    """按固定间隔放行请求，每秒至多 rate 次；rate <= 0 表示不限速。可跨线程、跨事件循环共享"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class AsyncHttpEmbeddings(Embeddings):
+    """
+    OpenAI 兼容 /embeddings 接口的异步客户端（DashScope 可使用 compatible-mode 地址）
+
+    - 文档嵌入按批次并发请求，受并发数与限速器约束
+    - 不同对话同时发起的查询嵌入会在 microbatch_ms 毫秒内合并为一次请求
+    - 同步接口在独立事件循环中执行，供后台索引线程使用
+    """
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None, model: Optional[str] = None,
+                 batch_size: Optional[int] = None, concurrency: Optional[int] = None,
+                 rate_limit: Optional[float] = None, microbatch_ms: Optional[float] = None, timeout: float = 30.0):
+        self.base_url = (base_url or settings.EMBEDDINGS_BASE_URL).rstrip("/")
+        self.api_key = api_key or settings.EMBEDDINGS_API_KEY
+        self.model = model or settings.EMBEDDINGS_MODEL
+        self.batch_size = batch_size or settings.EMBEDDINGS_BATCH_SIZE
+        self.concurrency = concurrency or settings.EMBEDDINGS_CONCURRENCY
+        self.microbatch_delay = (settings.EMBEDDINGS_MICROBATCH_MS if microbatch_ms is None else microbatch_ms) / 1000
+        self.timeout = timeout
+
+        self._limiter = _RateLimiter(settings.EMBEDDINGS_RATE_LIMIT if rate_limit is None else rate_limit)
+        # 查询使用的长连接客户端，在首次异步调用时创建（绑定主事件循环）
+        self._client: Optional[httpx.AsyncClient] = None
+        # 等待合并发送的查询：(文本, Future)
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _new_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+            timeout=httpx.Timeout(self.timeout),
+        )
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = self._new_client()
+        return self._client
+
+    async def _request(self, client: httpx.AsyncClient, batch: List[str]) -> List[List[float]]:
+        await self._limiter.acquire()
+        response = await client.post(
+            "/embeddings",
+            json={"model": self.model, "input": batch, "encoding_format": "float"},
+            timeout=clamp_timeout(self.timeout),
+        )
+        if response.status_code != 200:
+            raise Exception(f"嵌入模型调用失败: {response.status_code} {response.text[:200]}")
+        records = sorted(response.json()["data"], key=lambda record: record["index"])
+        return [record["embedding"] for record in records]
+
+    async def _embed_batches(self, client: httpx.AsyncClient, texts: List[str]) -> List[List[float]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._request(client, batch)
+
+        try:
+            results = await asyncio.gather(*[
+                run(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)
+            ])
+        except Exception as e:
+            raise Exception(f"生成文档嵌入时出错: {str(e)}")
+        return [vector for batch in results for vector in batch]
+
+    # ---------- 异步接口 ---------- #
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._embed_batches(self._get_client(), texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self.microbatch_delay <= 0:
+            return (await self._request(self._get_client(), [text]))[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.microbatch_delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        """将等待中的查询合并为一次请求发出"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.create_task(self._send_queries(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send_queries(self, pending: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            vectors = await self._request(self._get_client(), [text for text, _ in pending])
+        except Exception as e:
+            error = Exception(f"生成查询嵌入时出错: {str(e)}")
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for (_, future), vector in zip(pending, vectors):
+            # 调用方可能已因截止时间取消等待
+            if not future.done():
+                future.set_result(vector)
+
+    # ---------- 同步接口 ---------- #
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        async def run() -> List[List[float]]:
+            async with self._new_client() as client:
+                return await self._embed_batches(client, texts)
+        return self._run_sync(run())
+
+    def embed_query(self, text: str) -> List[float]:
+        async def run() -> List[float]:
+            async with self._new_client() as client:
+                return (await self._request(client, [text]))[0]
+        try:
+            return self._run_sync(run())
+        except Exception as e:
+            raise Exception(f"生成查询嵌入时出错: {str(e)}")
+
+    @staticmethod
+    def _run_sync(coro: Coroutine[Any, Any, T]) -> T:
+        """在新的事件循环中执行协程；若当前线程已有运行中的事件循环，则在临时线程中执行"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, coro).result()
+
+
+def create_embeddings() -> Embeddings:
+    """按 EMBEDDINGS_BACKEND 配置创建嵌入模型"""
+    backend = settings.EMBEDDINGS_BACKEND
+    if backend == "dashscope":
+        return DashScopeEmbeddings()
+    if backend == "openai":
+        return AsyncHttpEmbeddings()
+    if backend == "hashing":
+        from .local_embeddings import HashingEmbeddings
+        return HashingEmbeddings(dim=settings.EMBEDDINGS_DIM)
+    if backend == "onnx":
+        from .local_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(settings.EMBEDDINGS_LOCAL_MODEL_PATH)
+    raise ValueError(f"未知的嵌入后端: {backend}")
+
+
+def embeddings_model_key() -> str:
+    """当前嵌入模型的标识，用于区分索引目录与向量缓存，不同模型的向量不会混用"""
+    backend = settings.EMBEDDINGS_BACKEND
+    if backend == "hashing":
+        key = f"hashing-{settings.EMBEDDINGS_DIM}"
+    elif backend == "onnx":
+        key = f"onnx-{Path(settings.EMBEDDINGS_LOCAL_MODEL_PATH).name}"
+    else:
+        key = settings.EMBEDDINGS_MODEL
+    return re.sub(r"[^\w.-]", "_", key)
@@ -0,0 +1,117 @@
+"""
+本地嵌入后端，完全在 CPU 上运行，不依赖网络
+
+- HashingEmbeddings：字符 n-gram 哈希向量化，针对中文调优，无需模型文件
+- OnnxEmbeddings：从本地目录加载 ONNX 句向量模型（可选依赖 onnxruntime、tokenizers）
+"""
+import hashlib
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# 连续的中文字符片段，或英文单词/数字
+_TOKEN_PATTERN = re.compile(r"[㐀-䶿一-鿿]+|[a-z0-9]+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    字符 n-gram 哈希向量化
+
+    中文片段切分为 1~3 字的 n-gram（单字权重减半，降低常用字的噪声），英文单词与数字整体作为特征；
+    特征经哈希映射到固定维度并带符号累加，词频取对数，最后 L2 归一化。
+    结果只由文本决定，相同配置下多次运行、不同机器上向量完全一致。
+    """
+
+    def __init__(self, dim: int = 512, max_ngram: int = 3):
+        self.dim = dim
+        self.max_ngram = max_ngram
+
+    def _features(self, text: str) -> Dict[str, float]:
+        counts: Counter = Counter()
+        for match in _TOKEN_PATTERN.finditer(text.lower()):
+            token = match.group()
+            if token.isascii():
+                counts[token] += 1
+                continue
+            for n in range(1, self.max_ngram + 1):
+                for i in range(len(token) - n + 1):
+                    counts[token[i:i + n]] += 1
+        return {
+            feature: (1 + math.log(count)) * (0.5 if len(feature) == 1 and not feature.isascii() else 1.0)
+            for feature, count in counts.items()
+        }
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text).items():
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            sign = 1.0 if digest >> 63 else -1.0
+            vector[digest % self.dim] += sign * weight
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    本地 ONNX 句向量模型
+
+    model_path 目录下需包含 model.onnx 与 tokenizer.json（HuggingFace tokenizers 格式），
+    对最后一层隐状态做掩码平均池化并 L2 归一化。
+    """
+
+    def __init__(self, model_path: str, max_length: int = 512, batch_size: int = 32):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("使用 onnx 嵌入后端需要安装 onnxruntime 与 tokenizers") from e
+
+        model_file = os.path.join(model_path, "model.onnx")
+        tokenizer_file = os.path.join(model_path, "tokenizer.json")
+        if not os.path.isfile(model_file) or not os.path.isfile(tokenizer_file):
+            raise FileNotFoundError(f"本地嵌入模型目录缺少 model.onnx 或 tokenizer.json: {model_path}")
+
+        self.batch_size = batch_size
+        self.session = onnxruntime.InferenceSession(model_file, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(tokenizer_file)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids),
+        }
+        hidden = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        embeddings: List[List[float]] = []
+        for i in range(0, len(texts), self.batch_size):
+            embeddings.extend(self._encode(texts[i:i + self.batch_size]))
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0]
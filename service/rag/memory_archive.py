@@ -0,0 +1,133 @@
+import gzip
+import json
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from infra.logger import logger
+
+ACTIVE_SUFFIX = ".jsonl"
+CLOSED_SUFFIX = ".jsonl.gz"
+_SHARD_PATTERN = re.compile(r"^(\d{4}-\d{2})\.jsonl(\.gz)?$")
+
+
+def parse_records(raw: bytes, compressed: bool) -> List[Dict[str, Any]]:
+    """解析分片文件内容，每行一条 JSON 记录"""
+    if compressed:
+        raw = gzip.decompress(raw)
+    return [json.loads(line) for line in raw.decode("utf-8").splitlines() if line.strip()]
+
+
+def record_to_document(record: Dict[str, Any], source: str, file_name: str) -> Document:
+    """将一条记忆记录转为带元数据的文档，日期写入正文便于检索"""
+    return Document(
+        page_content=f"日期：{record['date']}\n{record['summary']}",
+        metadata={
+            "source": source,
+            "file_name": file_name,
+            "group_id": record["group_id"],
+            "date": record["date"],
+            "participants": ",".join(record.get("participants", [])),
+        },
+    )
+
+
+class MemoryArchive:
+    """
+    按群、按月分片的对话记忆归档
+
+    memory_dir/<群号>/<YYYY-MM>.jsonl     当月（活跃）分片，每行一条日摘要记录
+    memory_dir/<群号>/<YYYY-MM>.jsonl.gz  已结束月份的分片，去重排序后整体压缩，此后不再改动
+    """
+
+    def __init__(self, memory_dir: str, compress_level: int = 6):
+        self.memory_dir = memory_dir
+        self.compress_level = compress_level  # 0 表示只归档不压缩
+        os.makedirs(memory_dir, exist_ok=True)
+
+    @staticmethod
+    def safe_group_id(group_id: str) -> str:
+        return re.sub(r"[^\w-]", "_", str(group_id))
+
+    @staticmethod
+    def current_month() -> str:
+        return datetime.now().strftime("%Y-%m")
+
+    def group_dir(self, group_id: str) -> str:
+        return os.path.join(self.memory_dir, self.safe_group_id(group_id))
+
+    def groups(self) -> List[str]:
+        """有记忆的群"""
+        return [name for name in os.listdir(self.memory_dir) if os.path.isdir(os.path.join(self.memory_dir, name))]
+
+    def _shards(self, group_id: str) -> Dict[str, List[str]]:
+        """月份 -> 该月的分片文件名"""
+        group_dir = self.group_dir(group_id)
+        shards: Dict[str, List[str]] = {}
+        if not os.path.isdir(group_dir):
+            return shards
+        for name in os.listdir(group_dir):
+            match = _SHARD_PATTERN.match(name)
+            if match:
+                shards.setdefault(match.group(1), []).append(name)
+        return shards
+
+    def months(self, group_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[str]:
+        """群有记忆的月份，可按日期范围（YYYY-MM-DD，闭区间）筛选"""
+        return sorted(
+            month for month in self._shards(group_id)
+            if (start_date is None or month >= start_date[:7]) and (end_date is None or month <= end_date[:7])
+        )
+
+    def active_months(self, group_id: str) -> List[str]:
+        """仍有未压缩分片的月份，只有这些分片可能发生变化"""
+        return sorted(month for month, names in self._shards(group_id).items()
+                      if any(name.endswith(ACTIVE_SUFFIX) for name in names))
+
+    def append(self, group_id: str, date: str, summary: str, participants: Optional[List[str]] = None) -> None:
+        """追加一条日摘要到对应月份的活跃分片"""
+        group_dir = self.group_dir(group_id)
+        os.makedirs(group_dir, exist_ok=True)
+        record = {
+            "group_id": str(group_id),
+            "date": date,
+            "participants": sorted(set(participants or [])),
+            "summary": summary.strip(),
+        }
+        with open(os.path.join(group_dir, f"{date[:7]}{ACTIVE_SUFFIX}"), "a", encoding="utf-8") as file:
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def compact_closed(self, group_id: str) -> List[str]:
+        """
+        将当月之前仍为活跃格式的分片去重、按日期排序后压缩归档，返回处理过的月份
+        记录内容不变，对应分块的 ID 也不变，重新同步索引时不会产生嵌入
+        """
+        group_dir = self.group_dir(group_id)
+        current = self.current_month()
+        compacted = []
+        for month in self.active_months(group_id):
+            if month >= current:
+                continue
+            records: List[Dict[str, Any]] = []
+            for name in sorted(self._shards(group_id)[month], reverse=True):  # 先读已压缩的部分
+                with open(os.path.join(group_dir, name), "rb") as file:
+                    records.extend(parse_records(file.read(), name.endswith(CLOSED_SUFFIX)))
+
+            unique: Dict[str, Dict[str, Any]] = {}
+            for record in records:
+                unique.setdefault(json.dumps(record, ensure_ascii=False, sort_keys=True), record)
+            ordered = sorted(unique.values(), key=lambda record: record["date"])
+            payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in ordered).encode("utf-8")
+
+            closed_path = os.path.join(group_dir, f"{month}{CLOSED_SUFFIX}")
+            tmp_path = f"{closed_path}.tmp"
+            with open(tmp_path, "wb") as file:
+                file.write(gzip.compress(payload, compresslevel=self.compress_level, mtime=0))
+            os.replace(tmp_path, closed_path)
+            os.remove(os.path.join(group_dir, f"{month}{ACTIVE_SUFFIX}"))
+            compacted.append(month)
+            logger.info("RAG", f"群 {group_id} 的 {month} 记忆分片已归档（{len(ordered)} 条）")
+        return compacted
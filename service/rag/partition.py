@@ -0,0 +1,439 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import TextSplitter
+
+from infra.logger import logger
+from .bm25 import BM25Index
+from .chunk_store import ChunkStore
+from .memory_archive import CLOSED_SUFFIX, parse_records, record_to_document
+from .vector_index import VectorIndex, chunk_vector_id
+
+# 旧版格式的索引文件：LangChain FAISS 索引与 pickle 文档库
+LEGACY_INDEX_FILES = ("index.faiss", "index.pkl", "chunks.pkl")
+
+
+def empty_changes() -> Dict[str, int]:
+    return {
+        "added": 0,
+        "updated": 0,
+        "removed": 0,
+        "reused_chunks": 0,
+        "embedded_chunks": 0,
+        "deleted_chunks": 0
+    }
+
+
+class PartitionSnapshot(NamedTuple):
+    """查询使用的一组索引引用，发布后不再修改；更新完成时整体替换为新的快照"""
+    index: VectorIndex
+    chunks: ChunkStore  # 向量 ID -> 分块
+    lexical: BM25Index
+
+
+class VectorPartition:
+    """
+    一个独立的向量索引分区，对应 source_dir 下以 prefix 开头、以 suffixes 结尾的一组文档
+    （txt 文本，或记忆归档的 jsonl / jsonl.gz 分片）
+
+    - 向量索引、分块与文档记录（mtime、大小、校验和、分块列表）保存在 index_dir
+    - 索引在首次查询或更新时才加载，未加载的分区不占用内存；向量索引以内存映射方式只读加载
+    - 文档变更时按分块 ID 增量嵌入/删除，在索引的可写副本上更新、落盘后整体替换
+    - 同时维护分块级 BM25 倒排索引（index_dir/bm25.json），与向量索引一同增量更新
+    - 查询只读取 load() 返回的快照，后台更新或释放分区不影响进行中的查询
+    """
+
+    def __init__(self, name: str, source_dir: str, index_dir: str, embeddings: Embeddings,
+                 text_splitter: TextSplitter, prefix: str = "", suffixes: Tuple[str, ...] = (".txt",),
+                 index_type: str = "flat"):
+        self.name = name
+        self.source_dir = source_dir
+        self.prefix = prefix
+        self.suffixes = suffixes
+        self.index_dir = index_dir
+        self.checksum_file = os.path.join(index_dir, "document_checksums.json")  # 检查文档状态
+        self.vectors_file = os.path.join(index_dir, "vectors.faiss")
+        self.chunks_file = os.path.join(index_dir, "chunks.db")
+        self.embeddings = embeddings
+        self.text_splitter = text_splitter
+        self.index_type = index_type
+
+        # 串行化索引的加载、更新与释放；以下三个属性只在持有锁时读写，查询使用 self._snapshot
+        self._update_lock = threading.Lock()
+        self.index: Optional[VectorIndex] = None
+        self.chunks: Optional[ChunkStore] = None  # 向量 ID -> 分块
+        self.lexical = BM25Index(os.path.join(index_dir, "bm25.json"))
+        self._snapshot: Optional[PartitionSnapshot] = None
+
+        # 文档名 -> {"md5", "mtime_ns", "size", "chunks": [{"id", "hash", "start"}]}
+        self.document_checksums: Dict[str, Dict[str, Any]] = self._load_checksums()
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def load(self) -> PartitionSnapshot:
+        """加载索引（并同步加载前发生的文档变更），返回当前快照"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        with self._update_lock:
+            if self._snapshot is None:
+                self._load_or_rebuild()
+            return self._snapshot
+
+    def unload(self) -> None:
+        # 不主动关闭分块库连接，仍持有快照的查询结束后随对象释放
+        with self._update_lock:
+            self._snapshot = None
+            self.index = None
+            self.chunks = None
+            self.lexical = BM25Index(self.lexical.path)
+
+    def _publish(self) -> None:
+        self._snapshot = PartitionSnapshot(self.index, self.chunks, self.lexical)
+
+    def update(self) -> Dict[str, int]:
+        """
+        检查文档变化并增量更新向量存储
+        返回变更统计: 新增、更新、删除的文档数量，以及复用、嵌入、删除的分块数量
+        """
+        with self._update_lock:
+            if self.index is None:
+                return self._load_or_rebuild()
+
+            plan = self._plan_sync(self._get_all_documents())
+
+            # 在索引副本上增量嵌入/删除分块后整体替换，查询始终使用完整可用的索引
+            if plan["to_add"] or plan["to_delete"] or self._needs_conversion():
+                self._apply_sync(plan)
+            elif documents_changed(plan["changes"]):
+                self._commit_manifest(plan["manifest"])
+
+            return plan["changes"]
+
+    def has_changes(self) -> bool:
+        """只比较文档记录，不加载索引；持有更新锁，避免与 update() 同时读写文档记录"""
+        with self._update_lock:
+            current_docs = self._get_all_documents()
+            if set(current_docs) != set(self.document_checksums):
+                return True
+            return any(self._is_modified(doc_name, self.document_checksums[doc_name]) for doc_name in current_docs)
+
+    def search(self, embedding: List[float], top_k: int,
+               query_filter: Optional[Union[Dict[str, str], Callable[[Dict[str, Any]], bool]]] = None
+               ) -> List[Tuple[Document, float]]:
+        """按查询向量检索，返回 (文档, L2 平方距离)；有过滤条件时逐步扩大候选数直到凑满 top_k"""
+        if self._is_empty():
+            return []
+        index, chunks, _ = self.load()
+        k = top_k if query_filter is None else top_k * 4
+        while True:
+            hits = index.search(embedding, k)
+            docs = chunks.get_many([vector_id for vector_id, _ in hits])
+            results: List[Tuple[Document, float]] = []
+            for vector_id, distance in hits:
+                doc = docs.get(vector_id)
+                if doc is None or (query_filter is not None and not self._matches(doc.metadata, query_filter)):
+                    continue
+                results.append((doc, distance))
+                if len(results) >= top_k:
+                    return results
+            if k >= index.ntotal:
+                return results
+            k *= 4
+
+    def lexical_search(self, question: str, top_k: int,
+                       query_filter: Optional[Union[Dict[str, str], Callable[[Dict[str, Any]], bool]]] = None
+                       ) -> List[Tuple[Document, float, float]]:
+        """按 BM25 检索，不调用嵌入模型，返回 (文档, BM25 分数, 查询词覆盖率)"""
+        if self._is_empty():
+            return []
+        _, chunks, lexical = self.load()
+        hits = lexical.search(question)
+        if query_filter is None:
+            hits = hits[:top_k * 2]
+        docs = chunks.get_many([chunk_vector_id(chunk_id) for chunk_id, _, _ in hits])
+        results: List[Tuple[Document, float, float]] = []
+        for chunk_id, score, coverage in hits:
+            doc = docs.get(chunk_vector_id(chunk_id))
+            if doc is None:
+                # 快照发布后分块库中已删除的旧分块
+                continue
+            if query_filter is not None and not self._matches(doc.metadata, query_filter):
+                continue
+            results.append((doc, score, coverage))
+            if len(results) >= top_k:
+                break
+        return results
+
+    def _is_empty(self) -> bool:
+        """
+        按文档记录判断分区是否为空，查询路径不扫描文档目录；
+        尚未索引的新文档由后台监视线程同步后才可检索
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot.index.ntotal == 0
+        return not self.document_checksums
+
+    @staticmethod
+    def _matches(metadata: Dict[str, Any],
+                 query_filter: Union[Dict[str, str], Callable[[Dict[str, Any]], bool]]) -> bool:
+        if callable(query_filter):
+            return query_filter(metadata)
+        return all(metadata.get(key) == value for key, value in query_filter.items())
+
+    def _load_or_rebuild(self) -> Dict[str, int]:
+        current_docs = self._get_all_documents()
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._remove_legacy_files()
+
+        # 索引存在且记录了分块信息时加载后增量同步；否则（首次运行、旧格式记录或旧版索引）全量构建
+        has_manifest = all("chunks" in state for state in self.document_checksums.values())
+        if VectorIndex.exists(self.vectors_file) and os.path.exists(self.chunks_file) and has_manifest:
+            self.index = VectorIndex.load(self.vectors_file)
+            self.chunks = ChunkStore(self.chunks_file)
+            # 清理上次更新中断时已写入、但未进入索引的分块
+            orphans = self.chunks.ids() - set(self.index.ids())
+            if orphans:
+                self.chunks.delete_many(list(orphans))
+            self._load_lexical()
+        else:
+            logger.info("RAG", f"分区 {self.name} 索引不存在或缺少分块记录，全量建立索引。")
+            self.document_checksums = {}
+            for file_path in (self.vectors_file, self.chunks_file):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            self.chunks = ChunkStore(self.chunks_file)
+            self.lexical = BM25Index(self.lexical.path)
+
+        plan = self._plan_sync(current_docs)
+        if plan["to_add"] or plan["to_delete"] or self.index is None or self._needs_conversion():
+            self._apply_sync(plan)
+        elif documents_changed(plan["changes"]):
+            # 文件有变化但分块均未变化，只需更新记录
+            self._commit_manifest(plan["manifest"])
+        self._publish()
+        return plan["changes"]
+
+    def _remove_legacy_files(self) -> None:
+        """删除旧版（LangChain FAISS 索引、pickle 文档库）格式的索引文件，分块改由新格式重建"""
+        for name in LEGACY_INDEX_FILES:
+            file_path = os.path.join(self.index_dir, name)
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+                logger.info("RAG", f"已删除旧版索引文件: {file_path}")
+
+    def _load_lexical(self) -> None:
+        """加载 BM25 索引；文件缺失或与向量索引的分块不一致时（旧版本索引、上次落盘中断）从分块重建"""
+        lexical = BM25Index(self.lexical.path)
+        chunks = dict(self.chunks.texts())
+        if not lexical.load() or set(lexical.ids) != set(chunks):
+            lexical = BM25Index(self.lexical.path)
+            lexical.add(chunks.items())
+            lexical.save()
+            logger.info("RAG", f"分区 {self.name} 的 BM25 索引已重建（{len(chunks)} 个分块）")
+        self.lexical = lexical
+
+    def _needs_conversion(self) -> bool:
+        """分区规模或配置的索引类型变化后，是否需要转换索引类型"""
+        return self.index is not None and self.index.target_kind(self.index_type) != self.index.kind
+
+    def _plan_sync(self, current_docs: List[str]) -> Dict[str, Any]:
+        """
+        对比文档分块记录，计算需要嵌入与删除的分块
+        返回 {"manifest", "to_add", "to_delete", "changes"}
+        """
+        changes = empty_changes()
+        manifest: Dict[str, Dict[str, Any]] = {}
+        splits: List[Document] = []
+
+        # 删除的文档
+        for doc_name in self.document_checksums:
+            if doc_name not in current_docs:
+                changes["removed"] += 1
+
+        # 新增和更新的文档重新切分，未变化的文档沿用已有分块记录
+        for doc_name in current_docs:
+            previous = self.document_checksums.get(doc_name)
+            if previous is not None and not self._is_modified(doc_name, previous):
+                manifest[doc_name] = previous
+                continue
+
+            changes["added" if previous is None else "updated"] += 1
+            state, doc_splits = self._split_document(doc_name, previous)
+            manifest[doc_name] = state
+            splits.extend(doc_splits)
+
+        # 按分块 ID 在整个分区内比对：只嵌入新出现的分块，删除不再存在的分块。
+        # 文档改名（如记忆分片归档压缩）但内容不变时，分块 ID 不变，无需重新嵌入
+        old_ids = {chunk["id"] for state in self.document_checksums.values() for chunk in state.get("chunks", [])}
+        new_ids = {chunk["id"] for state in manifest.values() for chunk in state["chunks"]}
+        to_add: List[Document] = []
+        seen = set()
+        for split in splits:
+            chunk_id = split.metadata["chunk_id"]
+            if chunk_id not in old_ids and chunk_id not in seen:
+                seen.add(chunk_id)
+                to_add.append(split)
+        to_delete = list(old_ids - new_ids)
+
+        changes["reused_chunks"] = len(old_ids & new_ids)
+        changes["embedded_chunks"] = len(to_add)
+        changes["deleted_chunks"] = len(to_delete)
+        return {"manifest": manifest, "to_add": to_add, "to_delete": to_delete, "changes": changes}
+
+    def _apply_sync(self, plan: Dict[str, Any]) -> None:
+        """
+        在向量索引与 BM25 索引的副本上应用同步计划，落盘后作为新快照整体发布
+        新分块在发布前写入分块库，删除的分块在发布后才移除，仍在使用旧快照的查询只会跳过已删除的分块
+        """
+        if self.index is not None:
+            index = self.index.writable_copy()
+        else:
+            # 维度由嵌入模型决定
+            index = VectorIndex.empty(len(self.embeddings.embed_query("placeholder")))
+
+        existing_ids = set(index.ids())
+        delete_ids = [vector_id for vector_id in map(chunk_vector_id, plan["to_delete"]) if vector_id in existing_ids]
+        index.remove(delete_ids)
+
+        to_add: List[Document] = plan["to_add"]
+        if to_add:
+            vectors = np.asarray(self.embeddings.embed_documents([doc.page_content for doc in to_add]), dtype="float32")
+            add_ids = [chunk_vector_id(doc.metadata["chunk_id"]) for doc in to_add]
+            index.add(add_ids, vectors)
+            self.chunks.put_many(list(zip(add_ids, to_add)))
+
+        index.ensure_type(self.index_type)
+        index.save(self.vectors_file)
+
+        lexical = self.lexical.copy()
+        lexical.remove(plan["to_delete"])
+        lexical.add((doc.metadata["chunk_id"], doc.page_content) for doc in to_add)
+        lexical.save()
+
+        self.index = VectorIndex.load(self.vectors_file)
+        self.lexical = lexical
+        self._publish()
+        self.chunks.delete_many(delete_ids)
+        self._commit_manifest(plan["manifest"])
+
+        changes = plan["changes"]
+        logger.info("RAG", f"分区 {self.name} 索引已同步：复用 {changes['reused_chunks']} 个分块，"
+                           f"嵌入 {changes['embedded_chunks']} 个分块，删除 {changes['deleted_chunks']} 个分块")
+
+    def _split_document(self, doc_name: str, previous: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[Document]]:
+        """
+        切分文档并生成分块记录，返回 (文档记录, 需要切分出的分块)
+        若文档只在末尾追加了内容（如每日记忆），保留除最后一块外的旧分块，只切分新增的尾部
+        """
+        file_path = os.path.join(self.source_dir, doc_name)
+        stat = os.stat(file_path)
+        with open(file_path, "rb") as file:
+            raw = file.read()
+
+        kept: List[Dict[str, Any]] = []
+        offset = 0
+        if ".jsonl" in doc_name:
+            # 记忆归档分片：每条记录为一个带元数据的文档
+            records = parse_records(raw, doc_name.endswith(CLOSED_SUFFIX))
+            documents = [record_to_document(record, file_path, doc_name) for record in records]
+        else:
+            old_chunks = previous.get("chunks") if previous else None
+            if old_chunks and previous.get("size") is not None and len(raw) > previous["size"] \
+                    and hashlib.md5(raw[:previous["size"]]).hexdigest() == previous.get("md5"):
+                kept = old_chunks[:-1]
+                offset = old_chunks[-1]["start"]
+            text = raw.decode("utf-8")
+            documents = [Document(page_content=text[offset:], metadata={"source": file_path, "file_name": doc_name})]
+        splits = self.text_splitter.split_documents(documents)
+
+        # 分块 ID = 文档名（不含压缩后缀）+ 内容哈希 + 同内容出现序号，内容不变则 ID 不变
+        doc_key = doc_name[:-len(".gz")] if doc_name.endswith(".gz") else doc_name
+        occurrences: Dict[str, int] = {}
+        for chunk in kept:
+            occurrences[chunk["hash"]] = occurrences.get(chunk["hash"], 0) + 1
+        chunks = list(kept)
+        for split in splits:
+            content_hash = hashlib.sha256(split.page_content.encode("utf-8")).hexdigest()
+            seq = occurrences.get(content_hash, 0)
+            occurrences[content_hash] = seq + 1
+            chunk_id = f"{doc_key}:{content_hash[:16]}:{seq}"
+            start = split.metadata.pop("start_index", 0) + offset
+            split.metadata.update({"chunk_id": chunk_id, "start_index": start})
+            chunks.append({"id": chunk_id, "hash": content_hash, "start": start})
+
+        state = {
+            "md5": hashlib.md5(raw).hexdigest(),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "chunks": chunks,
+        }
+        return state, splits
+
+    def _is_modified(self, doc_name: str, previous: Dict[str, Any]) -> bool:
+        """先比较 mtime 与文件大小，二者不一致时才计算 MD5 确认"""
+        file_path = os.path.join(self.source_dir, doc_name)
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            # 列出目录后文件被删除（如记忆分片归档压缩），视为已变化，交由同步处理
+            return True
+        if previous.get("mtime_ns") == stat.st_mtime_ns and previous.get("size") == stat.st_size:
+            return False
+        if previous.get("size") is not None and previous["size"] != stat.st_size:
+            return True
+
+        if self._calculate_checksum(file_path) != previous.get("md5"):
+            return True
+        # 内容未变（如仅被 touch），记下新的 mtime，避免下次重复计算
+        previous["mtime_ns"] = stat.st_mtime_ns
+        previous["size"] = stat.st_size
+        return False
+
+    def _load_checksums(self) -> Dict[str, Dict[str, Any]]:
+        if os.path.exists(self.checksum_file):
+            with open(self.checksum_file, "r", encoding="utf-8") as file:
+                try:
+                    data = json.load(file)
+                except json.JSONDecodeError:
+                    return {}
+            # 兼容旧格式：文档名 -> MD5
+            return {name: value if isinstance(value, dict) else {"md5": value} for name, value in data.items()}
+        return {}
+
+    def _commit_manifest(self, manifest: Dict[str, Dict[str, Any]]) -> None:
+        """更新内存中的文档记录（mtime、大小、校验和与分块列表）并保存到文件"""
+        self.document_checksums = manifest
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(self.checksum_file, "w", encoding="utf-8") as file:
+            json.dump(manifest, file, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def _calculate_checksum(file_path: str) -> str:
+        hasher = hashlib.md5()
+        with open(file_path, "rb") as file:
+            while chunk := file.read(4096):
+                hasher.update(chunk)
+        return hasher.hexdigest()  # 计算MD5校验和
+
+    def _get_all_documents(self) -> List[str]:
+        """获取文档目录中属于本分区的文件"""
+        if not os.path.isdir(self.source_dir):
+            return []
+        return [file for file in os.listdir(self.source_dir)
+                if file.startswith(self.prefix) and file.endswith(self.suffixes)
+                and os.path.isfile(os.path.join(self.source_dir, file))]
+
+
+def documents_changed(changes: Dict[str, int]) -> bool:
+    """是否有文档新增、更新或删除"""
+    return any(changes[key] > 0 for key in ("added", "updated", "removed"))
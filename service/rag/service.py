@@ -1,171 +1,199 @@
-import hashlib
+import asyncio
 import json
 import os
+import re
 import shutil
-from pathlib import Path
-from typing import List, Dict, Any
+import threading
+import weakref
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Callable, Union
 
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing_extensions import deprecated
 
-from .embeddings import DashScopeEmbeddings
+from .embedding_cache import CachedEmbeddings, EmbeddingCache
+from .embeddings import create_embeddings, embeddings_model_key
+from .memory_archive import ACTIVE_SUFFIX, CLOSED_SUFFIX, MemoryArchive
+from .partition import VectorPartition, documents_changed
+from infra.config.settings import settings
 from infra.logger import logger
 
+MEMORY_FILE_NAME = "daily_memory.txt"
+RRF_K = 60  # 倒数排名融合的平滑常数
+
+QueryFilter = Union[Dict[str, str], Callable[[Dict[str, Any]], bool]]
+
 
 class RAGService:
+    """
+    RAG 文档检索，向量索引按来源分区：
+    - knowledge：docs_dir 下的知识库 txt 文档
+    - memory/<群号>/<YYYY-MM>：每个群每个月独立的对话记忆，来自 docs_dir/memory 下的归档分片
+    查询只检索相关分区（可按群与日期范围限定）；记忆分区按需加载，内存中最多保留 RAG_MEMORY_CACHED_SHARDS 个
+
+    检索模式（RAG_QUERY_MODE）：
+    - vector：只使用向量检索
+    - hybrid：先用 BM25 检索，结果置信（首条覆盖绝大部分查询词且分数足够高）时直接返回，不调用嵌入模型；
+      否则再做向量检索，两路结果按倒数排名融合（RRF）
+    """
+
     def __init__(self, docs_dir: str = "rag_docs"):
         self.docs_dir = docs_dir
-        self.index_dir = os.path.join(docs_dir, "index")
-        self.checksum_file = os.path.join(docs_dir, "document_checksums.json")  # 检查文档状态
-
-        self.embeddings = DashScopeEmbeddings()
+        self.memory_dir = os.path.join(docs_dir, "memory")
+        # 每个嵌入模型使用独立的索引目录，切换模型后不会混用向量
+        self.model_key = embeddings_model_key()
+        self.index_root = os.path.join(docs_dir, "index", self.model_key)
+
+        self.embeddings = create_embeddings()
+        if settings.EMBEDDINGS_BACKEND != "hashing":
+            # 哈希向量化的计算开销低于读缓存，无需缓存
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                EmbeddingCache(settings.EMBEDDINGS_CACHE_PATH, self.model_key),
+                query_cache_size=settings.EMBEDDINGS_QUERY_CACHE_SIZE
+            )
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=100,
-            separators=["\n\n", "\n", "。", "，", " ", ""]
+            chunk_size=settings.RAG_CHUNK_SIZE,
+            chunk_overlap=settings.RAG_CHUNK_OVERLAP,
+            separators=["\n\n", "\n", "。", "，", " ", ""],
+            add_start_index=True
         )
 
-        os.makedirs(self.docs_dir, exist_ok=True)
-        self.document_checksums = self._load_checksums()
-        self.vector_store = self._load_or_rebuild_vector_store()
-
-    def _load_or_rebuild_vector_store(self) -> FAISS:
-        current_docs = self._get_all_documents()
-
-        # 如果索引不存在，直接创建
-        if not os.path.exists(self.index_dir):
-            return self._build_vector_store(current_docs)
-
-        # 检查是否有文档变化
-        if self._has_document_changes(current_docs):
-            logger.info("RAG", "检测到文档变更，重新建立索引。")
-            # 删除旧索引
-            if os.path.exists(self.index_dir):
-                shutil.rmtree(self.index_dir)
-            # 重建新索引
-            return self._build_vector_store(current_docs)
-
-        # 索引存在且无变化，直接加载
-        return FAISS.load_local(
-            self.index_dir,
-            self.embeddings,
-            allow_dangerous_deserialization=True
-        )
-
-    def _build_vector_store(self, docs_list: List[str]) -> FAISS:
-        """基于当前文档列表构建新索引"""
-        if not docs_list:
-            # 空文档时创建占位文档
-            placeholder_doc = Document(
-                page_content="",
-                metadata={"source": "placeholder"}
-            )
-            return FAISS.from_documents([placeholder_doc], self.embeddings)
-
-        # 加载所有文档
-        loader = DirectoryLoader(
-            self.docs_dir,
-            glob="*.txt",
-            loader_cls=TextLoader,
-            loader_kwargs={"encoding": "utf-8"},
-        )
-        documents = loader.load()
-
-        # 分割文档并创建索引、保存校验和
-        documents = [self._enrich_metadata(d) for d in documents]
-        splits = self.text_splitter.split_documents(documents)
-        vector_store = FAISS.from_documents(splits, self.embeddings)
-        vector_store.save_local(self.index_dir)
-        self._save_checksums()
-        return vector_store
-
-    def _has_document_changes(self, current_docs: List[str]) -> bool:
-        """检查文档是否有变更"""
-        # 检查已删除的文档
-        for doc_name in self.document_checksums:
-            if doc_name not in current_docs:
-                return True
-
-        # 检查新增或修改的文档
-        for doc_name in current_docs:
-            file_path = os.path.join(self.docs_dir, doc_name)
-            current_checksum = self._calculate_checksum(file_path)
-
-            # 新增文档
-            if doc_name not in self.document_checksums:
-                return True
-
-            # 修改的文档
-            if self.document_checksums[doc_name] != current_checksum:
-                return True
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
 
-        return False
+        self.archive = MemoryArchive(self.memory_dir, settings.MEMORY_ARCHIVE_COMPRESS_LEVEL)
+        self._remove_legacy_index()
+        self._check_splitter_config()
+        self._migrate_legacy_memory()
 
-    def _load_checksums(self) -> Dict[str, str]:
-        if os.path.exists(self.checksum_file):
-            with open(self.checksum_file, "r", encoding="utf-8") as file:
-                try:
-                    return json.load(file)
-                except json.JSONDecodeError:
-                    return {}
-        with open(self.checksum_file, "w", encoding="utf-8") as file:
-            json.dump({}, file, ensure_ascii=False, indent=2)
-        return {}
-
-    def _save_checksums(self) -> None:
-        checksums = {}
-        current_docs = self._get_all_documents()
-
-        # 为所有当前存在的文档计算新的校验和
-        for doc_name in current_docs:
-            file_path = os.path.join(self.docs_dir, doc_name)
-            checksums[doc_name] = self._calculate_checksum(file_path)
-
-        # 更新内存中的校验和
-        self.document_checksums = checksums
-
-        # 保存到文件
-        with open(self.checksum_file, "w", encoding="utf-8") as file:
-            json.dump(checksums, file, ensure_ascii=False, indent=2)
+        self.knowledge = VectorPartition(
+            "knowledge", self.docs_dir, os.path.join(self.index_root, "knowledge"),
+            self.embeddings, self.text_splitter, index_type=settings.RAG_INDEX_TYPE
+        )
+        self.knowledge.load()
+        # "群号/月份" -> 记忆分区（LRU）
+        self._memory_partitions: OrderedDict[str, VectorPartition] = OrderedDict()
+        # 仍被引用的记忆分区（含已移出 LRU 的），保证同一分区只有一个对象，索引更新由同一把锁串行化
+        self._live_partitions: "weakref.WeakValueDictionary[str, VectorPartition]" = weakref.WeakValueDictionary()
+        self._partitions_lock = threading.Lock()
+
+    # ---------- 分区管理 ---------- #
+    def _memory_partition(self, group_id: str, month: str, touch: bool = True) -> VectorPartition:
+        """
+        获取群某月的记忆分区（不加载索引）
+        touch 为 True（查询）时记为最近使用，超出缓存上限时丢弃最久未使用的分区；
+        为 False（后台检查变更）时不改变 LRU，未缓存的分区用完即释放
+        """
+        group_id = self.archive.safe_group_id(group_id)
+        key = f"{group_id}/{month}"
+        with self._partitions_lock:
+            partition = self._memory_partitions.get(key)
+            if partition is None:
+                partition = self._live_partitions.get(key)
+            if partition is None:
+                partition = VectorPartition(
+                    f"memory/{key}", self.archive.group_dir(group_id),
+                    os.path.join(self.index_root, "memory", group_id, month),
+                    self.embeddings, self.text_splitter,
+                    prefix=month, suffixes=(ACTIVE_SUFFIX, CLOSED_SUFFIX), index_type=settings.RAG_INDEX_TYPE
+                )
+                self._live_partitions[key] = partition
+            if touch:
+                self._memory_partitions[key] = partition
+                self._memory_partitions.move_to_end(key)
+                while len(self._memory_partitions) > settings.RAG_MEMORY_CACHED_SHARDS:
+                    self._memory_partitions.popitem(last=False)
+            return partition
 
     @staticmethod
-    def _calculate_checksum(file_path: str) -> str:
-        hasher = hashlib.md5()
-        with open(file_path, "rb") as file:
-            while chunk := file.read(4096):
-                hasher.update(chunk)
-        return hasher.hexdigest()  # 计算MD5校验和
-
-    def _get_all_documents(self) -> List[str]:
-        """获取文档目录中所有的txt文件"""
-        return [file for file in os.listdir(self.docs_dir)
-                if file.endswith(".txt") and os.path.isfile(os.path.join(self.docs_dir, file))]
-
-    @deprecated("Use _load_or_rebuild_vector_store() instead")
-    def _load_vector_store(self) -> FAISS:
-        if os.path.exists(f"{self.docs_dir}/index"):
-            return FAISS.load_local(
-                f"{self.docs_dir}/index",
-                self.embeddings,
-                allow_dangerous_deserialization=True
-            )
-
-        loader = DirectoryLoader(
-            self.docs_dir,
-            glob="*.txt",
-            loader_cls=TextLoader,
-            loader_kwargs={"encoding": "utf-8"},
-        )
-        documents = loader.load()
-        splits = self.text_splitter.split_documents(documents)
+    def _sync_partition(partition: VectorPartition) -> Dict[str, int]:
+        """同步分区索引；原本未加载的分区更新后立即释放，只保留落盘的索引"""
+        if partition.loaded:
+            return partition.update()
+        changes = partition.update()
+        partition.unload()
+        return changes
 
-        vector_store = FAISS.from_documents(splits, self.embeddings)
-        vector_store.save_local(f"{self.docs_dir}/index")
-        return vector_store
+    def _remove_legacy_index(self) -> None:
+        """删除旧版本未分区的索引文件"""
+        legacy_files = [
+            os.path.join(self.docs_dir, "index", "index.faiss"),
+            os.path.join(self.docs_dir, "index", "index.pkl"),
+            os.path.join(self.docs_dir, "document_checksums.json"),
+            os.path.join(self.index_root, "index.faiss"),
+            os.path.join(self.index_root, "index.pkl"),
+            os.path.join(self.index_root, "document_checksums.json"),
+        ]
+        # 按群分区（未按月分片）时期的记忆索引
+        for group_id in self.archive.groups():
+            group_index_dir = os.path.join(self.index_root, "memory", group_id)
+            legacy_files += [os.path.join(group_index_dir, name)
+                             for name in ("index.faiss", "index.pkl", "document_checksums.json")]
+        for file_path in legacy_files:
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+                logger.info("RAG", f"已删除旧版索引文件: {file_path}")
+
+    def _check_splitter_config(self) -> None:
+        """分块参数变化后，已有索引的分块边界不再适用，删除后全量重建"""
+        config_file = os.path.join(self.index_root, "splitter.json")
+        config = {"chunk_size": settings.RAG_CHUNK_SIZE, "chunk_overlap": settings.RAG_CHUNK_OVERLAP}
+        if os.path.exists(config_file):
+            with open(config_file, "r", encoding="utf-8") as file:
+                previous = json.load(file)
+            if previous != config:
+                for name in ("knowledge", "memory"):
+                    shutil.rmtree(os.path.join(self.index_root, name), ignore_errors=True)
+                logger.info("RAG", f"分块参数由 {previous} 变更为 {config}，已删除旧索引")
+        os.makedirs(self.index_root, exist_ok=True)
+        with open(config_file, "w", encoding="utf-8") as file:
+            json.dump(config, file)
+
+    def _migrate_legacy_memory(self) -> None:
+        """
+        将旧版记忆文本迁移到归档分片，原文件改名为 .bak 保留：
+        - docs_dir/daily_memory.txt：所有群共用，按「日期」与「【群 xxx】」拆分
+        - docs_dir/memory/<群号>/daily_memory.txt：按群存放，按「日期」拆分
+        """
+        migrated = []
+        legacy_file = os.path.join(self.docs_dir, MEMORY_FILE_NAME)
+        if os.path.isfile(legacy_file):
+            migrated.append(legacy_file)
+            for (group_id, date), lines in self._parse_legacy_memory(legacy_file, None).items():
+                self.archive.append(group_id, date, "\n".join(lines))
+
+        for group_id in self.archive.groups():
+            group_file = os.path.join(self.archive.group_dir(group_id), MEMORY_FILE_NAME)
+            if os.path.isfile(group_file):
+                migrated.append(group_file)
+                for (_, date), lines in self._parse_legacy_memory(group_file, group_id).items():
+                    self.archive.append(group_id, date, "\n".join(lines))
+
+        for file_path in migrated:
+            os.replace(file_path, f"{file_path}.bak")
+            logger.info("RAG", f"已将 {file_path} 迁移到记忆归档，原文件已备份为 .bak")
 
+    @staticmethod
+    def _parse_legacy_memory(file_path: str, group_id: Optional[str]) -> Dict[Tuple[str, str], List[str]]:
+        """解析旧版记忆文本，返回 (群号, 日期) -> 摘要行；group_id 为空时从「【群 xxx】」行读取群号"""
+        date = ""
+        current = group_id
+        entries: Dict[Tuple[str, str], List[str]] = {}
+        with open(file_path, "r", encoding="utf-8") as file:
+            for line in file:
+                line = line.rstrip("\n")
+                if line.startswith("日期："):
+                    date, current = line[len("日期："):].strip(), group_id
+                elif line == "=" * 30:
+                    current = group_id
+                elif group_id is None and (match := re.fullmatch(r"【群 (.+)】", line)):
+                    current = match.group(1)
+                elif current is not None and (line.strip() or (current, date) in entries):
+                    entries.setdefault((current, date), []).append(line)
+        return {key: lines for key, lines in entries.items() if "".join(lines).strip()}
+
+    # ---------- 文档管理 ---------- #
     def add_document(self, content: str, filename: str) -> None:
         """新增文档"""
         if not filename.endswith(".txt"):
@@ -176,7 +204,7 @@ class RAGService:
         with open(file_path, "w", encoding="utf-8") as file:
             file.write(content)
 
-        self.check_and_update_documents()
+        self.knowledge.update()
 
     def delete_document(self, filename: str) -> bool:
         if not filename.endswith(".txt"):
@@ -186,62 +214,67 @@ class RAGService:
 
         if os.path.exists(file_path):
             os.remove(file_path)
-            self.check_and_update_documents()
+            self.knowledge.update()
             return True
         return False
 
+    def append_memory(self, group_id: str, date: str, summary: str, participants: Optional[List[str]] = None) -> None:
+        """追加一条群的日记忆摘要到当月的归档分片"""
+        self.archive.append(group_id, date, summary, participants)
+
     def check_and_update_documents(self) -> Dict[str, int]:
         """
-        检查文档变化并增量更新向量存储
-        返回变更统计: 新增、更新、删除的文档数量
+        检查各分区文档变化并增量更新向量存储，已结束月份的记忆分片先归档压缩
+        返回变更统计: 新增、更新、删除的文档数量，以及复用、嵌入、删除的分块数量
         """
-        current_docs = self._get_all_documents()
-        previous_checksums = self.document_checksums.copy()
-
-        # 计算变化统计
-        changes = {
-            "added": 0,
-            "updated": 0,
-            "removed": 0
-        }
-
-        # 检查删除的文档
-        for doc_name in previous_checksums:
-            if doc_name not in current_docs:
-                changes["removed"] += 1
-
-        # 检查新增和更新的文档
-        for doc_name in current_docs:
-            file_path = os.path.join(self.docs_dir, doc_name)
-            current_checksum = self._calculate_checksum(file_path)
-
-            if doc_name not in previous_checksums:
-                changes["added"] += 1
-            elif previous_checksums[doc_name] != current_checksum:
-                changes["updated"] += 1
-
-        # 如果有变更，重建索引
-        if any(v > 0 for v in changes.values()):
-            # 删除旧索引
-            if os.path.exists(self.index_dir):
-                shutil.rmtree(self.index_dir)
-            # 构建新索引
-            self.vector_store = self._build_vector_store(current_docs)
-            # 更新校验和
-            self._save_checksums()
-
+        changes = self.knowledge.update()
+        for group_id in self.archive.groups():
+            try:
+                self._update_group_memory(group_id, changes)
+            except Exception as e:
+                # 单个群的失败（如同步期间分片被移动）不影响其他群，下一轮重试
+                logger.warn("RAG", f"群 {group_id} 记忆索引更新失败: {e}")
         return changes
 
+    def _update_group_memory(self, group_id: str, changes: Dict[str, int]) -> None:
+        # 已归档的月份不再变化，只检查仍有活跃分片的月份
+        months = self.archive.compact_closed(group_id)
+        for month in self.archive.active_months(group_id):
+            partition = self._memory_partition(group_id, month, touch=False)
+            if partition.loaded or partition.has_changes():
+                months.append(month)
+        for month in months:
+            partition = self._memory_partition(group_id, month, touch=False)
+            for key, value in self._sync_partition(partition).items():
+                changes[key] += value
+
+    def start_watcher(self, interval: float) -> None:
+        """启动后台线程，按 interval 秒检查文档变更并重建索引，使请求路径不再承担检查与重建开销"""
+        if self._watcher and self._watcher.is_alive():
+            return
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=self._watch_loop, args=(interval,), name="rag-watcher", daemon=True)
+        self._watcher.start()
+        logger.info("RAG", f"文档变更监视已启动，间隔 {interval} 秒")
+
+    def stop_watcher(self) -> None:
+        self._stop_event.set()
+        if self._watcher:
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch_loop(self, interval: float) -> None:
+        while not self._stop_event.wait(interval):
+            try:
+                changes = self.check_and_update_documents()
+                if documents_changed(changes):
+                    logger.info("RAG", f"检测到文档变更，索引已在后台更新: {changes}")
+            except Exception as e:
+                logger.warn("RAG", f"后台更新索引失败: {e}")
+
+    # ---------- 查询 ---------- #
     @staticmethod
-    def _enrich_metadata(doc: Document) -> Document:
-        """为Document添加file_name字段，便于过滤"""
-        file_name = Path(doc.metadata.get("source", "")).name
-        doc.metadata["file_name"] = file_name
-        return doc
-
-    def query(self, question: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """查询相关文档片段"""
-        docs = self.vector_store.similarity_search(question, k=top_k)
+    def _format_results(docs: List[Document]) -> List[Dict[str, Any]]:
         return [
             {
                 "content": doc.page_content,
@@ -249,24 +282,128 @@ class RAGService:
             } for doc in docs
         ]
 
-    def query_with_filter(self, question: str, query_filter: Dict[str, str], top_k: int = 10) -> List[Dict[str, Any]]:
-        docs = self.vector_store.similarity_search(question, k=top_k, filter=query_filter)
-        return [
-            {
-                "content": doc.page_content,
-                "metadata": doc.metadata
-            } for doc in docs
-        ]
+    def _memory_partitions_for(self, group_id: Optional[str], start_date: Optional[str],
+                               end_date: Optional[str]) -> List[VectorPartition]:
+        """指定群时只检索该群的分区，否则检索所有群；只检索与日期范围有交集的月份"""
+        group_ids = [group_id] if group_id is not None else self.archive.groups()
+        return [self._memory_partition(gid, month)
+                for gid in group_ids for month in self.archive.months(gid, start_date, end_date)]
 
-    def query_for_memory(self, question: str, top_k: int = 10) -> List[Dict[str, Any]]:
-        query_results = self.query_with_filter(
-            question,
-            query_filter={
-                "file_name": "daily_memory.txt"
-            },
-            top_k=top_k
-        )
-        return query_results
+    @staticmethod
+    def _date_filter(start_date: Optional[str], end_date: Optional[str]) -> Optional[QueryFilter]:
+        if start_date is None and end_date is None:
+            return None
+        return lambda metadata: (start_date or "") <= metadata.get("date", "") <= (end_date or "9999-12-31")
+
+    def _search(self, partitions: List[VectorPartition], embedding: List[float], top_k: int,
+                query_filter: Optional[QueryFilter] = None) -> List[Document]:
+        scored: List[Tuple[Document, float]] = []
+        for partition in partitions:
+            scored.extend(partition.search(embedding, top_k, query_filter))
+        scored.sort(key=lambda item: item[1])
+        return [doc for doc, _ in scored[:top_k]]
+
+    @staticmethod
+    def _lexical_search(partitions: List[VectorPartition], question: str, top_k: int,
+                        query_filter: Optional[QueryFilter] = None) -> Tuple[List[Document], bool]:
+        """BM25 检索，返回 (文档, 是否置信)"""
+        hits: List[Tuple[Document, float, float]] = []
+        for partition in partitions:
+            hits.extend(partition.lexical_search(question, top_k, query_filter))
+        hits.sort(key=lambda item: item[1], reverse=True)
+        hits = hits[:top_k]
+        confident = bool(hits) and hits[0][1] >= settings.RAG_BM25_MIN_SCORE \
+            and hits[0][2] >= settings.RAG_BM25_MIN_COVERAGE
+        return [doc for doc, _, _ in hits], confident
+
+    @staticmethod
+    def _fuse(lexical: List[Document], vector: List[Document], top_k: int) -> List[Document]:
+        """倒数排名融合：按分块在两路结果中的排名累加 1 / (RRF_K + 排名)"""
+        scores: Dict[str, float] = {}
+        docs: Dict[str, Document] = {}
+        for ranked in (lexical, vector):
+            for rank, doc in enumerate(ranked, 1):
+                key = doc.metadata.get("chunk_id", doc.page_content)
+                scores[key] = scores.get(key, 0.0) + 1 / (RRF_K + rank)
+                docs.setdefault(key, doc)
+        return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)[:top_k]]
+
+    def _retrieve(self, partitions: List[VectorPartition], question: str, top_k: int,
+                  query_filter: Optional[QueryFilter] = None) -> List[Dict[str, Any]]:
+        lexical: List[Document] = []
+        if settings.RAG_QUERY_MODE == "hybrid":
+            lexical, confident = self._lexical_search(partitions, question, top_k, query_filter)
+            if confident:
+                return self._format_results(lexical)
+        embedding = self.embeddings.embed_query(question)
+        docs = self._search(partitions, embedding, top_k, query_filter)
+        return self._format_results(self._fuse(lexical, docs, top_k) if lexical else docs)
+
+    def query(self, question: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        """查询相关文档片段"""
+        return self._retrieve([self.knowledge], question, top_k)
+
+    def query_with_filter(self, question: str, query_filter: Dict[str, str], top_k: int = 10) -> List[Dict[str, Any]]:
+        return self._retrieve([self.knowledge], question, top_k, query_filter)
+
+    def query_for_memory(self, question: str, top_k: int = 10, group_id: Optional[str] = None,
+                         start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """检索记忆，可限定群与日期范围（YYYY-MM-DD，闭区间）"""
+        partitions = self._memory_partitions_for(group_id, start_date, end_date)
+        if not partitions:
+            return []
+        return self._retrieve(partitions, question, top_k, self._date_filter(start_date, end_date))
+
+    async def aquery(self, question: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        """异步查询：查询嵌入走异步客户端，BM25 与 FAISS 检索在线程池中执行，不阻塞事件循环"""
+        return await self._asearch([self.knowledge], question, top_k)
+
+    async def aquery_with_filter(self, question: str, query_filter: Dict[str, str],
+                                 top_k: int = 10) -> List[Dict[str, Any]]:
+        return await self._asearch([self.knowledge], question, top_k, query_filter)
+
+    async def aquery_for_memory(self, question: str, top_k: int = 10, group_id: Optional[str] = None,
+                                start_date: Optional[str] = None, end_date: Optional[str] = None
+                                ) -> List[Dict[str, Any]]:
+        partitions = self._memory_partitions_for(group_id, start_date, end_date)
+        if not partitions:
+            return []
+        return await self._asearch(partitions, question, top_k, self._date_filter(start_date, end_date))
+
+    async def _asearch(self, partitions: List[VectorPartition], question: str, top_k: int,
+                       query_filter: Optional[QueryFilter] = None) -> List[Dict[str, Any]]:
+        lexical: List[Document] = []
+        if settings.RAG_QUERY_MODE == "hybrid":
+            lexical, confident = await asyncio.to_thread(
+                self._lexical_search, partitions, question, top_k, query_filter)
+            if confident:
+                return self._format_results(lexical)
+        embedding = await self.embeddings.aembed_query(question)
+        docs = await asyncio.to_thread(self._search, partitions, embedding, top_k, query_filter)
+        return self._format_results(self._fuse(lexical, docs, top_k) if lexical else docs)
+
+
+_instance: Optional[RAGService] = None
+_instance_lock = threading.Lock()
+
+
+def get_rag_service() -> RAGService:
+    """进程内共享的 RAGService，索引常驻内存，避免每次查询重新加载；创建后立即启动后台文档变更监视"""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                service = RAGService(settings.RAG_DOCS_DIR)
+                service.start_watcher(settings.RAG_WATCH_INTERVAL)
+                _instance = service
+    return _instance
+
+
+async def aget_rag_service() -> RAGService:
+    """在事件循环中获取 RAGService；启动预加载失败或尚未完成时在线程池中创建，不阻塞其他群的消息处理"""
+    if _instance is not None:
+        return _instance
+    return await asyncio.to_thread(get_rag_service)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import math
+import os
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from infra.config.settings import settings
+from infra.logger import logger
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# 内存映射加载方式：Flat/HNSW 的向量编码直接映射文件；IVF 的倒排表映射为磁盘倒排表
+_MMAP_FLAGS = {
+    "flat": faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY,
+    "hnsw": faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY,
+    "ivf_flat": faiss.IO_FLAG_MMAP,
+    "ivf_pq": faiss.IO_FLAG_MMAP,
+}
+
+
+def chunk_vector_id(chunk_id: str) -> int:
+    """由分块 ID 派生稳定的 int64 向量 ID，同一分块在任何时候、任何分区中的向量 ID 都相同"""
+    return int.from_bytes(hashlib.blake2b(chunk_id.encode("utf-8"), digest_size=8).digest(), "big") >> 1
+
+
+class VectorIndex:
+    """
+    faiss 向量索引封装，向量以 chunk_vector_id 作为 ID，距离为 L2 平方
+
+    - flat / hnsw 用 IndexIDMap2 包装，ivf_flat / ivf_pq 使用 IVF 自带的 ID 与哈希直接映射（支持删除与取回向量）
+    - 目标类型为 IVF/HNSW 时，向量数达到 train_threshold 前使用精确的 Flat 索引，达到后自动训练并转换，
+      转换时记录新索引相对 Flat 的召回率
+    - 从文件加载时使用内存映射，只读；修改前通过 writable_copy 重新读入可写副本，保存时写临时文件后原子替换
+    """
+
+    def __init__(self, index: faiss.Index, kind: str, path: Optional[str] = None, mmapped: bool = False):
+        self.index = index
+        self.kind = kind
+        self.path = path
+        self.mmapped = mmapped
+        self._configure_search()
+
+    @classmethod
+    def empty(cls, dim: int) -> "VectorIndex":
+        return cls(faiss.IndexIDMap2(faiss.IndexFlatL2(dim)), "flat")
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(path) and os.path.exists(cls._meta_path(path))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "VectorIndex":
+        with open(cls._meta_path(path), "r", encoding="utf-8") as file:
+            kind = json.load(file)["kind"]
+        if mmap:
+            try:
+                return cls(faiss.read_index(path, _MMAP_FLAGS[kind]), kind, path, mmapped=True)
+            except RuntimeError as e:
+                logger.warn("RAG", f"向量索引 {path} 无法内存映射，改为完整读入: {e}")
+        return cls(faiss.read_index(path), kind, path)
+
+    @staticmethod
+    def _meta_path(path: str) -> str:
+        return f"{os.path.splitext(path)[0]}.json"
+
+    @property
+    def dim(self) -> int:
+        return self.index.d
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def writable_copy(self) -> "VectorIndex":
+        """返回可修改的副本；内存映射的索引不能原地修改，需从文件完整读入"""
+        if self.mmapped:
+            return VectorIndex.load(self.path, mmap=False)
+        return VectorIndex(faiss.clone_index(self.index), self.kind)
+
+    def save(self, path: str) -> None:
+        tmp_path = f"{path}.tmp"
+        faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, path)
+        meta_path = self._meta_path(path)
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as file:
+            json.dump({"kind": self.kind, "dim": self.dim, "ntotal": self.ntotal}, file)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        self.path = path
+
+    # ---------- 修改 ---------- #
+    def add(self, ids: Sequence[int], vectors: np.ndarray) -> None:
+        if len(ids):
+            self.index.add_with_ids(np.ascontiguousarray(vectors, dtype="float32"), np.asarray(ids, dtype="int64"))
+
+    def remove(self, ids: Sequence[int]) -> None:
+        if not len(ids):
+            return
+        if self.kind == "hnsw":
+            # HNSW 图不支持删除节点，用剩余向量重建
+            removed = set(ids)
+            keep = [vector_id for vector_id in self.ids() if vector_id not in removed]
+            vectors = self.reconstruct(keep)
+            self.index = self._new_index("hnsw", self.dim, len(keep))
+            self.add(keep, vectors)
+            self._configure_search()
+        else:
+            self.index.remove_ids(np.asarray(ids, dtype="int64"))
+
+    def target_kind(self, index_type: str, train_threshold: Optional[int] = None) -> str:
+        """按当前向量数应使用的索引类型"""
+        threshold = settings.RAG_INDEX_TRAIN_THRESHOLD if train_threshold is None else train_threshold
+        return index_type if self.ntotal >= threshold else "flat"
+
+    def ensure_type(self, index_type: str, train_threshold: Optional[int] = None) -> None:
+        """
+        按目标类型转换索引：向量数未达到阈值时保持/退回 Flat，达到后训练并转换为目标类型
+        PQ 索引取回的是量化后的近似向量，从 ivf_pq 转出时精度以量化结果为准
+        """
+        target = self.target_kind(index_type, train_threshold)
+        if target == self.kind:
+            return
+
+        start = time.perf_counter()
+        ids = self.ids()
+        vectors = self.reconstruct(ids)
+        index = self._new_index(target, self.dim, len(ids))
+        if not index.is_trained:
+            index.train(vectors)
+        previous_kind = self.kind
+        self.index, self.kind = index, target
+        self._configure_search()
+        self.add(ids, vectors)
+
+        message = f"向量索引已由 {previous_kind} 转换为 {target}（{len(ids)} 个向量，耗时 {time.perf_counter() - start:.1f}s）"
+        if target != "flat" and previous_kind == "flat":
+            message += f"，recall@10 相对 Flat 为 {self.recall_against_flat(ids, vectors):.3f}"
+        logger.info("RAG", message)
+
+    # ---------- 查询 ---------- #
+    def search(self, vector: Sequence[float], k: int) -> List[Tuple[int, float]]:
+        """返回 [(向量 ID, L2 平方距离)]，按距离升序"""
+        if not self.ntotal:
+            return []
+        query = np.asarray([vector], dtype="float32")
+        distances, ids = self.index.search(query, min(k, self.ntotal))
+        return [(int(vector_id), float(distance))
+                for vector_id, distance in zip(ids[0], distances[0]) if vector_id != -1]
+
+    def ids(self) -> List[int]:
+        """索引中的全部向量 ID"""
+        if self.kind in ("flat", "hnsw"):
+            return faiss.vector_to_array(self.index.id_map).tolist()
+        invlists = faiss.extract_index_ivf(self.index).invlists
+        ids: List[int] = []
+        for list_no in range(invlists.nlist):
+            size = invlists.list_size(list_no)
+            if size:
+                ids.extend(faiss.rev_swig_ptr(invlists.get_ids(list_no), size).tolist())
+        return ids
+
+    def reconstruct(self, ids: Sequence[int]) -> np.ndarray:
+        vectors = np.empty((len(ids), self.dim), dtype="float32")
+        for row, vector_id in enumerate(ids):
+            vectors[row] = self.index.reconstruct(int(vector_id))
+        return vectors
+
+    def recall_against_flat(self, ids: Sequence[int], vectors: np.ndarray, k: int = 10, sample: int = 200) -> float:
+        """以部分原始向量为查询，计算本索引 top-k 结果与精确 Flat 检索结果的重合比例（ids 与 vectors 一一对应）"""
+        if not len(vectors):
+            return 1.0
+        exact = faiss.IndexIDMap2(faiss.IndexFlatL2(self.dim))
+        exact.add_with_ids(np.ascontiguousarray(vectors, dtype="float32"), np.asarray(ids, dtype="int64"))
+        rng = np.random.default_rng(0)
+        queries = vectors[rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False)]
+        k = min(k, len(vectors))
+        _, expected = exact.search(queries, k)
+        _, actual = self.index.search(queries, k)
+        hits = sum(len(set(row_expected) & set(row_actual)) for row_expected, row_actual in zip(expected, actual))
+        return hits / expected.size
+
+    # ---------- 构建 ---------- #
+    @staticmethod
+    def _new_index(kind: str, dim: int, size: int) -> faiss.Index:
+        if kind == "flat":
+            return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+        if kind == "hnsw":
+            return faiss.IndexIDMap2(faiss.IndexHNSWFlat(dim, settings.RAG_HNSW_M))
+
+        # 聚类中心数取 4√n，并保证每个中心至少有 39 个训练样本
+        nlist = max(1, min(int(4 * math.sqrt(size)), size // 39))
+        quantizer = faiss.IndexFlatL2(dim)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        elif kind == "ivf_pq":
+            # 子量化器数需整除维度，取不超过配置值的最大约数
+            pq_m = max(m for m in range(1, min(settings.RAG_PQ_M, dim) + 1) if dim % m == 0)
+            # 每个子量化器 2^nbits 个中心，训练样本不足 256 个时相应减少位数
+            nbits = min(8, max(1, size.bit_length() - 1))
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, nbits)
+        else:
+            raise ValueError(f"未知的向量索引类型: {kind}")
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+
+    def _configure_search(self) -> None:
+        if self.kind in ("ivf_flat", "ivf_pq"):
+            faiss.extract_index_ivf(self.index).nprobe = settings.RAG_IVF_NPROBE
+        elif self.kind == "hnsw":
+            faiss.downcast_index(self.index.index).hnsw.efSearch = settings.RAG_HNSW_EF_SEARCH
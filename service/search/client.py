@@ -3,6 +3,7 @@ import asyncio
 import httpx
 
 from infra.config.settings import settings
+from infra.deadline import clamp_timeout
 from infra.logger import logger
 from .models import SearchRequest, SearchResponse
 
@@ -25,7 +26,7 @@ class SearchClient:
         payload = searchRequest.model_dump()
 
         try:
-            response = await self.client.post(url=url, json=payload)
+            response = await self.client.post(url=url, json=payload, timeout=clamp_timeout(10))
         except httpx.TimeoutException:
             logger.warn("Web Search", "Timeout")
             return None
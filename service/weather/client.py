@@ -1,10 +1,15 @@
+import asyncio
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Iterable, Optional, Tuple
+from zoneinfo import ZoneInfo
 
 import httpx
 
 from infra.config.settings import settings
+from infra.deadline import clamp_timeout
 from infra.logger import logger
+from .geo_cache import get_geo_cache
+from .response_cache import get_response_cache
 from .models import Location, NowWeather, DailyForecast, WarningInfo, StormItem, StormInfo
 
 
@@ -18,25 +23,60 @@ class QWeatherClient:
             timeout=httpx.Timeout(10, connect=5),
         )
 
-    async def get_location(self, city: str) -> Optional[Location]:
+    @staticmethod
+    def _timeout() -> httpx.Timeout:
+        """按当前对话的剩余时间收紧单次请求超时"""
+        return httpx.Timeout(clamp_timeout(10), connect=clamp_timeout(5))
+
+    async def get_location(self, city: str, persist: bool = True) -> Optional[Location]:
+        """城市名 -> 地点，优先读取城市缓存，未命中时请求 GeoAPI 并写入缓存"""
+        cache = get_geo_cache()
+        hit, location = cache.get(city)
+        if hit:
+            return location
+
+        location, definitive = await self._lookup_location(cache.query_name(city))
+        if definitive:
+            cache.put(city, location, persist=persist)
+        return location
+
+    async def warm_up_locations(self, cities: Iterable[str], concurrency: int = 4) -> int:
+        """批量预查询缓存中没有的城市，最后统一落盘一次，返回实际请求的城市数"""
+        cache = get_geo_cache()
+        # 按规范化后的名称去重，同一城市的不同写法只请求一次
+        missing = list({cache.normalize(city): city for city in cities if not cache.get(city)[0]}.values())
+        if not missing:
+            return 0
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def lookup(city: str) -> None:
+            async with semaphore:
+                await self.get_location(city, persist=False)
+
+        await asyncio.gather(*[lookup(city) for city in missing])
+        cache.save()
+        return len(missing)
+
+    async def _lookup_location(self, city: str) -> Tuple[Optional[Location], bool]:
+        """请求 GeoAPI，返回 (地点, 结果是否确定)；超时、HTTP 错误等不确定的失败不写入缓存"""
         url = f"https://{self.api_host}/geo/v2/city/lookup"
         params = {"location": city}
 
         try:
-            resp = await self.client.get(url, params=params)
+            resp = await self.client.get(url, params=params, timeout=self._timeout())
         except httpx.TimeoutException:
             logger.warn("Weather", f"[{city}] Get Loc Timeout")
-            return None
+            return None, False
 
         if resp.status_code != 200:
             print(f"[ERROR] HTTP {resp.status_code}, body: {resp.text}")
-            return None
+            return None, False
 
         try:
             data = resp.json()
         except Exception as e:
             print(f"[ERROR] JSON 解析失败: {e}, body: {resp.text[:200]}")
-            return None
+            return None, False
 
         if data.get("code") == "200" and data.get("location"):
             loc = data["location"][0]
@@ -46,14 +86,47 @@ class QWeatherClient:
                 country=loc["country"],
                 adm1=loc["adm1"],
                 adm2=loc["adm2"]
-            )
-        return None
+            ), True
+        # 404：查询成功但没有匹配的城市
+        return None, data.get("code") in ("200", "404")
 
     async def get_now_weather(self, location_id: str) -> Optional[NowWeather]:
+        return await get_response_cache().get(
+            "now", location_id, lambda: self._fetch_now_weather(location_id),
+            ttl=settings.WEATHER_NOW_TTL_SECONDS, stale=settings.WEATHER_STALE_SECONDS,
+        )
+
+    async def get_daily_forecast(self, location_id: str) -> Optional[list[DailyForecast]]:
+        """7 天预报，今天与之后几天的查询共用同一份缓存"""
+        return await get_response_cache().get(
+            "7d", location_id, lambda: self._fetch_daily_forecast(location_id),
+            ttl=settings.WEATHER_FORECAST_TTL_SECONDS, stale=settings.WEATHER_STALE_SECONDS,
+        )
+
+    async def get_day_forecast(self, location_id: str, days_ahead: int = 0) -> Optional[DailyForecast]:
+        """从 7 天预报中取今天起第 days_ahead 天，今天 0 点前写入的缓存先丢弃，避免跨天后错位"""
+        today = datetime.now(tz=ZoneInfo("Asia/Shanghai")).replace(hour=0, minute=0, second=0, microsecond=0)
+        get_response_cache().invalidate("7d", location_id, before=today.timestamp())
+        daily_list = await self.get_daily_forecast(location_id)
+        if not daily_list or days_ahead >= len(daily_list):
+            return None
+        return daily_list[days_ahead]
+
+    async def get_today_forecast(self, location_id: str) -> Optional[DailyForecast]:
+        return await self.get_day_forecast(location_id)
+
+    async def get_warning_info(self, location_id: str) -> Optional[list[WarningInfo]]:
+        # 预警需要及时，过期后不返回旧数据
+        return await get_response_cache().get(
+            "warning", location_id, lambda: self._fetch_warning_info(location_id),
+            ttl=settings.WEATHER_WARNING_TTL_SECONDS,
+        )
+
+    async def _fetch_now_weather(self, location_id: str) -> Optional[NowWeather]:
         url = f"https://{self.api_host}/v7/weather/now"
         params = {"location": location_id}
         try:
-            resp = await self.client.get(url, params=params)
+            resp = await self.client.get(url, params=params, timeout=self._timeout())
         except httpx.TimeoutException:
             logger.warn("Weather", f"[{location_id}] Get Now Weather Timeout")
             return None
@@ -63,11 +136,11 @@ class QWeatherClient:
             return NowWeather(**now)
         return None
 
-    async def get_daily_forecast(self, location_id: str) -> Optional[list[DailyForecast]]:
+    async def _fetch_daily_forecast(self, location_id: str) -> Optional[list[DailyForecast]]:
         url = f"https://{self.api_host}/v7/weather/7d"
         params = {"location": location_id}
         try:
-            resp = await self.client.get(url, params=params)
+            resp = await self.client.get(url, params=params, timeout=self._timeout())
         except httpx.TimeoutException:
             logger.warn("Weather", f"[{location_id}] Get Forecast Weather Timeout")
             return None
@@ -76,17 +149,11 @@ class QWeatherClient:
             return [DailyForecast(**item) for item in data["daily"]]
         return None
 
-    async def get_today_forecast(self, location_id: str) -> Optional[DailyForecast]:
-        daily_list = await self.get_daily_forecast(location_id)
-        if daily_list:
-            return daily_list[0]
-        return None
-
-    async def get_warning_info(self, location_id: str) -> Optional[list[WarningInfo]]:
+    async def _fetch_warning_info(self, location_id: str) -> Optional[list[WarningInfo]]:
         url = f"https://{self.api_host}/v7/warning/now"
         params = {"location": location_id}
         try:
-            resp = await self.client.get(url, params=params)
+            resp = await self.client.get(url, params=params, timeout=self._timeout())
         except httpx.TimeoutException:
             logger.warn("Weather", f"[{location_id}] Get Warning Timeout")
             return None
@@ -100,7 +167,7 @@ class QWeatherClient:
         year = str(datetime.now().year)
         params = {"basin": "NP", "year": year}
         try:
-            resp = await self.client.get(url, params=params)
+            resp = await self.client.get(url, params=params, timeout=self._timeout())
         except httpx.TimeoutException:
             logger.warn("Weather", f"[{year}] Get Storm List Timeout")
             return None
@@ -118,7 +185,7 @@ class QWeatherClient:
         url = f"https://{self.api_host}/v7/tropical/storm-track"
         params = {"stormid": storm_id}
         try:
-            resp = await self.client.get(url, params=params)
+            resp = await self.client.get(url, params=params, timeout=self._timeout())
         except httpx.TimeoutException:
             logger.warn("Weather", f"Storm Id [{storm_id}] Get Storm Info Timeout")
             return None
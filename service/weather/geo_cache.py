@@ -0,0 +1,136 @@
+import json
+import os
+import re
+import time
+import unicodedata
+from typing import Any, Dict, Optional, Tuple
+
+from infra.config.settings import settings
+from infra.logger import logger
+from .models import Location
+
+# 常见城市别称 -> 标准名称，查询前替换
+CITY_ALIASES = {
+    "帝都": "北京",
+    "京城": "北京",
+    "魔都": "上海",
+    "申城": "上海",
+    "羊城": "广州",
+    "花城": "广州",
+    "鹏城": "深圳",
+    "蓉城": "成都",
+    "山城": "重庆",
+    "雾都": "重庆",
+    "春城": "昆明",
+    "泉城": "济南",
+    "冰城": "哈尔滨",
+    "江城": "武汉",
+    "星城": "长沙",
+    "金陵": "南京",
+    "杭城": "杭州",
+    "鹭岛": "厦门",
+    "长安": "西安",
+}
+
+_IGNORED_CHARS = re.compile(r"[\s,，.。、·・'\"“”‘’()（）\[\]【】]+")
+
+
+class GeoCache:
+    """
+    城市名 -> 和风天气 Location 的持久化缓存
+
+    - 缓存键为规范化的名称（全角转半角、去除空白与标点、英文小写，并替换常见别称）；
+      请求 GeoAPI 时仍使用原始写法（如「New York」），只替换别称
+    - 查到的地点长期缓存（WEATHER_GEO_TTL_DAYS），查不到的名称也缓存一段时间（WEATHER_GEO_NEGATIVE_TTL_HOURS），
+      避免反复请求；网络错误与配额错误不缓存
+    - 查询名以地点的官方名称开头时（如「北京市」->「北京」），官方名称同时登记为别名
+    """
+
+    def __init__(self, path: str, ttl: float, negative_ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # 地点 ID -> {"location": Location 字段, "expires": 过期时间戳}
+        self._locations: Dict[str, Dict[str, Any]] = {}
+        # 规范化名称 -> {"id": 地点 ID（查无此地为 None）, "expires": 过期时间戳}
+        self._names: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    @staticmethod
+    def normalize(city: str) -> str:
+        """缓存键，不能用作查询名"""
+        name = _IGNORED_CHARS.sub("", unicodedata.normalize("NFKC", city)).lower()
+        return CITY_ALIASES.get(name, name)
+
+    @staticmethod
+    def query_name(city: str) -> str:
+        """发送给 GeoAPI 的名称：保留原始写法（仅全角转半角、去除首尾空白），别称替换为标准名称"""
+        name = unicodedata.normalize("NFKC", city).strip()
+        return CITY_ALIASES.get(_IGNORED_CHARS.sub("", name).lower(), name)
+
+    def get(self, city: str) -> Tuple[bool, Optional[Location]]:
+        """返回 (是否命中, 地点)；命中且地点为 None 表示该名称已确认查不到"""
+        now = time.time()
+        entry = self._names.get(self.normalize(city))
+        if entry is None or entry["expires"] <= now:
+            return False, None
+        if entry["id"] is None:
+            return True, None
+        record = self._locations.get(entry["id"])
+        if record is None or record["expires"] <= now:
+            return False, None
+        return True, Location(**record["location"])
+
+    def put(self, city: str, location: Optional[Location], persist: bool = True) -> None:
+        now = time.time()
+        name = self.normalize(city)
+        if location is None:
+            self._names[name] = {"id": None, "expires": now + self.negative_ttl}
+        else:
+            expires = now + self.ttl
+            self._locations[location.id] = {"location": location.model_dump(), "expires": expires}
+            self._names[name] = {"id": location.id, "expires": expires}
+            official = self.normalize(location.name)
+            if official != name and name.startswith(official) and official not in self._names:
+                self._names[official] = {"id": location.id, "expires": expires}
+        if persist:
+            self.save()
+
+    def save(self) -> None:
+        now = time.time()
+        data = {
+            "locations": {key: value for key, value in self._locations.items() if value["expires"] > now},
+            "names": {key: value for key, value in self._names.items() if value["expires"] > now},
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warn("Weather", f"城市缓存读取失败，将重新查询: {e}")
+            return
+        self._locations = data.get("locations", {})
+        self._names = data.get("names", {})
+
+
+_geo_cache: Optional[GeoCache] = None
+
+
+def get_geo_cache() -> GeoCache:
+    """进程内共享的城市缓存，各 QWeatherClient 实例共用"""
+    global _geo_cache
+    if _geo_cache is None:
+        _geo_cache = GeoCache(
+            settings.WEATHER_GEO_CACHE_PATH,
+            ttl=settings.WEATHER_GEO_TTL_DAYS * 86400,
+            negative_ttl=settings.WEATHER_GEO_NEGATIVE_TTL_HOURS * 3600,
+        )
+    return _geo_cache
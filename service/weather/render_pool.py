@@ -0,0 +1,112 @@
+"""
+台风路径图渲染进程池
+
+matplotlib 的 pyplot 状态不是线程安全的，绘图本身又是占用 GIL 的 CPU 计算，
+因此在常驻的子进程中渲染：
+- 子进程启动时加载底图与字体并绘制各画幅的静态图层，之后每次只接收 StormTrack（紧凑的数值数组），返回 PNG 字节
+- 同时渲染的数量不超过进程数，其余请求在事件循环中排队，排队与绘制耗时计入统计
+- 子进程异常退出时重建进程池
+"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from infra.config.settings import settings
+from infra.logger import logger
+from .typhoon_renderer import StormTrack, TyphoonRenderer
+
+# 子进程内的绘制器，由 _init_worker 创建
+_worker_renderer: Optional[TyphoonRenderer] = None
+
+
+def _init_worker() -> None:
+    global _worker_renderer
+    _worker_renderer = TyphoonRenderer()
+    _worker_renderer.prepare()
+
+
+def _render_in_worker(track: StormTrack) -> Tuple[bytes, float, float]:
+    """返回 (PNG 字节, 开始绘制的时间戳, 绘制耗时)"""
+    started_at = time.time()
+    begin = time.perf_counter()
+    png = _worker_renderer.render(track)
+    return png, started_at, time.perf_counter() - begin
+
+
+class TyphoonRenderPool:
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # 限制同时提交到进程池的任务数，排队发生在事件循环中
+        self._semaphore = asyncio.Semaphore(self.workers)
+        self._stats = {"rendered": 0, "failed": 0, "queue_seconds": 0.0, "queue_max": 0.0, "render_seconds": 0.0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # 主进程中有其他线程在运行，不能用 fork 启动子进程
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._executor
+
+    async def render(self, track: StormTrack) -> bytes:
+        """在子进程中绘制台风路径图，返回 PNG 字节"""
+        submitted_at = time.time()
+        async with self._semaphore:
+            executor = self._get_executor()
+            try:
+                png, started_at, render_seconds = await asyncio.get_running_loop().run_in_executor(
+                    executor, _render_in_worker, track
+                )
+            except BrokenProcessPool:
+                # 子进程崩溃后整个进程池不可用，下次渲染时重建
+                if self._executor is executor:
+                    self._executor = None
+                executor.shutdown(wait=False)
+                self._stats["failed"] += 1
+                raise
+            except Exception:
+                self._stats["failed"] += 1
+                raise
+
+        # 排队时间包含等待空闲进程与子进程首次启动绘制静态图层的时间
+        queue_seconds = max(0.0, started_at - submitted_at)
+        self._stats["rendered"] += 1
+        self._stats["queue_seconds"] += queue_seconds
+        self._stats["queue_max"] = max(self._stats["queue_max"], queue_seconds)
+        self._stats["render_seconds"] += render_seconds
+        logger.info("Weather", f"台风「{track.name}」路径图渲染完成，排队 {queue_seconds:.2f}s，绘制 {render_seconds:.2f}s")
+        return png
+
+    def stats(self) -> Dict[str, float]:
+        """渲染次数、失败次数与平均/最大排队时间、平均绘制时间（秒）"""
+        rendered = self._stats["rendered"]
+        return {
+            "rendered": rendered,
+            "failed": self._stats["failed"],
+            "queue_avg": self._stats["queue_seconds"] / rendered if rendered else 0.0,
+            "queue_max": self._stats["queue_max"],
+            "render_avg": self._stats["render_seconds"] / rendered if rendered else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_render_pool: Optional[TyphoonRenderPool] = None
+
+
+def get_render_pool() -> TyphoonRenderPool:
+    """进程内共享的渲染进程池，首次渲染时才启动子进程"""
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = TyphoonRenderPool(settings.TYPHOON_RENDER_WORKERS)
+    return _render_pool
@@ -0,0 +1,106 @@
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from infra.deadline import remaining
+from infra.logger import logger
+
+
+class ResponseCache:
+    """
+    和风天气接口响应的进程内缓存，按 (接口, 地点 ID) 存放
+
+    - 新鲜期（ttl）内直接返回缓存
+    - 过期但仍在 stale 窗口内时先返回旧数据，同时在后台刷新（stale-while-revalidate）
+    - 同一键同时只会有一个请求在途，并发的相同查询共享这一次请求结果（single-flight）
+    - 请求失败（返回 None）不写入缓存，后台刷新失败时保留旧数据
+    """
+
+    def __init__(self):
+        # (接口, 键) -> (写入时间戳, 数据)
+        self._entries: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        # 持有后台刷新任务的引用，避免被垃圾回收
+        self._background: Set[asyncio.Task] = set()
+        # 接口 -> {"hit": 新鲜命中, "stale": 返回旧数据, "coalesced": 合并到在途请求, "miss": 发起请求}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    async def get(self, endpoint: str, key: str, fetch: Callable[[], Awaitable[Optional[Any]]],
+                  ttl: float, stale: float = 0.0) -> Optional[Any]:
+        cache_key = (endpoint, key)
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            age = time.time() - entry[0]
+            if age < ttl:
+                self._count(endpoint, "hit")
+                return entry[1]
+            if age < ttl + stale:
+                self._count(endpoint, "stale")
+                if cache_key not in self._inflight:
+                    task = self._start(cache_key, fetch)
+                    self._background.add(task)
+                    task.add_done_callback(self._background.discard)
+                return entry[1]
+
+        task = self._inflight.get(cache_key)
+        self._count(endpoint, "coalesced" if task is not None else "miss")
+        if task is None:
+            task = self._start(cache_key, fetch)
+        try:
+            # 共享请求不随单个调用方取消，各调用方只按自己的剩余时间等待
+            return await asyncio.wait_for(asyncio.shield(task), timeout=remaining())
+        except asyncio.TimeoutError:
+            logger.warn("Weather", f"[{key}] {endpoint} 等待超时")
+            return None
+
+    def invalidate(self, endpoint: str, key: str, before: Optional[float] = None) -> None:
+        """丢弃缓存；指定 before 时只丢弃该时间戳之前写入的缓存"""
+        entry = self._entries.get((endpoint, key))
+        if entry is not None and (before is None or entry[0] < before):
+            del self._entries[(endpoint, key)]
+
+    def _start(self, cache_key: Tuple[str, str], fetch: Callable[[], Awaitable[Optional[Any]]]) -> asyncio.Task:
+        async def run() -> Optional[Any]:
+            try:
+                data = await fetch()
+            except Exception as e:
+                logger.warn("Weather", f"[{cache_key[1]}] {cache_key[0]} 请求失败: {e}")
+                data = None
+            finally:
+                self._inflight.pop(cache_key, None)
+            if data is not None:
+                self._entries[cache_key] = (time.time(), data)
+            return data
+
+        # 共享请求在不带截止时间的上下文中运行，不受发起者对话剩余时间的限制
+        task = asyncio.create_task(run(), context=contextvars.Context())
+        self._inflight[cache_key] = task
+        return task
+
+    def _count(self, endpoint: str, kind: str) -> None:
+        counters = self._stats.setdefault(endpoint, {"hit": 0, "stale": 0, "coalesced": 0, "miss": 0})
+        counters[kind] += 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """各接口的命中统计，hit_rate 为未发起新请求的调用占比"""
+        result = {}
+        for endpoint, counters in self._stats.items():
+            total = sum(counters.values())
+            result[endpoint] = {
+                **counters,
+                "total": total,
+                "hit_rate": (total - counters["miss"]) / total if total else 0.0,
+            }
+        return result
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """进程内共享的响应缓存，各 QWeatherClient 实例共用"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
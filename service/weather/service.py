@@ -1,16 +1,16 @@
-import time
-from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, Optional
 
-from .models import WeatherResponse, WarningResponse, StormResponse
+from infra.config.settings import settings
+from .models import Location, WeatherResponse, WarningInfo, WarningResponse, StormResponse
 from .client import QWeatherClient
-from .typhoon_renderer import TyphoonRenderer
+from .response_cache import get_response_cache
+from .typhoon_cache import get_typhoon_cache
+from .typhoon_renderer import StormTrack
 
 
 class WeatherService:
     def __init__(self):
         self.client = QWeatherClient()
-        self.typhoon_renderer = TyphoonRenderer()
 
     async def check_location(self, city: str) -> bool:
         location = await self.client.get_location(city)
@@ -18,6 +18,15 @@ class WeatherService:
             return False
         return True
 
+    async def warm_up_locations(self, cities: Iterable[str]) -> int:
+        """预先查询并缓存城市，返回实际请求的城市数"""
+        return await self.client.warm_up_locations(cities)
+
+    @staticmethod
+    def cache_stats() -> Dict[str, Dict[str, float]]:
+        """各天气接口的缓存命中统计"""
+        return get_response_cache().stats()
+
     async def get_now(self, city: str) -> Optional[WeatherResponse]:
         location = await self.client.get_location(city)
         if not location:
@@ -26,17 +35,27 @@ class WeatherService:
         return WeatherResponse(location=location, now=now)
 
     async def get_today(self, city: str) -> Optional[WeatherResponse]:
+        return await self.get_day(city)
+
+    async def get_day(self, city: str, days_ahead: int = 0) -> Optional[WeatherResponse]:
+        """今天起第 days_ahead 天的预报，与今天的查询共用同一份 7 天预报缓存"""
         location = await self.client.get_location(city)
         if not location:
             return None
-        today_forecast = await self.client.get_today_forecast(location.id)
-        if today_forecast is None:
+        forecast = await self.client.get_day_forecast(location.id, days_ahead)
+        if forecast is None:
             return None
         return WeatherResponse(
             location=location,
-            daily=[today_forecast]
+            daily=[forecast]
         )
 
+    async def get_location(self, city: str) -> Optional[Location]:
+        return await self.client.get_location(city)
+
+    async def get_warning_by_location(self, location_id: str) -> Optional[list[WarningInfo]]:
+        return await self.client.get_warning_info(location_id)
+
     async def get_warning(self, city: str) -> Optional[WarningResponse]:
         location = await self.client.get_location(city)
         if not location:
@@ -71,26 +90,14 @@ class WeatherService:
             resp.append(storm_resp_items[::-1])
         if not resp:
             return None
+        # 出现新的观测点时在后台预先渲染路径图；TYPHOON_PRERENDER_MINUTES <= 0 时只在请求图片时渲染
+        if settings.TYPHOON_PRERENDER_MINUTES > 0:
+            for storm_data in resp:
+                get_typhoon_cache().prerender(StormTrack.from_responses(storm_data))
         return resp
 
-    def render_storm(self, storm: list[StormResponse]) -> str:
+    async def render_storm(self, storm: list[StormResponse]) -> str:
+        """返回台风路径图的绝对路径，已渲染过的图片直接返回"""
         if not storm:
             return ""
-
-        typhoon_id = storm[0].storm.id  # 获取台风编号
-        # 生成时间戳
-        timestamp = int(time.time())
-        output_dir = Path("cache/typhoon_images")
-        # typhoon_ID_timestamp.png
-        output_path = str(output_dir / f"typhoon_{typhoon_id}_{timestamp}.png")
-
-        render_success = self.typhoon_renderer.render_to_file(
-            storm_data=storm,
-            output_path=output_path
-        )
-
-        if render_success:
-            # 转为绝对路径返回
-            return str(Path(output_path).resolve())
-        else:
-            return ""
+        return await get_typhoon_cache().get(StormTrack.from_responses(storm))
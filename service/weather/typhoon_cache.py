@@ -0,0 +1,148 @@
+"""
+台风路径图的磁盘缓存
+
+路径只有在和风天气发布新的观测点时才会变化，因此按
+(台风编号, 最新观测发布时间, 画幅, 输出规格) 命名图片，已有图片直接返回：
+- 同一张图同时只会渲染一次，并发请求共享渲染结果
+- 查询台风信息时发现新的观测点，在后台预先渲染
+- 图片目录按保存天数与总大小淘汰，先删除最久未使用的图片
+"""
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from infra.config.settings import settings
+from infra.logger import logger
+from .render_pool import get_render_pool
+from .typhoon_renderer import OUTPUT_PROFILE, StormTrack, choose_scope
+
+# 旧版本（typhoon_{编号}_{时间戳}.png）的输出目录，TYPHOON_IMAGE_DIR 改为其他目录后仍按同样的规则清理
+LEGACY_IMAGE_DIR = "cache/typhoon_images"
+
+
+class TyphoonImageCache:
+
+    def __init__(self, directory: str, max_bytes: int, max_age_seconds: float,
+                 legacy_directory: Optional[str] = LEGACY_IMAGE_DIR):
+        self.directory = Path(directory)
+        self.legacy_directory = Path(legacy_directory) if legacy_directory else None
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        # 图片文件名 -> 在途的渲染任务
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # 持有后台预渲染任务的引用，避免被垃圾回收
+        self._background: Set[asyncio.Task] = set()
+
+    def path_for(self, track: StormTrack) -> Path:
+        """缓存键对应的图片路径"""
+        latest = int(track.points[0]['pub_ts']) if len(track) else 0
+        scope = choose_scope(track)
+        return self.directory / f"typhoon_{track.storm_id}_{latest}_{scope.value}_{OUTPUT_PROFILE}.png"
+
+    def contains(self, track: StormTrack) -> bool:
+        return self.path_for(track).exists()
+
+    async def get(self, track: StormTrack) -> str:
+        """返回路径图的绝对路径，没有缓存时渲染（并发的相同请求共享同一次渲染）"""
+        path = self.path_for(track)
+        if path.exists():
+            # 更新修改时间，淘汰时按最近使用排序
+            await asyncio.to_thread(os.utime, path)
+            return str(path.resolve())
+        # 渲染不随单个调用方取消
+        return await asyncio.shield(self._start(path, track))
+
+    def prerender(self, track: StormTrack) -> None:
+        """没有缓存时在后台渲染"""
+        path = self.path_for(track)
+        if path.name in self._inflight or path.exists():
+            return
+        task = self._start(path, track)
+        self._background.add(task)
+        task.add_done_callback(self._on_prerendered)
+
+    def _on_prerendered(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warn("Weather", f"台风路径图预渲染失败: {task.exception()}")
+
+    def _start(self, path: Path, track: StormTrack) -> asyncio.Task:
+        task = self._inflight.get(path.name)
+        if task is not None:
+            return task
+
+        async def run() -> str:
+            try:
+                png = await get_render_pool().render(track)
+                await asyncio.to_thread(self._write, path, png)
+            finally:
+                self._inflight.pop(path.name, None)
+            return str(path.resolve())
+
+        task = asyncio.create_task(run())
+        self._inflight[path.name] = task
+        return task
+
+    def _write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再替换，避免并发读到不完整的图片
+        tmp = path.with_name(f"{path.name}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        removed = self.evict(keep=path)
+        if removed:
+            logger.info("Weather", f"已清理 {removed} 张台风路径图缓存")
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """
+        删除超过保存天数的图片，总大小超出上限时再从最久未使用的开始删除，返回删除数量
+        旧版本输出目录中的图片一并计入
+        """
+        directories = {self.directory.resolve()}
+        if self.legacy_directory is not None:
+            directories.add(self.legacy_directory.resolve())
+        files: List[Tuple[float, int, Path]] = []
+        for directory in directories:
+            for path in directory.glob("typhoon_*.png"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        now = time.time()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            expired = self.max_age_seconds > 0 and now - mtime > self.max_age_seconds
+            oversize = 0 < self.max_bytes < total
+            if not (expired or oversize):
+                # 按修改时间排序，之后的图片都更新
+                break
+            if keep is not None and path == keep.resolve():
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+
+_typhoon_cache: Optional[TyphoonImageCache] = None
+
+
+def get_typhoon_cache() -> TyphoonImageCache:
+    """进程内共享的台风路径图缓存"""
+    global _typhoon_cache
+    if _typhoon_cache is None:
+        _typhoon_cache = TyphoonImageCache(
+            settings.TYPHOON_IMAGE_DIR,
+            max_bytes=settings.TYPHOON_IMAGE_MAX_MB * 1024 * 1024,
+            max_age_seconds=settings.TYPHOON_IMAGE_MAX_AGE_DAYS * 86400,
+        )
+    return _typhoon_cache
@@ -1,12 +1,13 @@
 import datetime
 import gc
 import io
+import math
 import os
 import platform
 import threading
+from dataclasses import dataclass
 from enum import Enum
-from pathlib import Path
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional
 
 import numpy as np
 from PIL import Image
@@ -16,6 +17,11 @@ from matplotlib import font_manager as fm
 from matplotlib import lines as mpl_lines
 from matplotlib import patches as mpl_patches
 from matplotlib import pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg, RendererAgg
+from matplotlib.figure import Figure
+from matplotlib.text import Text
+from matplotlib.transforms import Bbox
+from cartopy.mpl.gridliner import Gridliner
 from metpy.plots.mapping import ccrs
 
 from .models import StormResponse
@@ -46,11 +52,107 @@ DIR_DEG = {
 }
 
 
+# 小画幅与大画幅的范围 (lon_min, lon_max, lat_min, lat_max)
+SMALL_EXTENT: Tuple[float, float, float, float] = (105, 140, 15, 50)
+LARGE_EXTENT: Tuple[float, float, float, float] = (100, 160, 5, 50)
+RENDER_DPI = 800
+# 输出规格，参与渲染缓存的键；分辨率或绘制样式改变时需一并修改，使旧图片失效
+OUTPUT_PROFILE = f"png{RENDER_DPI}"
+
+# 叠加层绘制范围的外扩量（英寸），标记点半径、文字底框与线宽不计入元素范围，需外扩覆盖
+OVERLAY_PAD_INCHES = 0.15
+
+STORM_TYPES = tuple(STORM_TYPE_COLORS)
+MOVE_DIRS = tuple(DIR_DEG)
+
+# 路径点的紧凑表示；发布时间拆为 UTC 时间戳与时区偏移，缺失的 move360 记为 NaN
+TRACK_POINT_DTYPE = np.dtype([
+    ('pub_ts', 'i8'),
+    ('utc_offset', 'i4'),
+    ('lat', 'f8'),
+    ('lon', 'f8'),
+    ('type', 'u1'),
+    ('pressure', 'f8'),
+    ('wind_speed', 'f8'),
+    ('move_speed', 'f8'),
+    ('move_dir', 'u1'),
+    ('move360', 'f8'),
+])
+
+
 class TyphoonScope(Enum):
     SMALL = "small"
     LARGE = "large"
 
 
+@dataclass
+class StormTrack:
+    """
+    传给渲染进程的台风路径，只含绘图用到的字段
+    points 按时间倒序排列，最新一条在索引 0
+    """
+    storm_id: str
+    name: str
+    year: int
+    points: np.ndarray
+
+    @classmethod
+    def from_responses(cls, storm_data: List[StormResponse]) -> "StormTrack":
+        points = np.empty(len(storm_data), dtype=TRACK_POINT_DTYPE)
+        for i, data in enumerate(storm_data):
+            info = data.stormInfo
+            dt = datetime.datetime.fromisoformat(info.pubTime)
+            if dt.tzinfo is None:
+                # 不带时区的时间按 UTC 存放，还原后仍是原来的钟面时间
+                dt = dt.replace(tzinfo=datetime.timezone.utc)
+            points[i] = (
+                int(dt.timestamp()),
+                int(dt.utcoffset().total_seconds()),
+                float(info.lat),
+                float(info.lon),
+                STORM_TYPES.index(info.type),
+                float(info.pressure),
+                float(info.windSpeed),
+                float(info.moveSpeed),
+                MOVE_DIRS.index(info.moveDir),
+                float(info.move360) if info.move360.strip() else math.nan,
+            )
+        storm = storm_data[0].storm if storm_data else None
+        return cls(
+            storm_id=storm.id if storm else "",
+            name=storm.name if storm else "",
+            year=storm.year if storm else 0,
+            points=points,
+        )
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def subset(self, mask: np.ndarray) -> "StormTrack":
+        return StormTrack(self.storm_id, self.name, self.year, self.points[mask])
+
+    def pub_time(self, i: int) -> datetime.datetime:
+        p = self.points[i]
+        tz = datetime.timezone(datetime.timedelta(seconds=int(p['utc_offset'])))
+        return datetime.datetime.fromtimestamp(int(p['pub_ts']), tz)
+
+    def type_code(self, i: int) -> str:
+        return STORM_TYPES[self.points[i]['type']]
+
+
+@dataclass
+class _StaticLayer:
+    fig: Figure
+    ax: plt.Axes
+    # 裁剪后的静态图层 RGB 位图（不含图例），即最终输出图的底图
+    image: np.ndarray
+    # 裁剪范围在画布上的像素坐标 (x0, y0, x1, y1)，原点在左下角
+    crop: Tuple[int, int, int, int]
+    # 图例的 RGBA 位图及其像素范围
+    legend: np.ndarray
+    legend_crop: Tuple[int, int, int, int]
+
+
 class TyphoonRenderer:
     _instance = None
     _lock = None
@@ -73,23 +175,91 @@ class TyphoonRenderer:
         cur_dir = os.path.dirname(__file__)
         self.base_image: np.ndarray = plt.imread(os.path.join(cur_dir, 'resources', 'ne_base.png'))
         self.base_image_large: np.ndarray = plt.imread(os.path.join(cur_dir, 'resources', 'ne_base_large.png'))
-        self.extent: Tuple[float, float, float, float] = (105, 140, 15, 50)  # lon_min, lon_max, lat_min, lat_max
-        self.extent_large: Tuple[float, float, float, float] = (100, 160, 5, 50)
+        self.extent: Tuple[float, float, float, float] = SMALL_EXTENT  # lon_min, lon_max, lat_min, lat_max
+        self.extent_large: Tuple[float, float, float, float] = LARGE_EXTENT
         self.proj = ccrs.PlateCarree()  # 设置投影
         self.aspect = (self.extent[1] - self.extent[0]) / (self.extent[3] - self.extent[2])
         self.aspect_large = ((self.extent_large[1] - self.extent_large[0]) /
                              (self.extent_large[3] - self.extent_large[2]))
-        self.dpi = 800
+        self.dpi = RENDER_DPI
+        # 字体只需在进程内设置一次
+        self._set_font()
+        # 各画幅的静态图层，首次使用时绘制
+        self._static_layers: Dict[TyphoonScope, _StaticLayer] = {}
 
         self._initialized = True
 
-    def render(self, storm_data: List[StormResponse]) -> Image:
-        self._set_font()
+    def render(self, storm_data: StormTrack) -> bytes:
+        """
+        绘制台风路径图，返回 PNG 编码后的图像
+        底图、经纬网、图例与脚注取自按画幅缓存的静态图层，每次只绘制路径、风圈、箭头与文字并叠加上去
+        """
+        typhoon_scope = choose_scope(storm_data)
+        layer = self._static_layer(typhoon_scope)
+        storm_data = self._filter_data_by_scope(storm_data, typhoon_scope)
+
+        overlay, bounds = self._render_overlay(layer, storm_data)
+        # 叠加层超出静态图层时（如贴近边缘的文字）与原先 tight 裁剪一样向外扩展画布
+        crops = [layer.crop] + bounds
+        canvas = (min(c[0] for c in crops), min(c[1] for c in crops),
+                  max(c[2] for c in crops), max(c[3] for c in crops))
+        if canvas == layer.crop:
+            image = layer.image.copy()
+        else:
+            image = np.full((canvas[3] - canvas[1], canvas[2] - canvas[0], 3), 255, dtype=np.uint8)
+            self._paste(image, canvas, layer.crop, layer.image)
+
+        for crop, rgba in overlay:
+            self._paste(image, canvas, crop, rgba)
+
+        buffer = io.BytesIO()
+        Image.fromarray(image).save(buffer, format='png')
+        return buffer.getvalue()
+
+    @staticmethod
+    def _paste(image: np.ndarray, canvas: Tuple[int, int, int, int],
+               crop: Tuple[int, int, int, int], pixels: np.ndarray) -> None:
+        """将位于像素范围 crop 的 RGB/RGBA 位图按透明度叠加到覆盖 canvas 范围的图像上，超出部分丢弃"""
+        left, top = crop[0] - canvas[0], canvas[3] - crop[3]
+        pixels = pixels[max(0, -top):image.shape[0] - top, max(0, -left):image.shape[1] - left]
+        left, top = max(0, left), max(0, top)
+        region = image[top:top + pixels.shape[0], left:left + pixels.shape[1]]
+        if pixels.shape[2] == 3:
+            region[...] = pixels
+            return
+        alpha = pixels[..., 3:4].astype(np.uint16)
+        region[...] = (pixels[..., :3] * alpha + region * (255 - alpha) + 127) // 255
+
+    def render_full(self, storm_data: StormTrack) -> bytes:
+        """完整重绘整张图（不使用静态图层缓存），用于对比校验与基准测试"""
+        typhoon_scope = choose_scope(storm_data)
+        fig, ax = self._create_map(typhoon_scope)
+        storm_data = self._filter_data_by_scope(storm_data, typhoon_scope)
+
+        self._draw_track_line(ax, storm_data)
+        self._draw_history_points(ax, storm_data)
+        self._draw_latest_point(ax, storm_data)
+        self._draw_title(ax, storm_data)
+
+        # 将图像输出至缓冲区
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', dpi=self.dpi, bbox_inches='tight', pad_inches=0.1)
+        fig.clear()
+        plt.close(fig)
+
+        gc.collect()
+
+        return buffer.getvalue()
 
-        typhoon_scope = self._choose_scope(storm_data)
+    def prepare(self) -> None:
+        """预先绘制所有画幅的静态图层"""
+        for scope in TyphoonScope:
+            self._static_layer(scope)
 
+    def _create_map(self, scope: TyphoonScope) -> Tuple[Figure, plt.Axes]:
+        """创建画布并绘制底图、经纬网、图例与脚注"""
         h = 8
-        w = h * (self.aspect if typhoon_scope == TyphoonScope.SMALL else self.aspect_large)
+        w = h * (self.aspect if scope == TyphoonScope.SMALL else self.aspect_large)
 
         fig, ax = plt.subplots(
             figsize=(w, h),
@@ -98,15 +268,13 @@ class TyphoonRenderer:
         )
 
         ax.imshow(
-            self.base_image if typhoon_scope == TyphoonScope.SMALL else self.base_image_large,
+            self.base_image if scope == TyphoonScope.SMALL else self.base_image_large,
             origin='upper',
-            extent=self.extent if typhoon_scope == TyphoonScope.SMALL else self.extent_large,
+            extent=self.extent if scope == TyphoonScope.SMALL else self.extent_large,
             transform=self.proj,
             zorder=0,
         )
 
-        storm_data = self._filter_data_by_scope(storm_data, typhoon_scope)
-
         gl = ax.gridlines(
             draw_labels=True,
             linewidth=0.5,
@@ -120,72 +288,151 @@ class TyphoonRenderer:
         gl.xlabel_style = {'size': 8, 'color': 'gray'}
         gl.ylabel_style = {'size': 8, 'color': 'gray'}
 
-        self._draw_track_line(ax, storm_data)
-        self._draw_history_points(ax, storm_data)
-        self._draw_latest_point(ax, storm_data)
-
-        self._draw_legend(ax, typhoon_scope)
-
-        self._draw_title(ax, storm_data)
+        self._draw_legend(ax, scope)
         self._draw_footer(ax)
 
-        # 将图像输出至缓冲区
-        buffer = io.BytesIO()
-        fig.savefig(buffer, format='png', dpi=self.dpi, bbox_inches='tight', pad_inches=0.1)
-        fig.clear()
-        plt.close(fig)
-        buffer.seek(0)
+        return fig, ax
 
-        img_origin = Image.open(buffer)
-        img_copy = img_origin.copy()
-        buffer.close()
+    def _static_layer(self, scope: TyphoonScope) -> "_StaticLayer":
+        layer = self._static_layers.get(scope)
+        if layer is None:
+            layer = self._static_layers[scope] = self._build_static_layer(scope)
+        return layer
 
+    def _build_static_layer(self, scope: TyphoonScope) -> "_StaticLayer":
+        """
+        将静态部分绘制为目标分辨率的位图，裁剪范围与原先 bbox_inches='tight' 的结果一致。
+        之后该画布上的静态元素全部隐藏，只用于绘制叠加层，保证两者坐标完全一致。
+        """
+        fig, ax = self._create_map(scope)
+        # 经纬度标签在绘制时才生成，先走一遍绘制流程再计算范围
+        fig.draw_without_rendering()
+
+        # 标题固定为两行，用占位标题把标题区域算入裁剪范围
+        title = self._put_title(ax, "0000年第00号台风“台风”路径图\n0000年00月00日 00:00")
+        bbox = fig.get_tightbbox(fig.canvas.get_renderer()).padded(0.1)
+        title.remove()
+
+        # 裁剪范围对齐到像素，叠加层按同一像素网格定位
+        crop = (
+            int(np.floor(bbox.x0 * self.dpi)), int(np.floor(bbox.y0 * self.dpi)),
+            int(np.ceil(bbox.x1 * self.dpi)), int(np.ceil(bbox.y1 * self.dpi)),
+        )
+        # 图例会盖住路径，单独绘制为透明图层，叠加路径后再盖上去
+        legend = ax.get_legend()
+        legend.set_visible(False)
+        image = np.asarray(self._rasterize(fig, crop).convert('RGB'))
+        crop = self._fit_crop(crop, image)
+
+        for artist in ax.get_children():
+            if isinstance(artist, Gridliner):
+                # 经纬网绘制时不检查可见性，只能移除
+                artist.remove()
+            else:
+                artist.set_visible(False)
+        fig.patch.set_visible(False)
+        legend.set_visible(True)
+        legend_crop = self._artists_crop([legend], crop)
+        legend_image = np.asarray(self._rasterize(fig, legend_crop, transparent=True).convert('RGBA'))
+        legend_crop = self._fit_crop(legend_crop, legend_image)
+        legend.set_visible(False)
+
+        # 换上新的画布，释放整幅大小的绘制缓冲区
+        FigureCanvasAgg(fig)
         gc.collect()
 
-        return img_copy
+        return _StaticLayer(fig=fig, ax=ax, image=image, crop=crop, legend=legend_image, legend_crop=legend_crop)
 
-    def render_to_file(self, storm_data: List[StormResponse], output_path: str) -> bool:
-        # noinspection PyBroadException
-        try:
-            output = Path(output_path)
-            output.parent.mkdir(parents=True, exist_ok=True)
-
-            typhoon_img: Image.Image = self.render(storm_data)
-            typhoon_img.save(output)
-            return True
-        except Exception as e:
-            print(e)
-            return False
+    def _rasterize(self, fig: Figure, crop: Tuple[int, int, int, int], transparent: bool = False) -> Image.Image:
+        """按像素范围 (x0, y0, x1, y1) 绘制画布的一部分，范围可以超出画布"""
+        x0, y0, x1, y1 = crop
+        buffer = io.BytesIO()
+        fig.savefig(
+            buffer, format='png', dpi=self.dpi, transparent=transparent,
+            bbox_inches=Bbox.from_extents(x0 / self.dpi, y0 / self.dpi, x1 / self.dpi, y1 / self.dpi),
+            pad_inches=0, pil_kwargs={'compress_level': 0},
+        )
+        image = Image.open(buffer)
+        image.load()
+        # 画布尺寸由英寸换算而来，可能与像素范围差一个像素
+        return image.crop((0, 0, min(image.width, x1 - x0), min(image.height, y1 - y0)))
 
-    def _choose_scope(self, storm_data: List[StormResponse]) -> TyphoonScope:
+    def _render_overlay(self, layer: "_StaticLayer", storm_data: StormTrack
+                        ) -> Tuple[List[Tuple[Tuple[int, int, int, int], np.ndarray]], List[Tuple[int, int, int, int]]]:
         """
-            根据台风路径信息决定是否使用大画幅。
-            最新数据在小画幅内，则使用小画幅
-            如果任意一个路径点落在小画幅范围之外，则返回大画幅。
+        在透明背景上只绘制叠加层，按绘制顺序返回各层及图例的位图
+        路径按图例的 zorder 分为图例之下与之上两组，标题单独一组，各组只绘制各自所在的区域
+        返回 ([(像素范围 (x0, y0, x1, y1), RGBA 数组)], [各组按 tight 裁剪留白计算的范围])
         """
-        lon_min, lon_max, lat_min, lat_max = self.extent
-
-        if not storm_data:
-            return TyphoonScope.SMALL
-
-        latest = storm_data[0]
-        lat = float(latest.stormInfo.lat)
-        lon = float(latest.stormInfo.lon)
-
-        if lat_min <= lat <= lat_max and lon_min <= lon <= lon_max:
-            return TyphoonScope.SMALL
-
-        for data in storm_data:
-            lat = float(data.stormInfo.lat)
-            lon = float(data.stormInfo.lon)
-
-            # 如果有任何一个点不在小画幅范围内，返回大画幅
-            if not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
-                return TyphoonScope.LARGE
+        ax = layer.ax
+        existing = set(ax.get_children())
+        self._draw_track_line(ax, storm_data)
+        self._draw_history_points(ax, storm_data)
+        self._draw_latest_point(ax, storm_data)
+        track = [artist for artist in ax.get_children() if artist not in existing]
+        self._draw_title(ax, storm_data)
+        artists = [artist for artist in ax.get_children() if artist not in existing]
+        title = [artist for artist in artists if artist not in track]
+
+        # 完整绘制时图例在最新点之后加入，zorder 相同的元素位于图例之下；None 表示图例
+        legend_zorder = ax.get_legend().get_zorder()
+        below = [artist for artist in track if artist.get_zorder() <= legend_zorder]
+        above = [artist for artist in track if artist.get_zorder() > legend_zorder]
+        groups = [below, None, above, title]
+
+        patches = []
+        # tight 裁剪的留白，用于决定是否扩展画布
+        bounds = [crop for crop in (self._artists_crop(artists, pad_inches=0.1),) if crop]
+        try:
+            # 隐藏的文字没有范围，先算好各组范围再逐组绘制
+            crops = [(group, self._artists_crop(group) if group else None) for group in groups]
+            for group, crop in crops:
+                if group is None:
+                    patches.append((layer.legend_crop, layer.legend))
+                    continue
+                if crop is None:
+                    continue
+                for artist in artists:
+                    artist.set_visible(artist in group)
+                rgba = np.asarray(self._rasterize(layer.fig, crop, transparent=True).convert('RGBA'))
+                patches.append((self._fit_crop(crop, rgba), rgba))
+        finally:
+            for artist in artists:
+                artist.remove()
+        return patches, bounds
+
+    def _artists_crop(self, artists: List, limit: Optional[Tuple[int, int, int, int]] = None,
+                      pad_inches: float = OVERLAY_PAD_INCHES) -> Optional[Tuple[int, int, int, int]]:
+        """元素所在的像素范围 (x0, y0, x1, y1)，外扩 pad_inches，指定 limit 时限制在其中"""
+        # 计算范围只需要文字度量，用 1x1 的绘制器避免分配整幅缓冲区
+        renderer = RendererAgg(1, 1, self.dpi)
+        extents = []
+        for artist in artists:
+            extent = artist.get_window_extent(renderer)
+            if artist.get_clip_on() and artist.get_clip_box() is not None:
+                extent = Bbox.intersection(extent, artist.get_clip_box())
+            # 没有几何范围的元素返回空范围（坐标为无穷大）
+            if extent is not None and np.isfinite(extent.extents).all():
+                extents.append(extent)
+        if not extents:
+            return None
+
+        pad = pad_inches * self.dpi
+        extent = Bbox.union(extents)
+        x0, y0 = int(np.floor(extent.x0 - pad)), int(np.floor(extent.y0 - pad))
+        x1, y1 = int(np.ceil(extent.x1 + pad)), int(np.ceil(extent.y1 + pad))
+        if limit is not None:
+            x0, y0, x1, y1 = max(x0, limit[0]), max(y0, limit[1]), min(x1, limit[2]), min(y1, limit[3])
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1, y1
 
-        return TyphoonScope.SMALL
+    @staticmethod
+    def _fit_crop(crop: Tuple[int, int, int, int], pixels: np.ndarray) -> Tuple[int, int, int, int]:
+        """按实际绘制出的尺寸修正像素范围，以左上角为准"""
+        return crop[0], crop[3] - pixels.shape[0], crop[0] + pixels.shape[1], crop[3]
 
-    def _filter_data_by_scope(self, storm_data: List[StormResponse], scope: TyphoonScope) -> List[StormResponse]:
+    def _filter_data_by_scope(self, storm_data: StormTrack, scope: TyphoonScope) -> StormTrack:
         """
         根据选定的画幅筛选数据：
         只保留落在对应画幅范围内的路径点。
@@ -195,16 +442,16 @@ class TyphoonRenderer:
         else:  # LARGE
             lon_min, lon_max, lat_min, lat_max = self.extent_large
 
-        filtered: List[StormResponse] = []
-        for data in storm_data:
-            lat = float(data.stormInfo.lat)
-            lon = float(data.stormInfo.lon)
-            if lat_min <= lat <= lat_max and lon_min <= lon <= lon_max:
-                filtered.append(data)
+        return storm_data.subset(self._inside(storm_data, (lon_min, lon_max, lat_min, lat_max)))
 
-        return filtered
+    @staticmethod
+    def _inside(storm_data: StormTrack, extent: Tuple[float, float, float, float]) -> np.ndarray:
+        lon_min, lon_max, lat_min, lat_max = extent
+        lat = storm_data.points['lat']
+        lon = storm_data.points['lon']
+        return (lat_min <= lat) & (lat <= lat_max) & (lon_min <= lon) & (lon <= lon_max)
 
-    def _draw_track_line(self, ax: plt.Axes, storm_data: List[StormResponse]) -> None:
+    def _draw_track_line(self, ax: plt.Axes, storm_data: StormTrack) -> None:
         """
             绘制台风路径线
             默认storm_data按时间倒序排列，最新一条在索引0
@@ -212,8 +459,8 @@ class TyphoonRenderer:
         if len(storm_data) < 2:
             return  # 单独一个点的数据无需绘制路径
 
-        lons = [float(p.stormInfo.lon) for p in reversed(storm_data)]
-        lats = [float(p.stormInfo.lat) for p in reversed(storm_data)]
+        lons = storm_data.points['lon'][::-1]
+        lats = storm_data.points['lat'][::-1]
 
         ax.plot(
             lons, lats,
@@ -223,17 +470,17 @@ class TyphoonRenderer:
             zorder=2,
         )
 
-    def _draw_history_points(self, ax: plt.Axes, storm_data: List[StormResponse]) -> None:
+    def _draw_history_points(self, ax: plt.Axes, storm_data: StormTrack) -> None:
         """
         绘制历史台风点位（不含最新点）
         """
         if len(storm_data) <= 1:
             return
 
-        for p in storm_data[:0:-1]:
-            lon = float(p.stormInfo.lon)
-            lat = float(p.stormInfo.lat)
-            color = STORM_TYPE_COLORS[p.stormInfo.type]
+        for p in storm_data.points[:0:-1]:
+            lon = float(p['lon'])
+            lat = float(p['lat'])
+            color = STORM_TYPE_COLORS[STORM_TYPES[p['type']]]
 
             ax.scatter(lon, lat,
                        s=6 ** 2,
@@ -243,23 +490,23 @@ class TyphoonRenderer:
                        transform=self.proj,
                        zorder=3)
 
-    def _draw_latest_point(self, ax: plt.Axes, storm_data: List[StormResponse]) -> None:
+    def _draw_latest_point(self, ax: plt.Axes, storm_data: StormTrack) -> None:
         """
             最新点绘制，包括风圈、移动方向、文字信息等
         """
-        if not storm_data:
+        if not len(storm_data):
             return
 
-        latest = storm_data[0]
-        lon = float(latest.stormInfo.lon)
-        lat = float(latest.stormInfo.lat)
-        ty_type = latest.stormInfo.type
+        latest = storm_data.points[0]
+        lon = float(latest['lon'])
+        lat = float(latest['lat'])
+        ty_type = storm_data.type_code(0)
         color = STORM_TYPE_COLORS[ty_type]
 
         # 1.风圈
         km2deg = 1 / 111.0
         alpha = {'7': 0.15, '10': 0.25, '12': 0.35}
-        radii_km = self._estimate_wind_radii(latest)
+        radii_km = self._estimate_wind_radii(ty_type, float(latest['wind_speed']), float(latest['pressure']))
         for lvl, r_km in radii_km.items():
             r_deg = r_km * km2deg
             circle = mpl_patches.Circle(
@@ -284,11 +531,11 @@ class TyphoonRenderer:
         )
 
         # 3.方向箭头
-        spd = float(latest.stormInfo.moveSpeed)  # km/h
-        if latest.stormInfo.move360.strip():
-            dir360 = float(latest.stormInfo.move360)
+        spd = float(latest['move_speed'])  # km/h
+        if not math.isnan(latest['move360']):
+            dir360 = float(latest['move360'])
         else:
-            dir360 = DIR_DEG.get(latest.stormInfo.moveDir, 0)
+            dir360 = DIR_DEG[MOVE_DIRS[latest['move_dir']]]
 
         length = spd * 3.0 * km2deg  # 可调系数
         dx = length * np.sin(np.deg2rad(dir360))
@@ -303,11 +550,11 @@ class TyphoonRenderer:
                  zorder=6)
 
         # 4.文字标签
-        cn_type = STORM_TYPE_CN[latest.stormInfo.type]
-        txt = (f"{self._format_time(latest.stormInfo.pubTime)}  "
+        cn_type = STORM_TYPE_CN[ty_type]
+        txt = (f"{storm_data.pub_time(0).strftime('%m-%d %H:%M')}  "
                f"{cn_type}  "
-               f"{latest.stormInfo.windSpeed}m/s  "
-               f"{latest.stormInfo.pressure}hPa")
+               f"{float(latest['wind_speed']):g}m/s  "
+               f"{float(latest['pressure']):g}hPa")
         ax.text(lon + 0.5, lat + 0.5, txt,
                 fontsize=7, color='black',
                 bbox=dict(boxstyle='round,pad=0.3',
@@ -346,23 +593,26 @@ class TyphoonRenderer:
                   facecolor='white', edgecolor='gray')
 
     @staticmethod
-    def _draw_title(ax: plt.Axes, storm_data: List[StormResponse]) -> None:
-        if not storm_data:
+    def _draw_title(ax: plt.Axes, storm_data: StormTrack) -> None:
+        if not len(storm_data):
             return
-        latest = storm_data[0]
-        year = latest.storm.year
-        num = latest.storm.id[-2:]
-        name = latest.storm.name
-        dt = datetime.datetime.fromisoformat(latest.stormInfo.pubTime)
+        year = storm_data.year
+        num = storm_data.storm_id[-2:]
+        name = storm_data.name
+        dt = storm_data.pub_time(0)
 
         line1 = f"{year}年第{num}号台风“{name}”路径图"
         line2 = dt.strftime("%Y年%m月%d日 %H:%M")
 
-        ax.text(0.5, 1.01, f"{line1}\n{line2}",
-                transform=ax.transAxes,
-                fontsize=14, weight='bold',
-                va='bottom', ha='center',
-                linespacing=1.6)
+        TyphoonRenderer._put_title(ax, f"{line1}\n{line2}")
+
+    @staticmethod
+    def _put_title(ax: plt.Axes, text: str) -> Text:
+        return ax.text(0.5, 1.01, text,
+                       transform=ax.transAxes,
+                       fontsize=14, weight='bold',
+                       va='bottom', ha='center',
+                       linespacing=1.6)
 
     @staticmethod
     def _draw_footer(ax: plt.Axes) -> None:
@@ -378,13 +628,10 @@ class TyphoonRenderer:
                 linespacing=1.5)
 
     @staticmethod
-    def _estimate_wind_radii(latest: StormResponse) -> Dict[str, float]:
+    def _estimate_wind_radii(lvl: str, v: float, p: float) -> Dict[str, float]:
         """
-        根据强度等级、中心气压、最大风速 估算 7/10/12 级风圈半径（km）
+        根据强度等级、中心气压(p, hPa)、最大风速(v, m/s) 估算 7/10/12 级风圈半径（km）
         """
-        lvl = latest.stormInfo.type
-        v = float(latest.stormInfo.windSpeed)  # m/s
-        p = float(latest.stormInfo.pressure)  # hPa
 
         # 7级圈（R35）基础值
         v_kt = v * 1.944
@@ -409,11 +656,6 @@ class TyphoonRenderer:
 
         return radii
 
-    @staticmethod
-    def _format_time(pub_time: str) -> str:
-        dt = datetime.datetime.fromisoformat(pub_time)
-        return dt.strftime("%m-%d %H:%M")
-
     @staticmethod
     def _set_font():
         fonts = []
@@ -438,3 +680,20 @@ class TyphoonRenderer:
 
         plt.rcParams['font.family'] = fonts
         plt.rcParams['axes.unicode_minus'] = False
+
+
+def choose_scope(storm_data: StormTrack) -> TyphoonScope:
+    """
+        根据台风路径信息决定是否使用大画幅。
+        最新数据在小画幅内，则使用小画幅
+        如果任意一个路径点落在小画幅范围之外，则返回大画幅。
+    """
+    if not len(storm_data):
+        return TyphoonScope.SMALL
+
+    inside = TyphoonRenderer._inside(storm_data, SMALL_EXTENT)
+    # 最新点在小画幅内，或所有点都在小画幅内
+    if inside[0] or inside.all():
+        return TyphoonScope.SMALL
+
+    return TyphoonScope.LARGE